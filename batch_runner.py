@@ -0,0 +1,237 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import itertools
+import multiprocessing
+import time
+
+from cpu_stage import PagePayload, init_worker, resolve_payload
+from scraper import LegislationScraper, ScraperResult, group_citations_by_page
+from utils.pydanticModels import Citation
+
+_DONE = object()
+
+
+class BatchRunner:
+    """
+    Concurrent citation processing around LegislationScraper.get_legislation_content.
+
+    Citations flow through a bounded work queue to `max_concurrency` workers. Each
+    host gets its own concurrency cap and a minimum delay between request starts,
+    so hundreds of government hosts can be scraped in parallel without hammering
+    any single one. The host cap covers fetches only, so slow parsing or LLM work on
+    one page does not hold back the next fetch from its host. Results are streamed
+    in completion order.
+
+    With `group_by_page`, citations sharing a de-fragmented URL form one work item,
+    so each page is fetched and parsed once for all of its citations. Grouping
+    happens over windows of `group_window` citations read lazily from the input;
+    a page whose citations span windows is fetched once per window (from the page
+    cache after the first, when it is enabled).
+
+    With `cpu_workers`, the pipeline is split in two: the threads only fetch, and
+    parsing and resolution run in a pool of `cpu_workers` processes (see cpu_stage).
+    Citations that need Pathfinder's LLM calls come back to this process, so the
+    LLM rate limits and the template store stay shared.
+    At most `cpu_queue_size` fetched pages wait for or occupy a worker; fetch
+    threads block before fetching more, so a slow CPU stage bounds memory instead
+    of letting fetched pages pile up.
+    """
+    def __init__(self,
+                 scraper: LegislationScraper,
+                 max_concurrency: int = 8,
+                 per_host_concurrency: int = 2,
+                 politeness_delay: float = 1.0,
+                 queue_size: int = 100,
+                 host_overrides: Optional[Dict[str, int]] = None,
+                 group_by_page: bool = True,
+                 group_window: int = 1000,
+                 cpu_workers: Optional[int] = None,
+                 cpu_queue_size: Optional[int] = None,
+                 mp_start_method: str = 'spawn'):
+        self.scraper = scraper
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.politeness_delay = politeness_delay
+        self.queue_size = queue_size
+        self.host_overrides = host_overrides or {}  # host -> concurrency cap
+        self.group_by_page = group_by_page
+        self.group_window = group_window  # Citations read ahead to group by page; bounds memory for huge inputs
+        self.cpu_workers = cpu_workers  # None = resolve on the fetch threads
+        self.cpu_queue_size = cpu_queue_size or (2 * cpu_workers if cpu_workers else 0)
+        self.mp_start_method = mp_start_method  # Fork is unsafe here: the scraper runs threads (LLM scheduler, drivers)
+
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._host_last_start: Dict[str, float] = {}
+
+    def _host_of(self, citation: Citation) -> str:
+        return urlparse(citation.link_legal_reference).netloc.lower()
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.host_overrides.get(host, self.per_host_concurrency))
+        return self._host_semaphores[host]
+
+    async def _wait_politely(self, host: str):
+        """Space out request starts to the same host by at least `politeness_delay`"""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            last_start = self._host_last_start.get(host)
+            if last_start is not None:
+                remaining = self.politeness_delay - (time.monotonic() - last_start)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            self._host_last_start[host] = time.monotonic()
+
+    async def _process(self, executor: ThreadPoolExecutor, citations: List[Citation]) -> List[ScraperResult]:
+        """
+        Run one work item - all citations of a single page - on the thread pool.
+        The host slot is held for the fetch only; parsing, Pathfinder and LLM work run after releasing it.
+        """
+        host = self._host_of(citations[0])
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._host_semaphore(host):
+                await self._wait_politely(host)
+                fetch_result = await loop.run_in_executor(executor, self.scraper.fetcher.fetch, citations[0].link_legal_reference)
+            return await loop.run_in_executor(executor, self.scraper.resolve_fetched, fetch_result, citations)
+        except Exception as e:
+            return self._error_results(citations, e)
+
+    async def _process_pipelined(self,
+                                 executor: ThreadPoolExecutor,
+                                 cpu_executor: ProcessPoolExecutor,
+                                 cpu_slots: asyncio.Semaphore,
+                                 citations: List[Citation]) -> List[ScraperResult]:
+        """Fetch one work item on the thread pool, then resolve it in a worker process"""
+        host = self._host_of(citations[0])
+        loop = asyncio.get_running_loop()
+        async with cpu_slots:  # Backpressure: don't fetch until the CPU stage has room for the page
+            try:
+                async with self._host_semaphore(host):
+                    await self._wait_politely(host)
+                    fetch_result = await loop.run_in_executor(executor, self.scraper.fetcher.fetch, citations[0].link_legal_reference)
+                if fetch_result.document is None and not fetch_result.content:
+                    return self.scraper.failed_load(fetch_result, citations)
+                templates = self.scraper.site_templates.templates_for(fetch_result.url) if self.scraper.site_templates else []
+                payload = PagePayload.from_fetch(fetch_result, templates)
+            except Exception as e:
+                return self._error_results(citations, e)
+            try:
+                results, template_events, handoff = await asyncio.wrap_future(cpu_executor.submit(resolve_payload, payload, citations))
+            except Exception as e:
+                return self._error_results(citations, e)
+            finally:
+                payload.release()
+
+        # This process is the only writer of the template store and the only one calling LLMs
+        if template_events and self.scraper.site_templates:
+            self.scraper.site_templates.apply(template_events)
+        deferred = [position for position, result in enumerate(results) if result.status == 'deferred']
+        if deferred:
+            deferred_citations = [citations[position] for position in deferred]
+            try:
+                if handoff is not None:
+                    # Only the shipped candidate subtrees are parsed here, not the page
+                    pathfinder_results = await loop.run_in_executor(
+                        executor, self.scraper.resolve_handoff, handoff, deferred_citations, fetch_result.tier
+                    )
+                else:
+                    pathfinder_results = await loop.run_in_executor(
+                        executor, self.scraper.resolve_html, fetch_result.content, deferred_citations, fetch_result.tier
+                    )
+            except Exception as e:
+                pathfinder_results = self._error_results(deferred_citations, e)
+            for position, result in zip(deferred, pathfinder_results):
+                results[position] = result
+        return results
+
+    def _error_results(self, citations: List[Citation], error: Exception) -> List[ScraperResult]:
+        return [ScraperResult(
+            status='error',
+            error_message=f'Unexpected error: {str(error)}',
+            processing_path='error'
+        ) for _ in citations]
+
+    def _cpu_executor(self) -> Optional[ProcessPoolExecutor]:
+        if not self.cpu_workers:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=self.cpu_workers,
+            mp_context=multiprocessing.get_context(self.mp_start_method),
+            initializer=init_worker,
+            initargs=(self.scraper.parser_backend, self.scraper.page_cache.settings() if self.scraper.page_cache else None)
+        )
+
+    def _work_items(self, citations: Iterable[Citation]) -> Iterator[List[Citation]]:
+        """Work items in input order, grouping by page within windows of `group_window` citations so input is consumed lazily"""
+        if not self.group_by_page:
+            yield from ([citation] for citation in citations)
+            return
+        citations = iter(citations)
+        while True:
+            window = list(itertools.islice(citations, self.group_window))
+            if not window:
+                return
+            for group in group_citations_by_page(window).values():
+                yield [citation for _, citation in group]
+
+    async def stream(self, citations: Iterable[Citation]) -> AsyncIterator[Tuple[Citation, ScraperResult]]:
+        """Yield (citation, result) pairs as soon as each citation finishes"""
+        work_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        result_queue: asyncio.Queue = asyncio.Queue()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        cpu_executor = self._cpu_executor()
+        cpu_slots = asyncio.Semaphore(self.cpu_queue_size) if cpu_executor else None
+
+        async def produce():
+            for item in self._work_items(citations):
+                await work_queue.put(item)  # Blocks while the queue is full
+            for _ in range(self.max_concurrency):
+                await work_queue.put(_DONE)
+
+        async def work():
+            while True:
+                item = await work_queue.get()
+                if item is _DONE:
+                    return
+                if cpu_executor:
+                    results = await self._process_pipelined(executor, cpu_executor, cpu_slots, item)
+                else:
+                    results = await self._process(executor, item)
+                for citation, result in zip(item, results):
+                    await result_queue.put((citation, result))
+
+        async def supervise():
+            try:
+                await asyncio.gather(produce(), *(work() for _ in range(self.max_concurrency)))
+            finally:
+                await result_queue.put(_DONE)
+
+        supervisor = asyncio.create_task(supervise())
+        try:
+            while True:
+                item = await result_queue.get()
+                if item is _DONE:
+                    break
+                yield item
+            await supervisor  # Surface producer errors, if any
+        finally:
+            if not supervisor.done():
+                supervisor.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if cpu_executor:
+                cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self,
+                  citations: Iterable[Citation],
+                  on_result: Optional[Callable[[Citation, ScraperResult], None]] = None) -> List[Tuple[Citation, ScraperResult]]:
+        """Process every citation, optionally calling `on_result` as each one completes"""
+        results = []
+        async for citation, result in self.stream(citations):
+            if on_result:
+                on_result(citation, result)
+            results.append((citation, result))
+        return results
@@ -0,0 +1,106 @@
+"""
+Benchmark the parser backends in parsing.py on saved legislation pages.
+
+Usage:
+    python benchmark_parsers.py path/to/saved_pages [--repeat 3] [--backends lxml html.parser]
+
+Every *.html / *.htm / *.xml file in the directory is parsed with each backend,
+then the operations the scraper performs on a tree are timed: find(id=...),
+a case-insensitive text search, get_text() and the parent walk used by
+LegislationScraper._extract_relevant_container.
+"""
+from typing import Dict, List
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from parsing import available_backends, make_soup
+
+OPERATIONS = ['parse', 'find_id', 'text_search', 'get_text', 'container_walk']
+
+
+def _container_walk(element):
+    # Same walk as LegislationScraper._extract_relevant_container
+    current = element
+    while current.parent and not current.find_all(['h1', 'h2', 'h3', 'section']):
+        current = current.parent
+    return current
+
+
+def benchmark_page(html: str, backend: str) -> Dict[str, float]:
+    """Time each operation once on a single page, in seconds"""
+    timings = {}
+
+    start = time.perf_counter()
+    soup = make_soup(html, backend)
+    timings['parse'] = time.perf_counter() - start
+
+    ids = [tag.get('id') for tag in soup.find_all(id=True)][:50]
+    start = time.perf_counter()
+    for element_id in ids:
+        soup.find(id=element_id)
+    timings['find_id'] = time.perf_counter() - start
+
+    needle = 'section'
+    start = time.perf_counter()
+    matches = soup.find_all(string=lambda text: needle in text.lower() if text else False)
+    timings['text_search'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    soup.get_text()
+    timings['get_text'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for match in matches[:20]:
+        _container_walk(match)
+    timings['container_walk'] = time.perf_counter() - start
+
+    return timings
+
+
+def run_benchmark(pages_dir: str, backends: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Median total time per operation and backend across all pages"""
+    paths = sorted(
+        path for pattern in ('*.html', '*.htm', '*.xml')
+        for path in glob.glob(os.path.join(pages_dir, pattern))
+    )
+    if not paths:
+        raise SystemExit(f'No saved pages found in {pages_dir}')
+
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read().decode('utf-8', errors='replace'))
+    print(f'{len(pages)} pages, {sum(len(page) for page in pages) / 1e6:.1f}M characters')
+
+    results = {}
+    for backend in backends:
+        runs = {operation: [] for operation in OPERATIONS}
+        for _ in range(repeat):
+            totals = dict.fromkeys(OPERATIONS, 0.0)
+            for html in pages:
+                for operation, seconds in benchmark_page(html, backend).items():
+                    totals[operation] += seconds
+            for operation, seconds in totals.items():
+                runs[operation].append(seconds)
+        results[backend] = {operation: statistics.median(times) for operation, times in runs.items()}
+    return results
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{'backend':<14}" + ''.join(f'{operation:>16}' for operation in OPERATIONS) + f"{'total':>12}")
+    for backend, timings in results.items():
+        row = ''.join(f'{timings[operation] * 1000:>14.1f}ms' for operation in OPERATIONS)
+        print(f'{backend:<14}{row}{sum(timings.values()) * 1000:>10.1f}ms')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark HTML parser backends on saved legislation pages')
+    parser.add_argument('pages_dir', help='Directory of saved .html/.htm/.xml pages')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backends', nargs='*', default=None, help='Backends to compare (default: all installed)')
+    args = parser.parse_args()
+
+    print_results(run_benchmark(args.pages_dir, args.backends or available_backends(), args.repeat))
@@ -0,0 +1,215 @@
+"""
+Local scoring of candidate containers for a citation.
+
+Before Pathfinder spends an LLM call, candidate elements are ranked with cheap
+signals: the citation's designation patterns in the element's heading, lexical
+matches between the reference and the element's id/class, and a BM25 score of
+the reference tokens over the element's leading text. Only the top few go to the
+LLM, and when the best candidate is far enough ahead the citation is resolved
+without any LLM call at all.
+"""
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional
+import math
+import re
+
+from document_index import DocumentIndex, get_document_index
+from legal_patterns import SearchPatterns, compile_reference_patterns
+from parsing import document_cache
+
+HEADING_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+MAX_LOCAL_CANDIDATES = 40  # Containers collected from pattern hits per citation
+MAX_PATTERN_HITS = 200  # Regex matches inspected per tier when collecting candidates
+LEADING_TEXT_CHARS = 5000  # Text per candidate used for BM25
+HEADING_TEXT_CHARS = 200
+
+# Heading matches by regex tier (most specific first), one step lower for a less specific designation
+# (the Chapter 3 of "Section 5, Chapter 3"); ids/classes; BM25 (normalized to 0-1)
+HEADING_WEIGHTS = [3.0, 2.0, 1.0]
+LEXICAL_WEIGHT = 1.5
+TEXT_WEIGHT = 1.0
+WHOLE_PAGE_PENALTY = 0.5  # The page body always 'contains' the provision, so it shouldn't win on text alone
+WHOLE_PAGE_TAGS = {'body', 'html', '[document]'}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Resolve without the LLM only when the top candidate is both strong and clearly ahead
+DECISIVE_SCORE = 4.0
+DECISIVE_MARGIN = 1.5
+
+STOPWORDS = {'of', 'the', 'and', 'to', 'in', 'de', 'la', 'el', 'del', 'y', 'en', 'der', 'die', 'das', 'und',
+             'du', 'des', 'le', 'les', 'et', 'da', 'do', 'e', 'di', 'il', 'van', 'het'}
+_TOKEN = re.compile(r'[^\W_]+')
+_IDENTIFIER_PARTS = re.compile(r'[a-z]+|\d+')
+
+
+class RankedCandidate(BaseModel):
+    """A candidate container and the local evidence that it holds the cited provision"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    element: Tag
+    score: float = 0.0
+    heading: str = ''
+    heading_score: float = 0.0
+    lexical_score: float = 0.0
+    text_score: float = 0.0
+
+
+class CandidateRanking(BaseModel):
+    candidates: List[RankedCandidate] = Field(default_factory=list)  # Best first
+    decisive: bool = False  # Top candidate can be taken without asking an LLM
+
+    @property
+    def best(self) -> Optional[RankedCandidate]:
+        return self.candidates[0] if self.candidates else None
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _identifier_tokens(element: Tag) -> set:
+    """Tokens of an element's id and classes, splitting letter/digit runs ('sec12a' -> sec, 12, a)"""
+    parts = [element.get('id') or ''] + list(element.get('class') or [])
+    return {token for part in parts for token in _IDENTIFIER_PARTS.findall(part.lower())}
+
+
+def _leading_text(element: Tag, limit: int) -> str:
+    parts = []
+    length = 0
+    for text in element.stripped_strings:
+        parts.append(text)
+        length += len(text) + 1
+        if length >= limit:
+            break
+    return ' '.join(parts)[:limit]
+
+
+def _heading_text(element: Tag) -> str:
+    if element.name in HEADING_TAGS:
+        return element.get_text(' ', strip=True)[:HEADING_TEXT_CHARS]
+    heading = element.find(HEADING_TAGS)
+    if heading is not None:
+        return heading.get_text(' ', strip=True)[:HEADING_TEXT_CHARS]
+    return _leading_text(element, HEADING_TEXT_CHARS)
+
+
+def _heading_score(heading: str, search: SearchPatterns) -> float:
+    for regex, tier, designation in zip(search.regexes, search.regex_tiers, search.regex_designations):
+        if regex.search(heading):
+            step = tier + (1 if designation else 0)
+            return HEADING_WEIGHTS[min(step, len(HEADING_WEIGHTS) - 1)]
+    return 0.0
+
+
+def _lexical_score(element: Tag, search: SearchPatterns, query: set) -> float:
+    identifiers = _identifier_tokens(element)
+    if not identifiers:
+        return 0.0
+    numbers = [designation.number.lower() for designation in search.designations]
+    if numbers and numbers[0] in identifiers:
+        return LEXICAL_WEIGHT
+    if set(numbers[1:]) & identifiers:
+        return LEXICAL_WEIGHT / 2  # Only an enclosing designation's number
+    overlap = len(query & identifiers)
+    return LEXICAL_WEIGHT * overlap / len(query) if query else 0.0
+
+
+def _bm25(query: List[str], documents: List[List[str]]) -> List[float]:
+    """BM25 of one query against a small collection, normalized so the best document scores 1"""
+    if not documents or not query:
+        return [0.0] * len(documents)
+    average_length = sum(len(document) for document in documents) / len(documents) or 1.0
+    document_frequency: Dict[str, int] = {}
+    for document in documents:
+        for token in set(document):
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    scores = []
+    for document in documents:
+        counts: Dict[str, int] = {}
+        for token in document:
+            counts[token] = counts.get(token, 0) + 1
+        score = 0.0
+        for token in set(query):
+            frequency = counts.get(token, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - document_frequency[token] + 0.5) / (document_frequency[token] + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * len(document) / average_length))
+        scores.append(score)
+    top = max(scores)
+    return [score / top if top else 0.0 for score in scores]
+
+
+def score_elements(elements: List[Tag], legal_reference: str, jurisdiction: Optional[str] = None) -> List[RankedCandidate]:
+    """Score arbitrary elements against a legal reference, best first"""
+    search = compile_reference_patterns(legal_reference, jurisdiction)
+    query_tokens = tokenize(legal_reference)
+    query = set(query_tokens)
+
+    texts = [_leading_text(element, LEADING_TEXT_CHARS) for element in elements]
+    text_scores = _bm25(query_tokens, [tokenize(text) for text in texts])
+
+    ranked = []
+    for element, text, text_score in zip(elements, texts, text_scores):
+        heading = _heading_text(element)
+        candidate = RankedCandidate(
+            element=element,
+            heading=heading,
+            heading_score=_heading_score(heading, search),
+            lexical_score=_lexical_score(element, search, query),
+            text_score=TEXT_WEIGHT * text_score
+        )
+        candidate.score = candidate.heading_score + candidate.lexical_score + candidate.text_score
+        if element.name in WHOLE_PAGE_TAGS:
+            candidate.score -= WHOLE_PAGE_PENALTY
+        ranked.append(candidate)
+    ranked.sort(key=lambda candidate: candidate.score, reverse=True)
+    return ranked
+
+
+def candidate_containers(index: DocumentIndex, search: SearchPatterns) -> List[Tag]:
+    """Containers around pattern hits and elements whose id names a designation number, in discovery order"""
+    containers: Dict[int, Tag] = {}
+    for regex in search.regexes:
+        for hits, match in enumerate(regex.finditer(index.text)):
+            if hits >= MAX_PATTERN_HITS or len(containers) >= MAX_LOCAL_CANDIDATES:
+                break
+            node = index.text_nodes[index.node_at(match.start())]
+            container = index.relevant_container(node)
+            containers.setdefault(id(container), container)
+
+    numbers = {designation.number.lower() for designation in search.designations}
+    if numbers:
+        for element_id, element in index.ids.items():
+            if len(containers) >= MAX_LOCAL_CANDIDATES * 2:
+                break
+            if numbers & set(_IDENTIFIER_PARTS.findall(element_id.lower())):
+                containers.setdefault(id(element), element)
+    return list(containers.values())
+
+
+def rank_candidates(soup: BeautifulSoup, legal_reference: str, jurisdiction: Optional[str] = None) -> CandidateRanking:
+    """Collect and score candidate containers for a reference, deciding whether the best one is decisive"""
+    search = compile_reference_patterns(legal_reference, jurisdiction)
+    containers = candidate_containers(get_document_index(soup), search)
+    ranked = score_elements(containers, legal_reference, jurisdiction)
+    decisive = False
+    if ranked and search.regexes:
+        runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+        decisive = (ranked[0].score >= DECISIVE_SCORE
+                    and ranked[0].score - runner_up >= DECISIVE_MARGIN
+                    and ranked[0].heading_score == HEADING_WEIGHTS[0])
+    return CandidateRanking(candidates=ranked, decisive=decisive)
+
+
+def get_candidate_ranking(soup: BeautifulSoup, legal_reference: str, jurisdiction: Optional[str] = None) -> CandidateRanking:
+    """Ranking for a reference on a document, computed once and shared by prefetching and pathfinding"""
+    cache = document_cache(soup).setdefault('candidate_rankings', {})
+    key = (legal_reference, jurisdiction)
+    if key not in cache:
+        cache[key] = rank_candidates(soup, legal_reference, jurisdiction)
+    return cache[key]
@@ -0,0 +1,352 @@
+"""
+PostgreSQL-backed work queue so several scraper processes, on several machines,
+can drain the `citations` table without processing a citation twice.
+
+Each citation gets a row in `citation_jobs`. Workers lease pending rows with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent workers never block on or
+claim the same row, and a per-page advisory lock keeps two workers off the same
+page. A lease expires unless its holder heartbeats, and an expired lease is
+picked up by another worker. Every lease counts as an attempt. A job that fails
+(or whose worker dies) `max_attempts` times is dead-lettered with its last error
+instead of being retried forever.
+"""
+from psycopg.rows import class_row, dict_row
+from typing import Dict, List, Optional, Tuple
+import argparse
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from page_readiness import backoff_delay
+from scraper import LegislationScraper, ScraperResult
+from utils.database import db_connection
+from utils.pydanticModels import Citation
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ['pending', 'leased', 'done', 'dead']
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS citation_jobs (
+    citation_id TEXT PRIMARY KEY,  -- citations.id
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    leased_until TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS citation_jobs_ready ON citation_jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS citation_jobs_leases ON citation_jobs (status, leased_until);
+"""
+
+# A job can be leased if it is pending and due, or its lease expired with attempts to spare
+READY_CONDITION = """(
+    (j.status = 'pending' AND j.available_at <= now())
+    OR (j.status = 'leased' AND j.leased_until < now() AND j.attempts < %(max_attempts)s)
+)"""
+
+# Page of a job: the citation's URL without its #fragment
+PAGE_EXPRESSION = "split_part(c.link_legal_reference, '#', 1)"
+
+# No other worker holds a live lease on a job of the page
+PAGE_FREE_CONDITION = f"""NOT EXISTS (
+    SELECT 1 FROM citation_jobs o JOIN citations oc ON oc.id = o.citation_id
+    WHERE o.status = 'leased' AND o.leased_until >= now() AND o.worker_id <> %(worker_id)s
+      AND split_part(oc.link_legal_reference, '#', 1) = {PAGE_EXPRESSION}
+)"""
+
+# The page of the oldest ready job that no other worker is on, skipping pages this lease already tried
+NEXT_PAGE_SQL = f"""
+SELECT {PAGE_EXPRESSION}
+FROM citation_jobs j JOIN citations c ON c.id = j.citation_id
+WHERE {READY_CONDITION} AND {PAGE_FREE_CONDITION} AND NOT ({PAGE_EXPRESSION} = ANY(%(skipped)s))
+ORDER BY j.available_at
+LIMIT 1
+"""
+
+# Held until the lease transaction commits, so only one worker at a time can be leasing a page.
+# Distinct URLs sharing a hash only make one of them wait for the next lease round.
+PAGE_LOCK_SQL = 'SELECT pg_try_advisory_xact_lock(hashtext(%s))'
+
+# Claim up to %(limit)s ready jobs of page %(page)s. Run under the page lock: any worker that leased the page
+# before has committed by then, so PAGE_FREE_CONDITION sees its leases and no two workers share a page.
+LEASE_SQL = f"""
+WITH picked AS (
+    SELECT j.citation_id
+    FROM citation_jobs j JOIN citations c ON c.id = j.citation_id
+    WHERE {READY_CONDITION} AND {PAGE_EXPRESSION} = %(page)s AND {PAGE_FREE_CONDITION}
+    ORDER BY j.available_at
+    LIMIT %(limit)s
+    FOR UPDATE OF j SKIP LOCKED
+)
+UPDATE citation_jobs AS j
+SET status = 'leased', worker_id = %(worker_id)s, attempts = j.attempts + 1,
+    leased_until = now() + make_interval(secs => %(lease_seconds)s), heartbeat_at = now(), updated_at = now()
+FROM picked
+WHERE j.citation_id = picked.citation_id
+RETURNING j.citation_id, j.attempts
+"""
+
+# Jobs whose worker died on their final attempt
+DEAD_LETTER_EXPIRED_SQL = """
+UPDATE citation_jobs
+SET status = 'dead', last_error = coalesce(last_error, 'Lease expired'), worker_id = NULL, updated_at = now()
+WHERE citation_id IN (
+    SELECT citation_id FROM citation_jobs
+    WHERE status = 'leased' AND leased_until < now() AND attempts >= %(max_attempts)s
+    FOR UPDATE SKIP LOCKED
+)
+"""
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def citation_filter(citation_ids: Optional[List[str]] = None, jurisdiction_id: Optional[str] = None) -> Tuple[str, list]:
+    """WHERE condition on `citations` and its bound parameters; no filters selects every citation"""
+    conditions, params = [], []
+    if citation_ids is not None:
+        conditions.append('id = ANY(%s)')
+        params.append(list(citation_ids))
+    if jurisdiction_id is not None:
+        conditions.append('jurisdiction_id = %s')
+        params.append(jurisdiction_id)
+    return ' AND '.join(conditions) or 'TRUE', params
+
+
+class CitationQueue:
+    """
+    Job-table protocol for one worker.
+
+    Writes are fenced by worker id: once a lease has expired and been taken over,
+    the original worker's heartbeat, complete() and fail() no longer touch the row.
+    """
+    def __init__(self,
+                 worker_id: Optional[str] = None,
+                 lease_seconds: float = 300.0,
+                 max_attempts: int = 3,
+                 retry_base_delay: float = 60.0,
+                 retry_max_delay: float = 3600.0):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+    def ensure_schema(self):
+        with db_connection() as conn:
+            conn.execute(JOBS_SCHEMA)
+
+    def enqueue_all(self, citation_ids: Optional[List[str]] = None, jurisdiction_id: Optional[str] = None) -> int:
+        """Create a pending job for every citation (optionally only the given ids / jurisdiction) that has none yet"""
+        condition, params = citation_filter(citation_ids, jurisdiction_id)
+        query = f'INSERT INTO citation_jobs (citation_id) SELECT id FROM citations WHERE {condition} ON CONFLICT (citation_id) DO NOTHING'
+        with db_connection() as conn:
+            return conn.execute(query, params).rowcount
+
+    def lease(self, limit: int) -> List[Citation]:
+        """
+        Claim up to `limit` ready jobs for this worker and return their citations.
+        Jobs are leased a page at a time, and a page no other worker holds a live lease on, so a batch's
+        citations share as few fetches as possible and no page is fetched by two workers at once.
+        """
+        params = {'worker_id': self.worker_id, 'lease_seconds': self.lease_seconds, 'max_attempts': self.max_attempts}
+        leased, skipped = [], []
+        with db_connection() as conn:
+            conn.execute(DEAD_LETTER_EXPIRED_SQL, params)
+            while len(leased) < limit:
+                page = conn.execute(NEXT_PAGE_SQL, {**params, 'skipped': skipped}).fetchone()
+                if page is None:
+                    break
+                page = page[0]
+                skipped.append(page)
+                if not conn.execute(PAGE_LOCK_SQL, (page,)).fetchone()[0]:
+                    continue  # Another worker is leasing it right now
+                leased.extend(conn.execute(LEASE_SQL, {**params, 'page': page, 'limit': limit - len(leased)}).fetchall())
+            if not leased:
+                return []
+            cursor = conn.cursor(row_factory=class_row(Citation))
+            return cursor.execute('SELECT * FROM citations WHERE id = ANY(%s)',
+                                  ([citation_id for citation_id, _ in leased],)).fetchall()
+
+    def heartbeat(self, citation_ids: List[str]) -> List[str]:
+        """Extend this worker's leases; returns the ids whose lease is still held"""
+        if not citation_ids:
+            return []
+        with db_connection() as conn:
+            rows = conn.execute(
+                """UPDATE citation_jobs
+                   SET leased_until = now() + make_interval(secs => %s), heartbeat_at = now(), updated_at = now()
+                   WHERE citation_id = ANY(%s) AND worker_id = %s AND status = 'leased'
+                   RETURNING citation_id""",
+                (self.lease_seconds, citation_ids, self.worker_id)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def complete(self, citation_id: str, result: ScraperResult) -> bool:
+        """Record a finished job. False if the lease was lost and the result discarded."""
+        with db_connection() as conn:
+            updated = conn.execute(
+                """UPDATE citation_jobs
+                   SET status = 'done', result = %s, last_error = NULL, worker_id = NULL,
+                       leased_until = NULL, updated_at = now()
+                   WHERE citation_id = %s AND worker_id = %s AND status = 'leased'""",
+                (result.model_dump_json(), citation_id, self.worker_id)
+            ).rowcount
+        return updated == 1
+
+    def fail(self, citation_id: str, error: str, result: Optional[ScraperResult] = None) -> Optional[str]:
+        """
+        Release a failed job for a later retry, or dead-letter it once it has used up its attempts.
+        Returns the job's new status, None if the lease was lost.
+        """
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM citation_jobs WHERE citation_id = %s AND worker_id = %s AND status = 'leased' FOR UPDATE",
+                (citation_id, self.worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            attempts = row[0]
+            status = 'dead' if attempts >= self.max_attempts else 'pending'
+            delay = backoff_delay(attempts - 1, base=self.retry_base_delay, cap=self.retry_max_delay)
+            conn.execute(
+                """UPDATE citation_jobs
+                   SET status = %s, last_error = %s, result = %s, worker_id = NULL, leased_until = NULL,
+                       available_at = now() + make_interval(secs => %s), updated_at = now()
+                   WHERE citation_id = %s""",
+                (status, error, result.model_dump_json() if result else None, delay, citation_id)
+            )
+        return status
+
+    def requeue_dead(self, citation_ids: Optional[List[str]] = None, jurisdiction_id: Optional[str] = None) -> int:
+        """Give dead-lettered jobs (optionally only the given ids / jurisdiction) a fresh set of attempts, e.g. after fixing the cause"""
+        condition, params = citation_filter(citation_ids, jurisdiction_id)
+        query = f"""UPDATE citation_jobs SET status = 'pending', attempts = 0, available_at = now(), updated_at = now()
+                    WHERE status = 'dead' AND citation_id IN (SELECT id FROM citations WHERE {condition})"""
+        with db_connection() as conn:
+            return conn.execute(query, params).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        with db_connection(row_factory=dict_row) as conn:
+            rows = conn.execute('SELECT status, count(*) AS jobs FROM citation_jobs GROUP BY status').fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update({row['status']: row['jobs'] for row in rows})
+        return counts
+
+
+class _Heartbeat:
+    """Background thread that keeps a batch's leases alive while it is being scraped"""
+    def __init__(self, queue: CitationQueue, citation_ids: List[str], interval: float):
+        self.queue = queue
+        self.citation_ids = list(citation_ids)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                held = self.queue.heartbeat(self.citation_ids)
+            except Exception as e:
+                logger.warning(f'Heartbeat failed: {e}')  # Retried next interval; the lease has slack
+                continue
+            lost = set(self.citation_ids) - set(held)
+            if lost:
+                logger.warning(f'Lost leases on {len(lost)} citations; their results will be discarded')
+                self.citation_ids = held
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+
+class QueueWorker:
+    """
+    Drains the citation queue with one LegislationScraper.
+
+    Jobs are leased in batches grouped by page, one worker per page at a time (see CitationQueue.lease),
+    so citations on the same page are fetched and parsed once. A result with status 'error' counts as a failed attempt; 'success' and
+    'needs_review' complete the job.
+    """
+    def __init__(self,
+                 scraper: LegislationScraper,
+                 queue: Optional[CitationQueue] = None,
+                 batch_size: int = 10,
+                 idle_sleep: float = 30.0):
+        self.scraper = scraper
+        self.queue = queue or CitationQueue()
+        self.batch_size = batch_size
+        self.idle_sleep = idle_sleep
+        self.heartbeat_interval = self.queue.lease_seconds / 3
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Finish the current batch, then return from run()"""
+        self._stop.set()
+
+    def run_once(self) -> int:
+        """Lease and process one batch; returns the number of citations leased"""
+        citations = self.queue.lease(self.batch_size)
+        if not citations:
+            return 0
+        with _Heartbeat(self.queue, [citation.id for citation in citations], self.heartbeat_interval):
+            try:
+                results = self.scraper.get_legislation_content_batch(citations)
+            except Exception as e:
+                for citation in citations:
+                    self.queue.fail(citation.id, f'Unexpected error: {str(e)}')
+                return len(citations)
+
+        for citation, result in zip(citations, results):
+            if result.status == 'error':
+                status = self.queue.fail(citation.id, result.error_message or 'Unknown error', result)
+                if status == 'dead':
+                    logger.warning(f'Dead-lettered citation {citation.id}: {result.error_message}')
+            elif not self.queue.complete(citation.id, result):
+                logger.warning(f'Lease on citation {citation.id} expired before it finished; result discarded')
+        return len(citations)
+
+    def run(self, stop_when_empty: bool = False):
+        """Process batches until stopped (or, with `stop_when_empty`, until nothing is ready)"""
+        while not self._stop.is_set():
+            if self.run_once() == 0:
+                if stop_when_empty:
+                    return
+                self._stop.wait(self.idle_sleep)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a citation queue worker against the PostgreSQL database')
+    parser.add_argument('--enqueue', action='store_true', help='Create jobs for citations that have none, then work')
+    parser.add_argument('--jurisdiction', help='Only enqueue / requeue citations of this jurisdiction id')
+    parser.add_argument('--requeue-dead', action='store_true', help='Give dead-lettered jobs a fresh set of attempts, then work')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--lease-seconds', type=float, default=300.0)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--drain', action='store_true', help='Exit once no jobs are ready instead of polling')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    queue = CitationQueue(lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    queue.ensure_schema()
+    if args.enqueue:
+        logger.info(f'Enqueued {queue.enqueue_all(jurisdiction_id=args.jurisdiction)} citations')
+    if args.requeue_dead:
+        logger.info(f'Requeued {queue.requeue_dead(jurisdiction_id=args.jurisdiction)} dead-lettered citations')
+    with LegislationScraper() as scraper:
+        QueueWorker(scraper, queue, batch_size=args.batch_size).run(stop_when_empty=args.drain)
+    logger.info(f'Queue: {queue.counts()}')
@@ -0,0 +1,126 @@
+"""
+Worker-process side of the pipelined BatchRunner.
+
+Parsing, text extraction and pattern matching are CPU-bound and serialize on the
+GIL when run on fetch threads. With `cpu_workers` set, BatchRunner fetches pages
+on threads and hands the raw bytes to a ProcessPoolExecutor running the functions
+here, so a node uses all of its cores. Large pages travel through shared memory
+instead of being pickled; downloaded files travel as a path. Only the
+ScraperResults come back.
+
+Workers never call an LLM or write the template store: the per-model rate limits
+and the template file belong to the parent process. A worker resolves what it
+can locally (direct references, simple pages, site templates, decisive local
+rankings, documents) and returns the rest as 'deferred' for the parent's
+Pathfinder, together with a compact handoff of the page (candidate subtrees,
+skeleton and rankings, see handoff.py) so the parent never parses the full page.
+Template outcomes come back as events for the parent to apply.
+"""
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import atexit
+
+from documents import DownloadedDocument
+from fetcher import FetchResult
+from handoff import PageHandoff
+from page_cache import PageCache
+from scraper import LegislationScraper, ScraperResult
+from site_templates import SiteTemplate, TemplateEvent, TemplateSnapshot
+from utils.pydanticModels import Citation
+
+SHARED_MEMORY_THRESHOLD = 1024 * 1024  # Bytes of HTML above which a page goes through shared memory
+
+_scraper: Optional[LegislationScraper] = None  # One per worker process
+
+
+class PagePayload:
+    """
+    A fetched page on its way to a worker: inline bytes, a shared memory block, or a downloaded file.
+
+    The fetching side owns the payload and calls release() once the worker is done
+    (or has died), which frees the shared memory block or leftover file.
+    """
+    def __init__(self, url: str, tier: Optional[str], templates: Optional[List[SiteTemplate]] = None):
+        self.url = url
+        self.tier = tier
+        self.templates = templates or []  # The parent's current templates for the page's domain
+        self.data: Optional[bytes] = None
+        self.shm_name: Optional[str] = None
+        self.size = 0
+        self.document: Optional[dict] = None  # DownloadedDocument constructor arguments
+        self._shm: Optional[shared_memory.SharedMemory] = None
+
+    @classmethod
+    def from_fetch(cls,
+                   fetch_result: FetchResult,
+                   templates: Optional[List[SiteTemplate]] = None,
+                   threshold: int = SHARED_MEMORY_THRESHOLD) -> 'PagePayload':
+        payload = cls(fetch_result.url, fetch_result.tier, templates)
+        if fetch_result.document is not None:
+            document = fetch_result.document
+            payload.document = {'url': document.url, 'path': document.path, 'kind': document.kind,
+                                'content_type': document.content_type, 'sha256': document.sha256}
+            return payload
+        data = fetch_result.content.encode('utf-8')
+        payload.size = len(data)
+        if payload.size > threshold:
+            payload._shm = shared_memory.SharedMemory(create=True, size=payload.size)
+            payload._shm.buf[:payload.size] = data
+            payload.shm_name = payload._shm.name
+        else:
+            payload.data = data
+        return payload
+
+    def __getstate__(self):
+        # The creating process keeps the only handle; workers attach by name
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        return state
+
+    def html(self) -> str:
+        if self.shm_name is None:
+            return self.data.decode('utf-8')
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        try:
+            with shm.buf[:self.size] as view:
+                return str(view, 'utf-8')
+        finally:
+            shm.close()
+
+    def release(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self.document is not None:
+            # Normally removed by the worker already; this covers a worker that crashed first
+            DownloadedDocument(**self.document).close()
+
+
+def init_worker(parser_backend: Optional[str], page_cache_settings: Optional[Dict[str, Any]]):
+    """
+    ProcessPoolExecutor initializer: one resolve-only scraper per worker (it never fetches or calls an LLM).
+    `page_cache_settings` are the parent's PageCache.settings(), so worker outlines live in the same cache; None disables caching.
+    """
+    global _scraper
+    page_cache = PageCache(**page_cache_settings) if page_cache_settings else None
+    _scraper = LegislationScraper(pool_size=1, page_cache=page_cache, use_cache=page_cache is not None,
+                                  parser_backend=parser_backend, resolve_only=True)
+    atexit.register(_scraper.close)
+
+
+def resolve_payload(payload: PagePayload,
+                    citations: List[Citation]) -> Tuple[List[ScraperResult], List[TemplateEvent], Optional[PageHandoff]]:
+    """
+    Resolve the citations of one fetched page inside a worker process. Results may be 'deferred';
+    the handoff then carries what the parent's LLM stage needs for them.
+    """
+    if payload.document is not None:
+        return _scraper.resolve_document(DownloadedDocument(**payload.document), citations, payload.tier), [], None
+    templates = TemplateSnapshot(payload.templates)
+    _scraper.pathfinder.site_templates = templates  # A worker runs one task at a time
+    try:
+        results, handoff = _scraper.resolve_html_with_handoff(payload.html(), citations, payload.tier)
+        return results, templates.events, handoff
+    finally:
+        _scraper.pathfinder.site_templates = None
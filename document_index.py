@@ -0,0 +1,136 @@
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString, Tag
+from typing import Dict, List, NamedTuple, Optional, Pattern, Set
+import bisect
+
+from parsing import document_cache
+
+CONTAINER_MARKER_TAGS = {'h1', 'h2', 'h3', 'section'}
+NON_CONTENT_PARENTS = {'script', 'style', 'noscript', 'template'}
+# Text nodes are joined with a separator that never occurs in patterns, so matches can't span nodes
+NODE_SEPARATOR = '\x00'
+
+
+class TextMatch(NamedTuple):
+    pattern: str
+    node: NavigableString
+    offset: int  # Offset of the match inside the node's text
+
+
+class DocumentIndex:
+    """
+    One-pass index over a parsed document.
+
+    Holds id -> element, the document's text nodes lower-cased and joined into a
+    single string with per-node offsets, and element ancestry (parent ordinals and
+    which elements contain a heading/section). Lookups that used to be a tree walk
+    per call - find(id=...), a find_all(string=...) per search pattern, and the
+    container walk - become dict lookups and a single scan over the joined text.
+    """
+    def __init__(self, soup: BeautifulSoup):
+        self.ids: Dict[str, Tag] = {}
+        self.elements: List[Tag] = []
+        self.parent_ordinals: List[int] = []
+        self.text_nodes: List[NavigableString] = []
+        self.offsets: List[int] = []  # Start of each text node inside self.text
+        self._ordinals: Dict[int, int] = {id(soup): -1}
+        self._has_container_marker: Set[int] = set()
+
+        text_parts = []
+        position = 0
+        for node in soup.descendants:
+            if isinstance(node, Tag):
+                ordinal = len(self.elements)
+                parent_ordinal = self._ordinals.get(id(node.parent), -1)
+                self._ordinals[id(node)] = ordinal
+                self.elements.append(node)
+                self.parent_ordinals.append(parent_ordinal)
+                element_id = node.get('id')
+                if element_id and element_id not in self.ids:  # First occurrence wins, like soup.find
+                    self.ids[element_id] = node
+                if node.name in CONTAINER_MARKER_TAGS:
+                    self._mark_ancestors(parent_ordinal)
+            elif isinstance(node, NavigableString) and not isinstance(node, PreformattedString):
+                if node.parent is not None and node.parent.name in NON_CONTENT_PARENTS:
+                    continue
+                lowered = node.lower()
+                self.text_nodes.append(node)
+                self.offsets.append(position)
+                text_parts.append(lowered)
+                position += len(lowered) + 1
+        self.text = NODE_SEPARATOR.join(text_parts)
+
+    def _mark_ancestors(self, ordinal: int):
+        while ordinal >= 0 and ordinal not in self._has_container_marker:
+            self._has_container_marker.add(ordinal)
+            ordinal = self.parent_ordinals[ordinal]
+
+    def ordinal(self, element: Tag) -> int:
+        """Document-order position of an element, -1 for the root or unknown elements"""
+        return self._ordinals.get(id(element), -1)
+
+    def find_by_id(self, element_id: str) -> Optional[Tag]:
+        return self.ids.get(element_id)
+
+    def ancestors(self, element: Tag) -> List[Tag]:
+        """Ancestors of an element, nearest first, excluding the document root"""
+        result = []
+        ordinal = self.parent_ordinals[self.ordinal(element)] if self.ordinal(element) >= 0 else -1
+        while ordinal >= 0:
+            result.append(self.elements[ordinal])
+            ordinal = self.parent_ordinals[ordinal]
+        return result
+
+    def node_at(self, position: int) -> int:
+        """Index of the text node containing a position in self.text"""
+        return bisect.bisect_right(self.offsets, position) - 1
+
+    def find_first(self, patterns: List[str]) -> Optional[TextMatch]:
+        """
+        First node (document order) containing the highest-ranked pattern that occurs
+        anywhere, exactly like the old per-pattern find_all(...)[0] loop. Matching is
+        case-insensitive. Patterns are searched one at a time with str.find over the
+        joined text, so overlapping occurrences can't hide each other.
+        """
+        if not self.text:
+            return None
+        for pattern in patterns:
+            if not pattern or not pattern.strip():
+                continue
+            position = self.text.find(pattern.lower())
+            if position >= 0:
+                node_index = self.node_at(position)
+                return TextMatch(
+                    pattern=pattern,
+                    node=self.text_nodes[node_index],
+                    offset=position - self.offsets[node_index]
+                )
+        return None
+
+    def find_first_regex(self, regexes: List[Pattern]) -> Optional[TextMatch]:
+        """First node matching the highest-ranked regex. Regexes should be compiled case-insensitive."""
+        for regex in regexes:
+            match = regex.search(self.text)
+            if match:
+                node_index = self.node_at(match.start())
+                return TextMatch(
+                    pattern=match.group(0),
+                    node=self.text_nodes[node_index],
+                    offset=match.start() - self.offsets[node_index]
+                )
+        return None
+
+    def relevant_container(self, node) -> Tag:
+        """Nearest enclosing element that contains an h1-h3 or section, or the outermost element"""
+        current = node.parent if isinstance(node, NavigableString) else node
+        while current.parent is not None and self.ordinal(current) not in self._has_container_marker:
+            current = current.parent
+        return current
+
+
+def get_document_index(soup: BeautifulSoup) -> DocumentIndex:
+    """Build the index for a document once and reuse it for every later lookup"""
+    cache = document_cache(soup)
+    if 'index' not in cache:
+        cache['index'] = DocumentIndex(soup)
+    return cache['index']
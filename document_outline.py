@@ -0,0 +1,165 @@
+"""
+Section outlines for PDF / Word legislation.
+
+Files have no #id anchors, so each downloaded document gets an outline that maps
+designations ("Article 12", "§ 5") to page ranges. It is seeded from the PDF's
+bookmarks and grows from every page a search extracts: lines matching a
+designation heading, preferring those set in a larger font. Outlines are stored
+next to the page cache, keyed by URL and file hash, so later citations into the
+same national code start extracting at the right page instead of page one.
+"""
+from pydantic import BaseModel, Field
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from documents import DocumentPage, DownloadedDocument
+from legal_patterns import Designation, heading_regex, label_kind
+from page_cache import DEFAULT_CACHE_DIR, normalize_url
+
+# Where an entry came from, most trustworthy first
+SOURCE_PRIORITY = {'bookmark': 0, 'font': 1, 'pattern': 2}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outlines (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    outline TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class OutlineEntry(BaseModel):
+    """A designation heading and the pages its section spans"""
+    kind: Optional[str] = None  # Canonical label ('article', 'section', ...)
+    number: str
+    title: str
+    start_page: int
+    end_page: Optional[int] = None  # Inclusive; None = to the end of the document
+    source: str  # 'bookmark', 'font' or 'pattern'
+
+
+class DocumentOutline(BaseModel):
+    entries: List[OutlineEntry] = Field(default_factory=list)  # Ordered by start page
+    page_count: Optional[int] = None
+    scanned_pages: List[int] = Field(default_factory=list)  # Pages whose headings have been collected
+
+    def pages_for(self, designations: List[Designation]) -> Optional[Tuple[int, int]]:
+        """(first, last) page of the most specific designation the outline knows about"""
+        for designation in designations:
+            number = designation.number.lower()
+            matches = [entry for entry in self.entries
+                       if entry.number.lower() == number and (designation.kind is None or entry.kind == designation.kind)]
+            if matches:
+                best = min(matches, key=lambda entry: (SOURCE_PRIORITY.get(entry.source, 9), entry.start_page))
+                return best.start_page, best.end_page or self.page_count or best.start_page
+        return None
+
+
+def _heading_entry(line: str, page: int, source: str, jurisdiction: Optional[str]) -> Optional[OutlineEntry]:
+    match = heading_regex(None, jurisdiction).match(line)
+    if not match:
+        return None
+    return OutlineEntry(kind=label_kind(match.group('label'), jurisdiction), number=match.group('number'),
+                        title=' '.join(line.split())[:200], start_page=page, source=source)
+
+
+def entries_from_bookmarks(bookmarks: List[Tuple[str, int]], jurisdiction: Optional[str] = None) -> List[OutlineEntry]:
+    entries = []
+    for title, page in bookmarks:
+        entry = _heading_entry(title, page, 'bookmark', jurisdiction)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def entries_from_pages(pages: Iterable[DocumentPage], jurisdiction: Optional[str] = None) -> List[OutlineEntry]:
+    """Headings found in page text; those also set in a larger font are marked as 'font' entries"""
+    regex = heading_regex(None, jurisdiction)
+    entries = []
+    for page in pages:
+        large = [' '.join(line.split()) for line in page.large_lines]
+        for match in regex.finditer(page.text):
+            line_end = page.text.find('\n', match.start())
+            line = page.text[match.start():line_end if line_end >= 0 else len(page.text)].strip()
+            normalized = ' '.join(line.split())
+            in_large_font = any(normalized.startswith(text) or text.startswith(normalized) for text in large if text)
+            entries.append(OutlineEntry(kind=label_kind(match.group('label'), jurisdiction), number=match.group('number'),
+                                        title=normalized[:200], start_page=page.number,
+                                        source='font' if in_large_font else 'pattern'))
+    return entries
+
+
+def merge_entries(outline: DocumentOutline, entries: List[OutlineEntry]) -> DocumentOutline:
+    """Add entries, keeping the most trustworthy one per (kind, number), and recompute page ranges"""
+    best: Dict[Tuple[Optional[str], str], OutlineEntry] = {}
+    for entry in outline.entries + entries:
+        key = (entry.kind, entry.number.lower())
+        current = best.get(key)
+        # Cross-references ("see Article 12") also look like headings; the first, best-sourced occurrence wins
+        if current is None or (SOURCE_PRIORITY[entry.source], entry.start_page) < (SOURCE_PRIORITY[current.source], current.start_page):
+            best[key] = entry.model_copy()
+    ordered = sorted(best.values(), key=lambda entry: entry.start_page)
+
+    # A section runs until the next heading of the same kind
+    next_start: Dict[Optional[str], int] = {}
+    for entry in reversed(ordered):
+        entry.end_page = next_start.get(entry.kind, outline.page_count)
+        next_start[entry.kind] = entry.start_page
+    return DocumentOutline(entries=ordered, page_count=outline.page_count, scanned_pages=outline.scanned_pages)
+
+
+class OutlineStore:
+    """SQLite store of document outlines, kept in the page cache directory"""
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'outlines.sqlite'), check_same_thread=False, timeout=30)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, url: str, sha256: Optional[str]) -> Optional[DocumentOutline]:
+        """Stored outline for a URL, unless the file has changed since it was built"""
+        with self._lock:
+            row = self._conn.execute('SELECT sha256, outline FROM outlines WHERE url = ?', (normalize_url(url),)).fetchone()
+        if row is None or (sha256 and row[0] != sha256):
+            return None
+        try:
+            return DocumentOutline(**json.loads(row[1]))
+        except (ValueError, TypeError):
+            return None
+
+    def put(self, url: str, sha256: Optional[str], outline: DocumentOutline):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO outlines (url, sha256, outline, updated_at) VALUES (?, ?, ?, ?)',
+                (normalize_url(url), sha256 or '', outline.model_dump_json(), time.time())
+            )
+            self._conn.commit()
+
+    def load(self, document: DownloadedDocument, jurisdiction: Optional[str] = None) -> DocumentOutline:
+        """Stored outline for a document, or a fresh one seeded from its bookmarks"""
+        outline = self.get(document.url, document.sha256)
+        if outline is not None:
+            return outline
+        outline = DocumentOutline(page_count=document.page_count)
+        return merge_entries(outline, entries_from_bookmarks(document.bookmarks(), jurisdiction))
+
+    def save(self, document: DownloadedDocument, outline: DocumentOutline, jurisdiction: Optional[str] = None) -> DocumentOutline:
+        """Fold headings from pages extracted since the outline was loaded into it and store the result"""
+        scanned = set(outline.scanned_pages)
+        new_pages = [page for page in document.extracted_pages() if page.number not in scanned]
+        if new_pages:
+            outline = merge_entries(outline, entries_from_pages(new_pages, jurisdiction))
+            outline.scanned_pages = sorted(scanned | {page.number for page in new_pages})
+        if document.page_count and not outline.page_count:
+            outline.page_count = document.page_count
+        self.put(document.url, document.sha256, outline)
+        return outline
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,375 @@
+"""
+Download-and-extract pipeline for file citations (PDF / DOCX).
+
+Downloads are streamed to a temporary file instead of being held in memory, the
+file type is sniffed from its leading bytes (servers often send PDFs as
+application/octet-stream from .ashx or /download URLs), and text is extracted
+one page at a time. Pages are extracted lazily and remembered, so a search that
+finds its article on page 3 of a 600-page gazette never touches the rest, and
+further citations into the same file reuse the pages already extracted.
+"""
+from lxml import etree
+from pydantic import BaseModel, Field
+from pypdf import PdfReader
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+import hashlib
+import os
+import re
+import tempfile
+import zipfile
+
+from legal_patterns import SearchPatterns, heading_regex
+
+CHUNK_SIZE = 1 << 16
+MAX_DOWNLOAD_BYTES = 500 * 1024 ** 2
+DOCUMENT_CONTENT_TYPES = {
+    'application/pdf': 'pdf',
+    'application/x-pdf': 'pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+    'application/msword': 'doc',
+    'application/octet-stream': None,  # Needs sniffing
+    'application/download': None,
+    'application/force-download': None,
+}
+DOCX_PARAGRAPHS_PER_PAGE = 60  # Page size used when a .docx has no explicit page breaks
+MAX_SECTION_CHARS = 20000  # Longest section text returned for a match
+LARGE_FONT_RATIO = 1.15  # Text this much bigger than a page's body text counts as a heading
+MAX_LARGE_LINES = 50
+_WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class DocumentError(RuntimeError):
+    """A downloaded file could not be read"""
+
+
+class DocumentPage(BaseModel):
+    number: int  # 1-based
+    text: str
+    large_lines: List[str] = Field(default_factory=list)  # PDF text set noticeably larger than the body text
+
+
+class DocumentMatch(BaseModel):
+    """Where a legal reference was found in a document and the section text starting there"""
+    page: int
+    pattern: str
+    rank: int  # Index into SearchPatterns.regexes of the regex that matched; len(regexes) for literal matches
+    text: str
+
+
+def is_document_content_type(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type in DOCUMENT_CONTENT_TYPES
+
+
+def sniff_kind(head: bytes, content_type: Optional[str] = None) -> Optional[str]:
+    """'pdf', 'docx', 'doc' or None from a file's first bytes, falling back to the declared content type"""
+    stripped = head.lstrip()
+    if stripped.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'docx'  # Confirmed when the zip is opened
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'doc'
+    return DOCUMENT_CONTENT_TYPES.get(content_type or '')
+
+
+class DownloadedDocument:
+    """
+    A downloaded file on disk with lazily extracted, cached page texts.
+
+    Use as a context manager (or call close()) to remove the temporary file.
+    """
+    def __init__(self,
+                 url: str,
+                 path: str,
+                 kind: Optional[str],
+                 content_type: Optional[str] = None,
+                 sha256: Optional[str] = None):
+        self.url = url
+        self.path = path
+        self.kind = kind
+        self.sha256 = sha256  # Of the file's bytes, to tell revisions of a document apart
+        self.content_type = content_type
+        self._pages: Dict[int, DocumentPage] = {}
+        self._extractor: Optional[Iterator[DocumentPage]] = None
+        self._exhausted = False
+        self._pdf: Optional[PdfReader] = None
+        self._file = None
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def _reader(self) -> PdfReader:
+        """Opened on first use; PdfReader seeks within the file and only parses a page when it's asked for"""
+        if self._pdf is None:
+            self._file = open(self.path, 'rb')
+            try:
+                self._pdf = PdfReader(self._file)
+            except Exception as e:
+                raise DocumentError(f'Unreadable PDF: {e}')
+        return self._pdf
+
+    @property
+    def page_count(self) -> Optional[int]:
+        """Number of pages; for Word documents only known once every page has been extracted"""
+        if self.kind == 'pdf':
+            return len(self._reader().pages)
+        return len(self._pages) if self._exhausted else None
+
+    def _iter_docx(self) -> Iterator[DocumentPage]:
+        """Stream word/document.xml, starting a new page at explicit page breaks"""
+        try:
+            archive = zipfile.ZipFile(self.path)
+            stream = archive.open('word/document.xml')
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise DocumentError(f'Not a Word document: {e}')
+        number = 1
+        paragraphs: List[str] = []
+        runs: List[str] = []
+        with archive, stream:
+            for event, element in etree.iterparse(stream, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    continue
+                if tag == f'{_WORD_NAMESPACE}t':
+                    runs.append(element.text or '')
+                elif tag == f'{_WORD_NAMESPACE}tab':
+                    runs.append('\t')
+                elif tag in (f'{_WORD_NAMESPACE}br', f'{_WORD_NAMESPACE}lastRenderedPageBreak'):
+                    page_break = tag.endswith('lastRenderedPageBreak') or element.get(f'{_WORD_NAMESPACE}type') == 'page'
+                    if page_break and (paragraphs or runs):
+                        paragraphs.append(''.join(runs))
+                        runs = []
+                        yield DocumentPage(number=number, text='\n'.join(paragraphs))
+                        number += 1
+                        paragraphs = []
+                    elif not page_break:
+                        runs.append('\n')
+                elif tag == f'{_WORD_NAMESPACE}p':
+                    paragraphs.append(''.join(runs))
+                    runs = []
+                    element.clear()
+                    if len(paragraphs) >= DOCX_PARAGRAPHS_PER_PAGE:
+                        yield DocumentPage(number=number, text='\n'.join(paragraphs))
+                        number += 1
+                        paragraphs = []
+        if runs:
+            paragraphs.append(''.join(runs))
+        if paragraphs:
+            yield DocumentPage(number=number, text='\n'.join(paragraphs))
+
+    def page(self, number: int) -> Optional[DocumentPage]:
+        """A single page (1-based), extracted on first access"""
+        if number in self._pages:
+            return self._pages[number]
+        if self.kind == 'pdf':
+            reader = self._reader()
+            if not 1 <= number <= len(reader.pages):
+                return None
+            self._pages[number] = _extract_pdf_page(reader.pages[number - 1], number)
+            return self._pages[number]
+        if self.kind != 'docx':
+            raise DocumentError(f'Unsupported document type: {self.kind or self.content_type or "unknown"}')
+        # Word documents can only be read front to back
+        if self._extractor is None:
+            self._extractor = self._iter_docx()
+        while number not in self._pages and not self._exhausted:
+            try:
+                extracted = next(self._extractor)
+            except StopIteration:
+                self._exhausted = True
+                break
+            self._pages[extracted.number] = extracted
+        return self._pages.get(number)
+
+    def pages(self, start: int = 1) -> Iterator[DocumentPage]:
+        """Pages from `start` to the end, then the ones before it; each is extracted at most once"""
+        number = start
+        while True:
+            page = self.page(number)
+            if page is None:
+                break
+            yield page
+            number += 1
+        for number in range(1, start):
+            page = self.page(number)
+            if page is None:
+                break
+            yield page
+
+    def extracted_pages(self) -> List[DocumentPage]:
+        """Pages extracted so far, in page order"""
+        return [self._pages[number] for number in sorted(self._pages)]
+
+    def bookmarks(self) -> List[Tuple[str, int]]:
+        """(title, 1-based page) of every PDF bookmark, flattened in document order"""
+        if self.kind != 'pdf':
+            return []
+        reader = self._reader()
+        try:
+            stack = [iter(reader.outline)]
+        except Exception:
+            return []
+        result = []
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+            elif isinstance(item, list):
+                stack.append(iter(item))
+            else:
+                try:
+                    page_index = reader.get_destination_page_number(item)
+                except Exception:
+                    continue
+                title = ' '.join(str(getattr(item, 'title', '') or '').split())
+                if title and page_index is not None and page_index >= 0:
+                    result.append((title, page_index + 1))
+        return result
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def save_response(url: str, response, max_bytes: int = MAX_DOWNLOAD_BYTES) -> DownloadedDocument:
+    """Stream a requests response (opened with stream=True) to a temporary file and sniff its type"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower() or None
+    handle, path = tempfile.mkstemp(prefix='legislation-', suffix='.download')
+    head = b''
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if len(head) < 8:
+                    head += chunk[:8 - len(head)]
+                written += len(chunk)
+                if written > max_bytes:
+                    raise DocumentError(f'Download exceeds {max_bytes} bytes')
+                f.write(chunk)
+                digest.update(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        response.close()
+    return DownloadedDocument(url=url, path=path, kind=sniff_kind(head, content_type), content_type=content_type,
+                              sha256=digest.hexdigest())
+
+
+def _extract_pdf_page(pdf_page, number: int) -> DocumentPage:
+    """Text of a PDF page plus the runs set in a larger font than the page's body text"""
+    runs: List[Tuple[str, float]] = []
+    weights: Dict[float, int] = {}
+
+    def visit(text, cm, tm, font_dict, font_size):
+        text = text.strip()
+        if not text or not font_size:
+            return
+        # Effective size: Tf size scaled by the text and current transformation matrices
+        size = round(abs(font_size * (tm[3] or 1) * (cm[3] or 1)), 1)
+        runs.append((text, size))
+        weights[size] = weights.get(size, 0) + len(text)
+
+    try:
+        text = pdf_page.extract_text(visitor_text=visit) or ''
+    except Exception:
+        return DocumentPage(number=number, text='')  # One broken page shouldn't hide the rest of the document
+    large_lines = []
+    if weights:
+        body_size = max(weights, key=weights.get)
+        large_lines = [run for run, size in runs if size >= body_size * LARGE_FONT_RATIO][:MAX_LARGE_LINES]
+    return DocumentPage(number=number, text=text, large_lines=large_lines)
+
+
+def start_page(url: str) -> int:
+    """Page named by a '#page=N' fragment (the Acrobat open parameter), else 1"""
+    match = re.search(r'#.*\bpage=(\d+)', url)
+    return max(1, int(match.group(1))) if match else 1
+
+
+def _find_on_page(page: DocumentPage, search: SearchPatterns) -> Optional[Tuple[int, int, str]]:
+    """(rank, offset, matched text) of the best match on a page"""
+    for rank, regex in enumerate(search.regexes):
+        match = regex.search(page.text)
+        if match:
+            return rank, match.start(), match.group(0)
+    lowered = page.text.lower()
+    for literal in search.literals:
+        offset = lowered.find(literal.lower())
+        if literal.strip() and offset >= 0:
+            return len(search.regexes), offset, literal
+    return None
+
+
+def find_in_document(document: DownloadedDocument,
+                     search: SearchPatterns,
+                     jurisdiction: Optional[str] = None,
+                     start: int = 1) -> Optional[DocumentMatch]:
+    """
+    Search pages lazily for a reference. Stops at the first most-specific match;
+    broader matches are remembered and only used if nothing better turns up.
+    """
+    if not search.regexes and not search.literals:
+        return None
+    best: Optional[Tuple[int, int, int, str]] = None  # (rank, page, offset, matched)
+    for page in document.pages(start):
+        found = _find_on_page(page, search)
+        if found is None:
+            continue
+        rank, offset, matched = found
+        if best is None or rank < best[0]:
+            best = (rank, page.number, offset, matched)
+        if rank == 0:
+            break
+    if best is None:
+        return None
+
+    rank, number, offset, matched = best
+    # The section ends at the next heading of the kind that matched (the most specific one for literal matches)
+    designation = search.regex_designations[rank] if rank < len(search.regexes) else 0
+    kind = search.designations[designation].kind if search.designations else None
+    return DocumentMatch(page=number, pattern=matched, rank=rank,
+                         text=section_text(document, number, offset, heading_regex(kind, jurisdiction)))
+
+
+def section_text(document: DownloadedDocument, page_number: int, offset: int, boundary: Optional[Pattern]) -> str:
+    """Text from a match to the next heading of the same kind, following on to later pages if needed"""
+    page = document.page(page_number)
+    if page is None:
+        return ''
+    text = page.text[offset:]
+    # The boundary is searched after the first line so the matched heading itself doesn't end the section
+    first_line_end = text.find('\n')
+    search_from = first_line_end + 1 if first_line_end >= 0 else len(text)
+    parts = []
+    length = 0
+    while True:
+        end = boundary.search(text, search_from) if boundary is not None else None
+        if end:
+            parts.append(text[:end.start()])
+            break
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_SECTION_CHARS:
+            break
+        page = document.page(page.number + 1)
+        if page is None:
+            break
+        text = page.text
+        search_from = 0
+    return '\n'.join(parts).strip()[:MAX_SECTION_CHARS]
@@ -0,0 +1,158 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from contextlib import contextmanager
+from typing import List
+import queue
+import threading
+
+
+class PooledDriver:
+    """A Chrome session owned by a DriverPool, with usage bookkeeping"""
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages_served = 0
+
+
+class DriverPoolClosed(RuntimeError):
+    """Raised when a driver is requested from a pool that has been shut down"""
+
+
+class DriverPool:
+    """
+    Bounded pool of warm headless Chrome sessions.
+
+    Drivers are started lazily up to `size` and handed out with `checkout()`.
+    A driver is health-checked before each checkout and recycled (quit and
+    replaced) after serving `max_pages_per_driver` pages, so long batch runs
+    don't accumulate Chrome memory leaks. Call `shutdown()` when done.
+    """
+    def __init__(self,
+                 size: int = 2,
+                 headless: bool = True,
+                 max_pages_per_driver: int = 50,
+                 checkout_timeout: float = 300.0,
+                 prewarm: bool = False):
+        self.size = size
+        self.headless = headless
+        self.max_pages_per_driver = max_pages_per_driver
+        self.checkout_timeout = checkout_timeout
+        self._idle: "queue.LifoQueue[PooledDriver]" = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._all: List[PooledDriver] = []
+        self._closed = False
+        if prewarm:
+            for _ in range(size):
+                if self._try_reserve():
+                    self._idle.put(self._start_driver())
+
+    def _build_options(self) -> Options:
+        options = Options()
+        # Return from get() at DOMContentLoaded; PageReadiness decides when the page is actually usable
+        options.page_load_strategy = 'eager'
+        if self.headless:
+            options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        return options
+
+    def _try_reserve(self) -> bool:
+        """Claim a slot for a new driver if the pool is below its bound. Check and claim are one atomic step."""
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _start_driver(self) -> PooledDriver:
+        """Launch a new Chrome session in a slot claimed with _try_reserve and register it with the pool"""
+        try:
+            pooled = PooledDriver(webdriver.Chrome(options=self._build_options()))
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._all.append(pooled)
+        return pooled
+
+    def _retire(self, pooled: PooledDriver):
+        """Quit a driver and free its slot in the pool"""
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            if pooled in self._all:
+                self._all.remove(pooled)
+                self._created -= 1
+
+    def _is_healthy(self, pooled: PooledDriver) -> bool:
+        """Cheap liveness probe - a dead session raises on any command"""
+        try:
+            return pooled.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _acquire(self) -> PooledDriver:
+        if self._closed:
+            raise DriverPoolClosed('Driver pool has been shut down')
+
+        while True:
+            # Prefer an idle warm driver, otherwise grow the pool up to its bound
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                if self._try_reserve():
+                    return self._start_driver()
+                pooled = self._idle.get(timeout=self.checkout_timeout)
+
+            if self._closed:
+                self._retire(pooled)
+                raise DriverPoolClosed('Driver pool has been shut down')
+
+            if pooled.pages_served < self.max_pages_per_driver and self._is_healthy(pooled):
+                return pooled
+            # Retiring frees the slot; the next pass replaces the driver unless another checkout took the slot first
+            self._retire(pooled)
+
+    def _release(self, pooled: PooledDriver, broken: bool = False):
+        pooled.pages_served += 1
+        if broken or self._closed:
+            self._retire(pooled)
+            return
+        self._idle.put(pooled)
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a driver for the duration of a `with` block"""
+        pooled = self._acquire()
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # The session may be left in an unknown state; only keep it if it still answers
+            broken = not self._is_healthy(pooled)
+            raise
+        finally:
+            self._release(pooled, broken=broken)
+
+    def shutdown(self):
+        """Quit every driver in the pool. Further checkouts will fail."""
+        self._closed = True
+        with self._lock:
+            drivers = list(self._all)
+        for pooled in drivers:
+            self._retire(pooled)
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
@@ -0,0 +1,220 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, Callable
+from urllib.parse import urlparse, urldefrag
+import re
+
+from page_cache import PageCache, CacheEntry
+from documents import DocumentError, DownloadedDocument, is_document_content_type, save_response
+
+# URL classes from the strategy notes in LegislationScraper.get_legislation_content
+STATIC_EXTENSIONS = {'', '.html', '.htm', '.php', '.pl', '.wxe', '.txt', '.xml'}
+BROWSER_EXTENSIONS = {'.aspx'}
+DOWNLOAD_EXTENSIONS = {'.pdf', '.doc', '.docx', '.ashx'}
+AUTH_EXTENSIONS = {'.jsp'}
+
+TEXT_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/xml', 'application/xml', 'text/plain')
+
+# Markers of client-side rendered pages whose server response has no real content
+_JS_MARKERS = re.compile(
+    r'<noscript[^>]*>[^<]*(enable|activate|requires?)\s+javascript'
+    r'|<div[^>]+id=["\'](root|app|__next)["\'][^>]*>\s*</div>'
+    r'|\bng-app\b|\bdata-reactroot\b',
+    re.IGNORECASE
+)
+_SCRIPT_OR_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0 Safari/537.36'
+
+
+class FetchResult(BaseModel):
+    """Result of fetching a URL through the FetchRouter"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    url: str
+    content: Optional[str] = None
+    document: Optional[DownloadedDocument] = None  # Set instead of content for PDF/Word files; caller must close() it
+    tier: str  # 'cache', 'http', 'browser' or 'download' - which fetch tier served the page
+    status_code: Optional[int] = None
+    content_type: Optional[str] = None
+    escalation_reason: Optional[str] = None  # Why the HTTP tier was skipped or abandoned
+    error_message: Optional[str] = None
+
+
+def url_extension(url: str) -> str:
+    """Lower-cased extension of the URL path, '' if there is none"""
+    path = urlparse(url).path.lower()
+    last_segment = path.rsplit('/', 1)[-1]
+    if '.' not in last_segment:
+        return ''
+    return '.' + last_segment.rsplit('.', 1)[-1]
+
+
+def classify_url(url: str) -> str:
+    """Sort a URL into 'static', 'browser', 'download' or 'auth' by extension rules"""
+    extension = url_extension(url)
+    if extension in DOWNLOAD_EXTENSIONS or '/download' in urlparse(url).path.lower():
+        return 'download'
+    if extension in AUTH_EXTENSIONS:
+        return 'auth'
+    if extension in BROWSER_EXTENSIONS:
+        return 'browser'
+    if extension in STATIC_EXTENSIONS:
+        return 'static'
+    # Unknown extensions are most likely server-rendered pages
+    return 'static'
+
+
+def looks_js_dependent(html: str, min_text_length: int = 500) -> bool:
+    """Cheap regex check for responses that only render their content with JavaScript"""
+    visible_text = _WHITESPACE.sub(' ', _TAG.sub(' ', _SCRIPT_OR_STYLE.sub(' ', html))).strip()
+    if _JS_MARKERS.search(html):
+        # Server-rendered pages sometimes still carry a noscript banner; trust them if they have content
+        return len(visible_text) < min_text_length * 4
+    return len(visible_text) < min_text_length and '<script' in html.lower()
+
+
+class FetchRouter:
+    """
+    HTTP-first page fetching.
+
+    Static URLs are fetched with a pooled keep-alive requests.Session. The browser
+    is only used for URLs whose extension requires it, or when the HTTP response
+    looks like an empty JavaScript shell. PDF and Word files - download URLs, or
+    any response with a document content type - are streamed to a temporary file
+    and returned as a DownloadedDocument. With a PageCache, fresh entries are
+    served without any network access and stale static pages are revalidated
+    with conditional requests.
+    """
+    def __init__(self,
+                 browser_fetch: Callable[[str], Optional[str]],
+                 cache: Optional[PageCache] = None,
+                 timeout: float = 20.0,
+                 pool_maxsize: int = 32):
+        self.browser_fetch = browser_fetch
+        self.cache = cache
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        })
+        retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=('GET', 'HEAD'))
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url: str) -> FetchResult:
+        """Fetch a page, escalating from plain HTTP to the browser only when needed"""
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            self.cache.record_hit(url)
+            return FetchResult(url=url, content=cached.content, tier='cache', content_type=cached.content_type)
+
+        url_class = classify_url(url)
+        if url_class == 'download':
+            result = self._download(url)
+        elif url_class != 'static':
+            result = self._fetch_with_browser(url, escalation_reason=f'{url_class} url')
+        else:
+            result = self._fetch_with_http(url, cached)
+            if result.escalation_reason:
+                result = self._fetch_with_browser(url, escalation_reason=result.escalation_reason)
+
+        if self.cache and result.tier not in ('cache', 'download'):
+            self.cache.record_miss()
+        return result
+
+    def _fetch_with_http(self, url: str, cached: Optional[CacheEntry] = None) -> FetchResult:
+        page_url = urldefrag(url)[0]
+        headers = {}
+        if cached and cached.tier == 'http':
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        try:
+            # Streamed so a document body can go straight to disk instead of into memory
+            response = self.session.get(page_url, headers=headers, timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            return FetchResult(url=url, tier='http', escalation_reason=f'http error: {e}')
+
+        if response.status_code == 304 and cached:
+            response.close()
+            self.cache.record_hit(url, revalidated=True)
+            return FetchResult(url=url, content=cached.content, tier='cache', status_code=304, content_type=cached.content_type)
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.status_code < 400 and is_document_content_type(content_type):
+            return self._document_result(url, response)
+        if response.status_code >= 400:
+            response.close()
+            return FetchResult(url=url, tier='http', status_code=response.status_code, content_type=content_type,
+                               escalation_reason=f'http status {response.status_code}')
+        if content_type and not content_type.startswith(TEXT_CONTENT_TYPES):
+            response.close()
+            return FetchResult(url=url, tier='http', status_code=response.status_code, content_type=content_type,
+                               escalation_reason=f'non-text content type {content_type}')
+
+        # requests falls back to ISO-8859-1 for text/* without a charset; sniff instead
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = response.apparent_encoding
+        html = response.text
+
+        if content_type != 'text/plain' and looks_js_dependent(html):
+            return FetchResult(url=url, tier='http', status_code=response.status_code, content_type=content_type,
+                               escalation_reason='content looks JS-dependent')
+
+        if self.cache:
+            self.cache.put(url, html,
+                           etag=response.headers.get('ETag'),
+                           last_modified=response.headers.get('Last-Modified'),
+                           content_type=content_type,
+                           tier='http')
+        return FetchResult(url=url, content=html, tier='http', status_code=response.status_code, content_type=content_type)
+
+    def _download(self, url: str) -> FetchResult:
+        """Stream a file citation to disk; pages that turn out to be HTML fall back to the browser"""
+        try:
+            response = self.session.get(urldefrag(url)[0], timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            return FetchResult(url=url, tier='download', error_message=f'Download failed: {e}')
+        if response.status_code >= 400:
+            response.close()
+            return FetchResult(url=url, tier='download', status_code=response.status_code,
+                               error_message=f'Download failed with status {response.status_code}')
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type.startswith(('text/html', 'application/xhtml+xml')):
+            # Some /download URLs are landing pages rather than files
+            response.close()
+            return self._fetch_with_browser(url, escalation_reason='download url served html')
+        return self._document_result(url, response)
+
+    def _document_result(self, url: str, response) -> FetchResult:
+        try:
+            document = save_response(url, response)
+        except (DocumentError, requests.RequestException, OSError) as e:
+            return FetchResult(url=url, tier='download', status_code=response.status_code,
+                               error_message=f'Download failed: {e}')
+        return FetchResult(url=url, document=document, tier='download', status_code=response.status_code,
+                           content_type=document.content_type)
+
+    def _fetch_with_browser(self, url: str, escalation_reason: Optional[str] = None) -> FetchResult:
+        html = self.browser_fetch(url)
+        if html and self.cache:
+            # Rendered pages have no validators; they are reused until they go stale
+            self.cache.put(url, html, tier='browser')
+        return FetchResult(
+            url=url,
+            content=html,
+            tier='browser',
+            escalation_reason=escalation_reason,
+            error_message=None if html else 'Failed to load page in browser'
+        )
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,220 @@
+"""
+Compact Pathfinder state handed from a resolution worker to the parent's LLM stage.
+
+A worker that cannot resolve a citation locally has already parsed the page,
+ranked its candidate containers and can outline it. Instead of sending the raw
+HTML back for the parent to parse a second time, it sends just what the LLM
+search reads:
+
+- the HTML of the top-ranked candidate subtrees (nested candidates travel inside
+  their outermost shipped ancestor) and the selector steps of their ancestors,
+- the page skeleton used for structure guidance, and
+- each citation's candidate ranking,
+
+with elements addressed by their position inside the shipped fragments. The
+parent parses only the fragments and seeds the document cache with the skeleton
+and rankings, so Pathfinder runs on them as it would on the full page. Guidance
+answers pointing outside the shipped subtrees are dropped, and the search cannot
+zoom out beyond a fragment root.
+"""
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+from document_index import get_document_index
+from candidate_ranker import WHOLE_PAGE_TAGS, CandidateRanking, RankedCandidate, get_candidate_ranking
+from parsing import document_cache, make_soup
+from site_templates import selector_steps
+from skeleton import Skeleton, get_document_skeleton
+from utils.pydanticModels import Citation
+
+
+WRAPPER_ATTRIBUTE = 'data-handoff-wrapper'  # Marks rebuilt ancestors; they hold nothing but the fragment
+
+
+class ElementLocator(BaseModel):
+    """An element inside a shipped fragment: the fragment's index and the tag-child indices down from its root"""
+    fragment: int
+    path: List[int] = Field(default_factory=list)
+    name: str  # Tag name, checked when locating so a fragment the parser restructured can't point at the wrong element
+
+
+class HandoffCandidate(BaseModel):
+    locator: ElementLocator
+    score: float = 0.0
+    heading: str = ''
+    heading_score: float = 0.0
+    lexical_score: float = 0.0
+    text_score: float = 0.0
+
+
+class HandoffRanking(BaseModel):
+    legal_reference: str
+    jurisdiction: Optional[str] = None
+    candidates: List[HandoffCandidate] = Field(default_factory=list)  # Best first
+    decisive: bool = False
+
+
+class HandoffSkeleton(BaseModel):
+    model: str
+    text: str
+    token_count: int
+    digest: str
+    nodes: Dict[str, ElementLocator] = Field(default_factory=dict)  # Only references inside the shipped fragments
+
+
+class HandoffFragment(BaseModel):
+    html: str  # Outer HTML of a shipped subtree
+    ancestors: List[str] = Field(default_factory=list)  # selector_steps of its parent, rebuilt as empty wrappers
+
+
+class PageHandoff(BaseModel):
+    fragments: List[HandoffFragment] = Field(default_factory=list)  # In document order
+    skeleton: Optional[HandoffSkeleton] = None  # None if it could not be built; the parent then guides on the fragments
+    rankings: List[HandoffRanking] = Field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return sum(len(fragment.html) for fragment in self.fragments)
+
+
+class _Locator:
+    """Maps elements of the full tree to locators relative to a set of shipped roots"""
+    def __init__(self, roots: List[Tag]):
+        self.roots = {id(root): position for position, root in enumerate(roots)}
+        self._child_positions: Dict[int, Dict[int, int]] = {}
+
+    def _position(self, parent: Tag, child: Tag) -> int:
+        positions = self._child_positions.get(id(parent))
+        if positions is None:
+            positions = {id(tag): position for position, tag in enumerate(parent.find_all(True, recursive=False))}
+            self._child_positions[id(parent)] = positions
+        return positions[id(child)]
+
+    def locate(self, element: Tag) -> Optional[ElementLocator]:
+        """None for elements outside every shipped root"""
+        chain = []
+        current = element
+        while id(current) not in self.roots:
+            chain.append(current)
+            current = current.parent
+            if current is None:
+                return None
+        path = [self._position(node.parent, node) for node in reversed(chain)]
+        return ElementLocator(fragment=self.roots[id(current)], path=path, name=element.name)
+
+
+def _shipped_roots(soup: BeautifulSoup, elements: List[Tag]) -> List[Tag]:
+    """The outermost of the given elements, in document order"""
+    chosen = {id(element): element for element in elements if element.name not in WHOLE_PAGE_TAGS}
+    roots = [element for element in chosen.values()
+             if not any(id(parent) in chosen for parent in element.parents)]
+    return sorted(roots, key=get_document_index(soup).ordinal)
+
+
+def export_handoff(soup: BeautifulSoup,
+                   citations: List[Citation],
+                   guidance_model: str,
+                   candidates_per_citation: int) -> PageHandoff:
+    """Capture what the LLM stage needs for `citations` from a parsed page"""
+    rankings = {}
+    for citation in citations:
+        key = (citation.legal_reference, citation.jurisdiction_id)
+        if key not in rankings:
+            rankings[key] = get_candidate_ranking(soup, *key)
+    top = {key: ranking.candidates[:candidates_per_citation] for key, ranking in rankings.items()}
+    roots = _shipped_roots(soup, [candidate.element for candidates in top.values() for candidate in candidates])
+    locator = _Locator(roots)
+
+    handoff = PageHandoff(fragments=[HandoffFragment(html=str(root), ancestors=selector_steps(root.parent))
+                                     for root in roots])
+    for (legal_reference, jurisdiction), candidates in top.items():
+        shipped = []
+        for candidate in candidates:
+            position = locator.locate(candidate.element)
+            if position is not None:
+                shipped.append(HandoffCandidate(locator=position, score=candidate.score, heading=candidate.heading,
+                                                heading_score=candidate.heading_score,
+                                                lexical_score=candidate.lexical_score,
+                                                text_score=candidate.text_score))
+        handoff.rankings.append(HandoffRanking(legal_reference=legal_reference, jurisdiction=jurisdiction,
+                                               candidates=shipped, decisive=rankings[(legal_reference, jurisdiction)].decisive))
+
+    try:
+        skeleton = get_document_skeleton(soup, guidance_model)
+    except Exception:
+        return handoff  # E.g. no tokenizer offline: the parent outlines the fragments instead
+    nodes = {}
+    for reference, element in skeleton.nodes.items():
+        position = locator.locate(element)
+        if position is not None:
+            nodes[reference] = position
+    handoff.skeleton = HandoffSkeleton(model=guidance_model, text=skeleton.text, token_count=skeleton.token_count,
+                                       digest=skeleton.digest, nodes=nodes)
+    return handoff
+
+
+def _find(roots: List[Optional[Tag]], locator: ElementLocator) -> Optional[Tag]:
+    if locator.fragment >= len(roots) or roots[locator.fragment] is None:
+        return None
+    element = roots[locator.fragment]
+    for position in locator.path:
+        children = element.find_all(True, recursive=False)
+        if position >= len(children):
+            return None
+        element = children[position]
+    return element if element.name == locator.name else None
+
+
+def _wrap(fragment: HandoffFragment) -> str:
+    """Fragment HTML inside empty copies of its ancestors, so selector_steps (and learned templates) match the real page"""
+    steps = [step for step in fragment.ancestors if step not in WHOLE_PAGE_TAGS]
+    opening = closing = ''
+    for step in steps:
+        name, *classes = step.split('.')
+        class_attribute = f' class="{" ".join(classes)}"' if classes else ''
+        opening += f'<{name}{class_attribute} {WRAPPER_ATTRIBUTE}="">'
+        closing = f'</{name}>' + closing
+    return opening + fragment.html + closing
+
+
+def _fragment_roots(body: Tag, handoff: PageHandoff) -> List[Optional[Tag]]:
+    roots = []
+    for wrapper, fragment in zip(body.find_all(True, recursive=False), handoff.fragments):
+        element = wrapper
+        for _ in [step for step in fragment.ancestors if step not in WHOLE_PAGE_TAGS]:
+            element = element.find(True, recursive=False) if element is not None else None
+        roots.append(element)
+    return roots
+
+
+def restore_handoff(handoff: PageHandoff, parser_backend: Optional[str] = None) -> BeautifulSoup:
+    """Parse the shipped fragments and seed the document cache with the worker's skeleton and rankings"""
+    soup = make_soup(f"<html><body>{''.join(_wrap(fragment) for fragment in handoff.fragments)}</body></html>", parser_backend)
+    roots = _fragment_roots(soup.body or soup, handoff)
+    cache = document_cache(soup)
+
+    rankings = cache.setdefault('candidate_rankings', {})
+    for ranking in handoff.rankings:
+        candidates = []
+        for candidate in ranking.candidates:
+            element = _find(roots, candidate.locator)
+            if element is not None:
+                candidates.append(RankedCandidate(element=element, score=candidate.score, heading=candidate.heading,
+                                                  heading_score=candidate.heading_score,
+                                                  lexical_score=candidate.lexical_score,
+                                                  text_score=candidate.text_score))
+        rankings[(ranking.legal_reference, ranking.jurisdiction)] = CandidateRanking(candidates=candidates,
+                                                                                     decisive=ranking.decisive)
+
+    if handoff.skeleton is not None:
+        nodes = {}
+        for reference, locator in handoff.skeleton.nodes.items():
+            element = _find(roots, locator)
+            if element is not None:
+                nodes[reference] = element
+        cache[f'skeleton:{handoff.skeleton.model}'] = Skeleton(text=handoff.skeleton.text,
+                                                               token_count=handoff.skeleton.token_count,
+                                                               nodes=nodes, digest=handoff.skeleton.digest)
+    return soup
@@ -0,0 +1,312 @@
+"""
+Legal reference parsing and search pattern compilation.
+
+Turns a citation's free-text `legal_reference` ("Art. 12(3) Law 2019/45",
+"§ 1219.54", "Section 5, Chapter 3") into ranked, increasingly broad search
+patterns: literal strings for plain substring scans, and a few compiled regexes
+that accept every label spelling used in the citation's jurisdiction. Results
+are memoized because the same references repeat across thousands of citations.
+"""
+from pydantic import BaseModel, ConfigDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+import re
+
+# Canonical designation -> label spellings, by language
+LABEL_ALIASES: Dict[str, Dict[str, List[str]]] = {
+    'en': {
+        'section': ['§§', '§', 'section', 'sections', 'sec.', 'sec', 'ss.', 's.'],
+        'article': ['article', 'articles', 'art.', 'arts.', 'art'],
+        'paragraph': ['paragraph', 'para.', 'para', 'par.', 'paras.', '¶'],
+        'chapter': ['chapter', 'chap.', 'ch.'],
+        'part': ['part', 'pt.'],
+        'subpart': ['subpart'],
+        'title': ['title', 'tit.'],
+        'regulation': ['regulation', 'reg.', 'regs.'],
+        'rule': ['rule', 'r.'],
+        'schedule': ['schedule', 'sch.'],
+        'annex': ['annex', 'appendix'],
+        'clause': ['clause', 'cl.'],
+    },
+    'es': {
+        'article': ['artículo', 'articulo', 'artículos', 'art.', 'arts.', 'art'],
+        'chapter': ['capítulo', 'capitulo', 'cap.'],
+        'title': ['título', 'titulo'],
+        'paragraph': ['párrafo', 'parrafo', 'numeral', 'inciso', 'fracción', 'fraccion'],
+        'section': ['sección', 'seccion'],
+        'annex': ['anexo'],
+    },
+    'pt': {
+        'article': ['artigo', 'artigos', 'art.', 'arts.', 'art'],
+        'chapter': ['capítulo', 'capitulo', 'cap.'],
+        'paragraph': ['parágrafo', 'paragrafo', 'inciso', 'alínea', 'alinea', '§'],
+        'section': ['seção', 'secao'],
+        'annex': ['anexo'],
+    },
+    'fr': {
+        'article': ['article', 'articles', 'art.', 'art'],
+        'chapter': ['chapitre', 'chap.'],
+        'paragraph': ['alinéa', 'alinea', 'paragraphe', 'al.'],
+        'section': ['section'],
+        'title': ['titre'],
+        'annex': ['annexe'],
+    },
+    'de': {
+        'section': ['§§', '§', 'paragraf', 'paragraph'],
+        'article': ['artikel', 'art.', 'art'],
+        'paragraph': ['absatz', 'abs.'],
+        'chapter': ['kapitel', 'abschnitt'],
+        'annex': ['anlage', 'anhang'],
+    },
+    'it': {
+        'article': ['articolo', 'articoli', 'art.', 'artt.', 'art'],
+        'paragraph': ['comma', 'paragrafo'],
+        'chapter': ['capo', 'capitolo'],
+        'annex': ['allegato'],
+    },
+    'nl': {
+        'article': ['artikel', 'art.', 'art'],
+        'paragraph': ['lid'],
+        'chapter': ['hoofdstuk'],
+        'section': ['afdeling', 'paragraaf', '§'],
+        'annex': ['bijlage'],
+    },
+}
+
+# Jurisdiction ISO prefix -> languages whose labels its legislation uses (English is always included)
+JURISDICTION_LANGUAGES: Dict[str, List[str]] = {
+    'es': ['es'], 'mx': ['es'], 'ar': ['es'], 'cl': ['es'], 'co': ['es'], 'pe': ['es'], 'uy': ['es'],
+    'ec': ['es'], 'bo': ['es'], 'py': ['es'], 've': ['es'], 'cr': ['es'], 'pa': ['es'], 'gt': ['es'],
+    'do': ['es'], 'sv': ['es'], 'hn': ['es'], 'ni': ['es'],
+    'br': ['pt'], 'pt': ['pt'], 'ao': ['pt'], 'mz': ['pt'], 'tl': ['pt'],
+    'fr': ['fr'], 'lu': ['fr', 'de'], 'mc': ['fr'], 'be': ['fr', 'nl'], 'ch': ['de', 'fr', 'it'],
+    'de': ['de'], 'at': ['de'], 'li': ['de'],
+    'it': ['it'], 'sm': ['it'],
+    'nl': ['nl'],
+}
+
+# Words that name the instrument itself rather than a part of it ("Regulation" is a label, see above)
+INSTRUMENT_WORDS = [
+    'law', 'act', 'decree', 'ordinance', 'directive', 'statute',
+    'ley', 'decreto', 'lei', 'loi', 'décret', 'gesetz', 'verordnung', 'legge', 'wet', 'besluit',
+]
+
+# How specific a designation kind is - lower is narrower. "Section 5, Chapter 3" names Section 5,
+# so it must be searched before the Chapter 3 that merely contains it. Unlabelled numbers rank with sections.
+KIND_SPECIFICITY: Dict[Optional[str], int] = {
+    'paragraph': 0, 'clause': 0,
+    'section': 1, 'article': 1, 'regulation': 1, 'rule': 1, None: 1,
+    'subpart': 2,
+    'part': 3, 'chapter': 3, 'schedule': 3, 'annex': 3,
+    'title': 4,
+}
+
+# Parsed citation numbers: 12, 12A, 1219.54, 3-101, 2019/45 is handled as an instrument number
+NUMBER_PATTERN = r'\d+[A-Za-z]?(?:[.\-–]\d+[A-Za-z]?)*'
+SUBDIVISION_PATTERN = r'(?:\s*\(\s*[0-9A-Za-z]{1,5}\s*\))*'
+
+
+class Designation(BaseModel):
+    """One labelled part of a reference, e.g. Article 12(3)"""
+    model_config = ConfigDict(frozen=True)
+
+    kind: Optional[str] = None  # Canonical label ('article', 'section', ...), None for a bare number
+    number: str
+    subdivisions: Tuple[str, ...] = ()
+    source_text: str  # As written in the reference
+
+
+class SearchPatterns(BaseModel):
+    """
+    Ranked search patterns for one legal reference, most specific first.
+    Immutable: compile_reference_patterns memoizes them and every caller shares the same instance.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    designations: Tuple[Designation, ...] = ()  # Most specific first (see KIND_SPECIFICITY)
+    instrument: Optional[str] = None
+    literals: Tuple[str, ...] = ()
+    # One regex per designation and breadth tier: tier by tier, most specific designation first within a tier.
+    # Try them in list order; regex_tiers / regex_designations give each one's tier and index into designations.
+    regexes: Tuple[Pattern, ...] = ()
+    regex_tiers: Tuple[int, ...] = ()
+    regex_designations: Tuple[int, ...] = ()
+
+
+def _languages_for(jurisdiction: Optional[str]) -> Tuple[str, ...]:
+    if not jurisdiction:
+        return tuple(LABEL_ALIASES)  # Unknown jurisdiction: accept every spelling we know
+    prefix = re.split(r'[^a-z]', jurisdiction.lower(), maxsplit=1)[0]
+    return tuple(['en'] + [language for language in JURISDICTION_LANGUAGES.get(prefix, []) if language != 'en'])
+
+
+def _label_regex(aliases: List[str]) -> str:
+    """Alternation of label spellings, longest first; word labels must not follow a letter"""
+    parts = []
+    for alias in sorted(set(aliases), key=len, reverse=True):
+        escaped = re.escape(alias)
+        parts.append(rf'(?<![^\W\d_]){escaped}' if alias[0].isalpha() else escaped)
+    return '(?:' + '|'.join(parts) + ')'
+
+
+@lru_cache(maxsize=64)
+def _jurisdiction_grammar(languages: Tuple[str, ...]) -> Tuple[Pattern, Dict[str, str], Dict[str, str]]:
+    """
+    Compiled once per language set: the tokenizer for designations, a lookup from
+    spelling to canonical label, and each canonical label's alternation regex.
+    """
+    spelling_to_kind: Dict[str, str] = {}
+    kind_aliases: Dict[str, List[str]] = {}
+    for language in languages:
+        for kind, aliases in LABEL_ALIASES.get(language, {}).items():
+            for alias in aliases:
+                spelling_to_kind.setdefault(alias.lower(), kind)
+                kind_aliases.setdefault(kind, []).append(alias)
+
+    label_alternation = _label_regex([alias for aliases in kind_aliases.values() for alias in aliases])
+    tokenizer = re.compile(
+        rf'(?P<label>{label_alternation})?\s*(?P<number>{NUMBER_PATTERN})(?P<subs>{SUBDIVISION_PATTERN})',
+        re.IGNORECASE
+    )
+    kind_regexes = {kind: _label_regex(aliases) for kind, aliases in kind_aliases.items()}
+    return tokenizer, spelling_to_kind, kind_regexes
+
+
+_INSTRUMENT = re.compile(
+    r'(?<![^\W\d_])(?P<word>' + '|'.join(INSTRUMENT_WORDS) + r')\s+(?:(?:no|n[°º]|nr|núm|num)\.?\s*)?(?P<number>\d+(?:[/.\-]\d+)*)',
+    re.IGNORECASE
+)
+
+
+_YEAR = re.compile(r'(?:18|19|20)\d\d')
+
+
+def _is_distinctive(number: str) -> bool:
+    """Bare numbers are only worth searching for when they're unlikely to match by accident"""
+    return bool(re.search(r'[.\-–]', number)) or len(number) >= 3
+
+
+def parse_legal_reference(legal_reference: str, jurisdiction: Optional[str] = None) -> Tuple[List[Designation], Optional[str]]:
+    """Split a reference into its labelled designations and the instrument it belongs to, if named"""
+    tokenizer, spelling_to_kind, _ = _jurisdiction_grammar(_languages_for(jurisdiction))
+
+    instrument = None
+    remainder = legal_reference
+    instrument_match = _INSTRUMENT.search(legal_reference)
+    if instrument_match:
+        instrument = ' '.join(instrument_match.group(0).split())
+        # Blank it out so the instrument's number isn't read as a section number
+        remainder = legal_reference[:instrument_match.start()] + ' ' * len(instrument_match.group(0)) + legal_reference[instrument_match.end():]
+
+    designations = []
+    for match in tokenizer.finditer(remainder):
+        label = match.group('label')
+        kind = spelling_to_kind.get(label.lower()) if label else None
+        if kind is None and (not _is_distinctive(match.group('number')) or _YEAR.fullmatch(match.group('number'))):
+            continue  # Unlabelled short numbers and years ("7 CFR", "de 2012") aren't designations
+        designations.append(Designation(
+            kind=kind,
+            number=match.group('number'),
+            subdivisions=tuple(re.findall(r'\(\s*([0-9A-Za-z]{1,5})\s*\)', match.group('subs'))),
+            source_text=' '.join(match.group(0).split())
+        ))
+    return designations, instrument
+
+
+def label_kind(label: str, jurisdiction: Optional[str] = None) -> Optional[str]:
+    """Canonical designation kind for a label spelling ('Art.' -> 'article'), None if unknown"""
+    _, spelling_to_kind, _ = _jurisdiction_grammar(_languages_for(jurisdiction))
+    return spelling_to_kind.get(label.lower())
+
+
+@lru_cache(maxsize=256)
+def heading_regex(kind: Optional[str] = None, jurisdiction: Optional[str] = None) -> Pattern:
+    """Line-start heading of any numbered designation of `kind` (any label if None), e.g. to find where a section ends"""
+    _, _, kind_regexes = _jurisdiction_grammar(_languages_for(jurisdiction))
+    label = kind_regexes.get(kind) if kind else None
+    if label is None:
+        label = '(?:' + '|'.join(kind_regexes.values()) + ')'
+    return re.compile(rf'^[ \t]*(?P<label>{label})\.?\s*(?P<number>{NUMBER_PATTERN})', re.IGNORECASE | re.MULTILINE)
+
+
+def _number_regex(designation: Designation, with_subdivisions: bool, bare: bool = False) -> str:
+    # A bare number must not be the tail of a longer number; after a label anything may precede it ("Art.12")
+    regex = (r'(?<![\w.])' if bare else '') + re.escape(designation.number)
+    if with_subdivisions:
+        return regex + ''.join(rf'\s*\(\s*{re.escape(sub)}\s*\)' for sub in designation.subdivisions)
+    # "12" must not match 12A, 123 or 12.5
+    return regex + r'(?![\w]|[.\-–]\d)'
+
+
+def _canonical_literals(designation: Designation) -> List[str]:
+    subs = ''.join(f'({sub})' for sub in designation.subdivisions)
+    if designation.kind == 'section':
+        return [f'§ {designation.number}{subs}', f'§{designation.number}{subs}', f'Section {designation.number}{subs}']
+    if designation.kind:
+        return [f'{designation.kind.capitalize()} {designation.number}{subs}']
+    return []
+
+
+@lru_cache(maxsize=8192)
+def compile_reference_patterns(legal_reference: str, jurisdiction: Optional[str] = None) -> SearchPatterns:
+    """
+    Ranked, increasingly broad patterns for a legal reference.
+
+    Literals: the reference as written, each designation as written and in
+    canonical spelling, then without subdivisions, then distinctive bare numbers
+    and the instrument. Regexes: per designation, any label spelling + number +
+    subdivisions, then any label + number, then the bare number - a handful of
+    compiled patterns regardless of how many spellings the jurisdiction has.
+    Designations are ordered most specific first, and each tier has one regex
+    per designation in that order, so a reference like "Section 5, Chapter 3"
+    finds Section 5 before the enclosing Chapter 3 heading.
+    """
+    reference = ' '.join((legal_reference or '').split())
+    if not reference:
+        return SearchPatterns()
+
+    designations, instrument = parse_legal_reference(reference, jurisdiction)
+    designations.sort(key=lambda designation: KIND_SPECIFICITY.get(designation.kind, 2))  # Stable: ties keep reference order
+    _, _, kind_regexes = _jurisdiction_grammar(_languages_for(jurisdiction))
+
+    literals = [reference]
+    specific, labelled, bare = [], [], []  # (designation index, regex source)
+    for position, designation in enumerate(designations):
+        literals.append(designation.source_text)
+        literals.extend(_canonical_literals(designation))
+        if designation.subdivisions:
+            without_subs = designation.model_copy(update={'subdivisions': ()})
+            literals.extend(_canonical_literals(without_subs))
+
+        label = kind_regexes.get(designation.kind) if designation.kind else None
+        if label:
+            if designation.subdivisions:
+                specific.append((position, rf'{label}\s*{_number_regex(designation, with_subdivisions=True)}'))
+            labelled.append((position, rf'{label}\s*{_number_regex(designation, with_subdivisions=False)}'))
+        elif designation.subdivisions:
+            specific.append((position, _number_regex(designation, with_subdivisions=True, bare=True)))
+        if _is_distinctive(designation.number):
+            bare.append((position, _number_regex(designation, with_subdivisions=False, bare=True)))
+
+    for designation in designations:
+        if _is_distinctive(designation.number):
+            literals.append(designation.number)
+    if instrument:
+        literals.append(instrument)
+
+    # Tiers that are empty for this reference are skipped, so tier 0 is always the most specific one present
+    regexes, regex_tiers, regex_designations = [], [], []
+    for tier, sources in enumerate(tier for tier in (specific, labelled, bare) if tier):
+        for position, source in sources:
+            regexes.append(re.compile(source, re.IGNORECASE))
+            regex_tiers.append(tier)
+            regex_designations.append(position)
+
+    return SearchPatterns(
+        designations=tuple(designations),
+        instrument=instrument,
+        literals=tuple(dict.fromkeys(literal for literal in literals if literal)),
+        regexes=tuple(regexes),
+        regex_tiers=tuple(regex_tiers),
+        regex_designations=tuple(regex_designations)
+    )
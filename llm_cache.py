@@ -0,0 +1,151 @@
+from pydantic import BaseModel
+from typing import Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils.llm import LLMResponse, cost_of
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'llm')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+class LLMCacheStats(BaseModel):
+    """Counters for an LLMCache since it was opened, plus its current size"""
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    expired: int = 0
+    evictions: int = 0
+    entries: int = 0
+    total_bytes: int = 0
+    input_tokens_saved: int = 0
+    output_tokens_saved: int = 0
+    dollars_saved: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so formatting-only prompt changes share a cache entry"""
+    return ' '.join(text.split())
+
+
+def response_key(model: str,
+                 prompt: str,
+                 system: Optional[str] = None,
+                 max_tokens: int = 0,
+                 context_digest: str = '') -> str:
+    """Cache key from the model, the normalized prompt and the digest of the document context it was built from"""
+    parts = [model, normalize_prompt(system or ''), normalize_prompt(prompt), str(max_tokens), context_digest]
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent cache of LLM completions.
+
+    Re-running a batch asks the same questions about the same pages, so
+    responses are stored in SQLite keyed by model, normalized prompt and the
+    skeleton digest of the page. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted once the cache exceeds `max_bytes`.
+    Hits are priced with pricing_data so stats() reports what was saved.
+    Only deterministic (temperature 0) completions should be cached.
+    """
+    def __init__(self,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = 256 * 1024 ** 2,
+                 ttl: float = 30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'responses.sqlite'), check_same_thread=False, timeout=30)
+        self._conn.executescript(_SCHEMA)
+        self._stats = LLMCacheStats()
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        """Look up a response, counting the hit or miss and dropping it if expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT model, text, input_tokens, output_tokens, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and now - row[4] >= self.ttl:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self._stats.expired += 1
+                row = None
+            if row is None:
+                self._stats.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            model, text, input_tokens, output_tokens = row[0], row[1], row[2], row[3]
+            self._stats.hits += 1
+            self._stats.input_tokens_saved += input_tokens
+            self._stats.output_tokens_saved += output_tokens
+            self._stats.dollars_saved += cost_of(model, input_tokens, output_tokens)
+        return LLMResponse(model=model, text=text, input_tokens=input_tokens, output_tokens=output_tokens, cached=True)
+
+    def put(self, key: str, response: LLMResponse):
+        """Store a response, evicting old entries if over budget"""
+        now = time.time()
+        size = len(response.text.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, text, input_tokens, output_tokens, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.model, response.text, response.input_tokens, response.output_tokens, size, now, now)
+            )
+            self._conn.commit()
+            self._stats.stores += 1
+            self._evict()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes. Caller holds the lock."""
+        expired = self._conn.execute('DELETE FROM responses WHERE created_at <= ?', (time.time() - self.ttl,)).rowcount
+        self._stats.expired += max(expired, 0)
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            row = self._conn.execute('SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1').fetchone()
+            if row is None:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (row[0],))
+            self._stats.evictions += 1
+            total -= row[1]
+        self._conn.commit()
+
+    def stats(self) -> LLMCacheStats:
+        """Hit/miss and savings counters for this process plus current entry count and size"""
+        with self._lock:
+            stats = self._stats.model_copy()
+            stats.entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            stats.total_bytes = self._total_bytes()
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
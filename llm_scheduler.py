@@ -0,0 +1,267 @@
+"""
+Rate-limited dispatch of LLM requests.
+
+Every Pathfinder LLM call goes through one LLMScheduler so concurrent citations
+share the provider limits from pricing_data instead of discovering them through
+429s. Each model gets two token buckets - requests per minute and tokens per
+minute - and a priority queue; a request is only sent once both buckets can
+cover it, with its token cost pre-counted with tiktoken (prompt plus the
+max_tokens it may generate, refunded down to the real usage afterwards).
+
+Lower priority numbers go first, so structure guidance for a new page is sent
+ahead of deep recursive content analysis. A 429 halves the model's effective
+rate, which then recovers gradually on successful calls.
+
+The scheduler runs its own event loop on a daemon thread, so the synchronous
+scraper and the async batch runner can both submit to it.
+"""
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, Optional
+import asyncio
+import itertools
+import threading
+import time
+
+from page_readiness import backoff_delay
+from utils.llm import LLMResponse, acomplete, count_tokens, is_rate_limited, model_info, retry_after
+from llm_cache import LLMCache, response_key
+
+PRIORITY_GUIDANCE = 0  # Page-level structure guidance
+PRIORITY_ANALYSIS = 10  # Content analysis; depth is added so shallow analysis goes first
+
+DEFAULT_RPM = 50
+DEFAULT_TPM = 40000
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously at `rate` tokens per second"""
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, scale: float):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float = 1.0) -> float:
+        """Seconds until `amount` tokens are available at `scale` times the normal rate"""
+        self._refill(scale)
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket rather than forever
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * scale)
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class SchedulerStats(BaseModel):
+    """Counters for an LLMScheduler since it started"""
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cache_hits: int = 0
+    cancelled: int = 0  # Requests withdrawn by the caller before they finished
+    rate_limited: int = 0  # 429 / overloaded responses received
+    throttled_seconds: float = 0.0  # Time requests spent waiting on the buckets
+
+
+class _Request(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: str
+    prompt: str
+    system: Optional[str] = None
+    max_tokens: int
+    temperature: float
+    estimated_tokens: int
+    attempt: int = 0
+    future: Future
+
+
+class _ModelLimiter:
+    """Buckets, queue and adaptive rate scale for one model"""
+    def __init__(self, model: str):
+        info = model_info(model)
+        rpm = info.get('RPM', DEFAULT_RPM)
+        tpm = info.get('TPM', DEFAULT_TPM)
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.scale = 1.0  # Fraction of the published rate currently used
+        self.paused_until = 0.0  # Monotonic time before which nothing is sent (Retry-After)
+
+    def wait_time(self, estimated_tokens: int) -> float:
+        pause = self.paused_until - time.monotonic()
+        return max(pause, self.requests.wait_time(1, self.scale), self.tokens.wait_time(estimated_tokens, self.scale))
+
+    def take(self, estimated_tokens: int):
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+
+    def on_success(self):
+        self.scale = min(1.0, self.scale + 0.05)
+
+    def on_rate_limited(self, pause: float):
+        self.scale = max(0.1, self.scale / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+
+class LLMScheduler:
+    """Priority- and rate-limit-aware LLM dispatcher shared by every Pathfinder in the process"""
+    def __init__(self, max_in_flight: int = 16, max_retries: int = 5):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self._stats = SchedulerStats()
+        self._sequence = itertools.count()  # Tie-breaker keeping FIFO order within a priority
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._loop = asyncio.new_event_loop()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._thread = threading.Thread(target=self._run_loop, name='llm-scheduler', daemon=True)
+        self._started = threading.Event()
+        self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._started.set()
+        self._loop.run_forever()
+
+    def estimate_tokens(self, model: str, prompt: str, system: Optional[str], max_tokens: int) -> int:
+        """Worst-case TPM cost of a request: its input tokens plus everything it is allowed to generate"""
+        return count_tokens((system or '') + prompt, model) + max_tokens
+
+    def submit(self,
+               model: str,
+               prompt: str,
+               system: Optional[str] = None,
+               max_tokens: int = 1024,
+               temperature: float = 0.0,
+               priority: int = PRIORITY_ANALYSIS,
+               cache: Optional[LLMCache] = None,
+               context_digest: str = '') -> Future:
+        """Queue a completion; the returned future resolves to an LLMResponse"""
+        future: Future = Future()
+        self._stats.submitted += 1
+
+        # Cache hits never touch the rate limits
+        key = None
+        if cache is not None and temperature == 0.0:
+            key = response_key(model, prompt, system, max_tokens, context_digest)
+            cached = cache.get(key)
+            if cached is not None:
+                self._stats.cache_hits += 1
+                self._stats.completed += 1
+                future.set_result(cached)
+                return future
+            future.add_done_callback(lambda done: self._store(cache, key, done))
+
+        request = _Request(model=model, prompt=prompt, system=system, max_tokens=max_tokens, temperature=temperature,
+                           estimated_tokens=self.estimate_tokens(model, prompt, system, max_tokens), future=future)
+        self._loop.call_soon_threadsafe(self._enqueue, priority, request)
+        return future
+
+    def complete(self, model: str, prompt: str, timeout: Optional[float] = None, **kwargs) -> LLMResponse:
+        """Blocking wrapper around submit() for synchronous callers. On timeout the request is cancelled."""
+        future = self.submit(model, prompt, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    @staticmethod
+    def _store(cache: LLMCache, key: str, done: Future):
+        if not done.cancelled() and done.exception() is None and done.result().text:
+            cache.put(key, done.result())
+
+    def _enqueue(self, priority: int, request: _Request):
+        """Runs on the scheduler loop"""
+        limiter = self._limiters.get(request.model)
+        if limiter is None:
+            limiter = self._limiters[request.model] = _ModelLimiter(request.model)
+            self._loop.create_task(self._dispatch(limiter))
+        limiter.queue.put_nowait((priority, next(self._sequence), request))
+
+    async def _dispatch(self, limiter: _ModelLimiter):
+        """Send a model's queued requests in priority order as fast as its buckets allow"""
+        while True:
+            priority, sequence, request = await limiter.queue.get()
+            if request.future.cancelled():
+                self._stats.cancelled += 1
+                continue
+            wait = limiter.wait_time(request.estimated_tokens)
+            if wait > 0:
+                self._stats.throttled_seconds += wait
+                await asyncio.sleep(wait)
+                # Something more urgent may have arrived while we waited
+                limiter.queue.put_nowait((priority, sequence, request))
+                continue
+            limiter.take(request.estimated_tokens)
+            await self._slots.acquire()
+            task = self._loop.create_task(self._send(limiter, priority, request))
+            # Cancelling the caller's future also aborts the HTTP request if it's still in flight
+            request.future.add_done_callback(
+                lambda done, task=task: done.cancelled() and self._loop.call_soon_threadsafe(task.cancel)
+            )
+
+    async def _send(self, limiter: _ModelLimiter, priority: int, request: _Request):
+        try:
+            response = await acomplete(request.model, request.prompt, system=request.system,
+                                       max_tokens=request.max_tokens, temperature=request.temperature)
+        except asyncio.CancelledError:
+            self._stats.cancelled += 1
+            return
+        except Exception as e:
+            if is_rate_limited(e) and request.attempt < self.max_retries:
+                self._stats.rate_limited += 1
+                limiter.on_rate_limited(retry_after(e) or backoff_delay(request.attempt, base=1.0, cap=60.0))
+                request.attempt += 1
+                limiter.queue.put_nowait((priority, next(self._sequence), request))
+            else:
+                self._stats.failed += 1
+                _resolve(request.future, error=e)
+            return
+        finally:
+            self._slots.release()
+
+        # Refund the part of the worst-case estimate the call didn't use
+        used = response.input_tokens + response.output_tokens
+        if used:
+            limiter.tokens.give_back(max(0, request.estimated_tokens - used))
+        limiter.on_success()
+        self._stats.completed += 1
+        _resolve(request.future, response=response)
+
+    def stats(self) -> SchedulerStats:
+        return self._stats.model_copy()
+
+    def shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def _resolve(future: Future, response: Optional[LLMResponse] = None, error: Optional[Exception] = None):
+    """Complete a caller's future unless it was cancelled in the meantime"""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+    except InvalidStateError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def default_scheduler() -> LLMScheduler:
+    """Process-wide scheduler; provider limits are per API key, so every Pathfinder should share one"""
+    return LLMScheduler()
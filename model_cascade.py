@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import re
+
+
+class CascadePolicy(BaseModel):
+    """Which models to try for content analysis, cheapest first, and when to move up a tier"""
+    models: List[str] = Field(default_factory=lambda: ['claude-3-haiku-20240307', 'claude-3-sonnet-20240229', 'claude-3-opus-20240229'])
+    # Confidences inside [low, high) are too uncertain to act on and go to the next model.
+    # Below the band the element is confidently wrong, above it confidently right.
+    uncertainty_low: float = 0.3
+    uncertainty_high: float = 0.85
+    max_tier: Optional[int] = None  # Highest tier index that may be used; None = all of them
+
+    def should_escalate(self, tier: int, confidence: float) -> bool:
+        last_tier = len(self.models) - 1 if self.max_tier is None else min(self.max_tier, len(self.models) - 1)
+        return tier < last_tier and self.uncertainty_low <= confidence < self.uncertainty_high
+
+
+DEFAULT_CASCADE = CascadePolicy()
+
+# Jurisdiction prefix (as in Citation.jurisdiction_id) -> policy. Non-English statutes
+# trip up the smallest model more often, so they start one tier higher.
+JURISDICTION_CASCADES: Dict[str, CascadePolicy] = {
+    'us': CascadePolicy(uncertainty_high=0.8),
+    'gb': CascadePolicy(uncertainty_high=0.8),
+    'de': CascadePolicy(models=['claude-3-sonnet-20240229', 'claude-3-opus-20240229']),
+    'fr': CascadePolicy(models=['claude-3-sonnet-20240229', 'claude-3-opus-20240229']),
+}
+
+
+def cascade_for(jurisdiction: Optional[str], overrides: Optional[Dict[str, CascadePolicy]] = None) -> CascadePolicy:
+    """Resolve the cascade policy for a jurisdiction id such as 'us-ca' or 'de'"""
+    policies = overrides if overrides is not None else JURISDICTION_CASCADES
+    if not jurisdiction:
+        return DEFAULT_CASCADE
+    jurisdiction = jurisdiction.lower()
+    if jurisdiction in policies:
+        return policies[jurisdiction]
+    prefix = re.split(r'[^a-z]', jurisdiction, maxsplit=1)[0]
+    return policies.get(prefix, DEFAULT_CASCADE)
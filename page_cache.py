@@ -0,0 +1,223 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'pages')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    tier TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access);
+CREATE INDEX IF NOT EXISTS pages_body_hash ON pages (body_hash);
+"""
+
+
+class CacheEntry(BaseModel):
+    """A cached page body with the validators needed to revalidate it"""
+    url: str
+    content: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_type: Optional[str] = None
+    tier: Optional[str] = None  # Fetch tier that originally produced the body
+    fetched_at: float
+
+
+class CacheStats(BaseModel):
+    """Counters for a PageCache since it was opened, plus its current size"""
+    hits: int = 0
+    revalidated: int = 0  # Hits that needed a conditional request answered with 304
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    entries: int = 0
+    total_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def normalize_url(url: str) -> str:
+    """Canonical cache key for a URL: lower-cased scheme/host, default ports and fragment removed"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f'{host}:{parts.port}'
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+class PageCache:
+    """
+    Persistent on-disk page cache.
+
+    Entries are keyed by normalized URL, so every `#fragment` citation on a page
+    shares one entry. Bodies are zlib-compressed and stored content-addressed by
+    their SHA-256, so identical pages served under different URLs are stored once.
+    An SQLite index holds ETag / Last-Modified validators for conditional
+    revalidation and is used for least-recently-used eviction once the cache
+    exceeds `max_bytes`.
+    """
+    def __init__(self,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = 2 * 1024 ** 3,
+                 fresh_for: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for  # Seconds an entry is served without revalidation
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False, timeout=30)
+        self._conn.executescript(_SCHEMA)
+        self._stats = CacheStats()
+
+    def settings(self) -> Dict[str, Any]:
+        """Constructor arguments that open this same cache, e.g. in a worker process"""
+        return {'cache_dir': self.cache_dir, 'max_bytes': self.max_bytes, 'fresh_for': self.fresh_for}
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def _body_path(self, body_hash: str) -> str:
+        return os.path.join(self.cache_dir, 'bodies', body_hash[:2], body_hash + '.z')
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.fresh_for
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Look up a page without touching the hit/miss counters"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, body_hash, etag, last_modified, content_type, tier, fetched_at FROM pages WHERE url_key = ?',
+                (self._key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(self._body_path(row[1]), 'rb') as f:
+                content = zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            # Body went missing or is corrupt - treat as a miss and drop the index row
+            self.delete(url)
+            return None
+        return CacheEntry(url=row[0], content=content, etag=row[2], last_modified=row[3],
+                          content_type=row[4], tier=row[5], fetched_at=row[6])
+
+    def record_hit(self, url: str, revalidated: bool = False):
+        """Count a hit and mark the entry as recently used. Revalidated hits also reset freshness."""
+        now = time.time()
+        with self._lock:
+            self._stats.hits += 1
+            if revalidated:
+                self._stats.revalidated += 1
+                self._conn.execute('UPDATE pages SET last_access = ?, fetched_at = ? WHERE url_key = ?', (now, now, self._key(url)))
+            else:
+                self._conn.execute('UPDATE pages SET last_access = ? WHERE url_key = ?', (now, self._key(url)))
+            self._conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self._stats.misses += 1
+
+    def put(self,
+            url: str,
+            content: str,
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None,
+            content_type: Optional[str] = None,
+            tier: Optional[str] = None):
+        """Store or replace the body for a URL, evicting old entries if over budget"""
+        raw = content.encode('utf-8')
+        body_hash = hashlib.sha256(raw).hexdigest()
+        body_path = self._body_path(body_hash)
+        compressed = zlib.compress(raw, 6)  # Deterministic, so its length is the stored size even if the body exists
+        size = len(compressed)
+
+        now = time.time()
+        # The body write and the index update are one step: a concurrent put or eviction
+        # could otherwise drop the body between the existence check and the row insert
+        with self._lock:
+            if not os.path.exists(body_path):
+                os.makedirs(os.path.dirname(body_path), exist_ok=True)
+                tmp_path = f'{body_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, body_path)
+            previous = self._conn.execute('SELECT body_hash FROM pages WHERE url_key = ?', (self._key(url),)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (url_key, url, body_hash, size, etag, last_modified, content_type, tier, fetched_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self._key(url), normalize_url(url), body_hash, size, etag, last_modified, content_type, tier, now, now)
+            )
+            self._conn.commit()
+            self._stats.stores += 1
+            if previous and previous[0] != body_hash:
+                self._drop_body_if_unreferenced(previous[0])
+            self._evict()
+
+    def delete(self, url: str):
+        with self._lock:
+            row = self._conn.execute('SELECT body_hash FROM pages WHERE url_key = ?', (self._key(url),)).fetchone()
+            self._conn.execute('DELETE FROM pages WHERE url_key = ?', (self._key(url),))
+            self._conn.commit()
+            if row:
+                self._drop_body_if_unreferenced(row[0])
+
+    def _drop_body_if_unreferenced(self, body_hash: str) -> bool:
+        """Remove a body file once no URL points at it. Caller holds the lock."""
+        still_used = self._conn.execute('SELECT 1 FROM pages WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone()
+        if still_used:
+            return False
+        try:
+            os.remove(self._body_path(body_hash))
+        except OSError:
+            pass
+        return True
+
+    def _total_bytes(self) -> int:
+        row = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM pages)').fetchone()
+        return row[0]
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock."""
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            row = self._conn.execute('SELECT url_key, body_hash, size FROM pages ORDER BY last_access ASC LIMIT 1').fetchone()
+            if row is None:
+                break
+            self._conn.execute('DELETE FROM pages WHERE url_key = ?', (row[0],))
+            self._conn.commit()
+            self._stats.evictions += 1
+            if self._drop_body_if_unreferenced(row[1]):
+                total -= row[2]
+
+    def stats(self) -> CacheStats:
+        """Hit/miss counters for this process plus current entry count and size on disk"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            stats = self._stats.model_copy()
+            stats.entries = entries
+            stats.total_bytes = self._total_bytes()
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
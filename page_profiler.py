@@ -0,0 +1,78 @@
+from bs4 import BeautifulSoup
+from bs4.element import CData, NavigableString, Tag
+from pydantic import BaseModel, Field
+from typing import Dict, List, Tuple
+
+from parsing import document_cache
+
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+STRUCTURE_TAGS = {'section', 'div', 'article'}
+MAX_HEADING_TEXT = 120
+
+
+class PageProfile(BaseModel):
+    """Size and structure metrics for a parsed page, gathered in one traversal"""
+    text_length: int = 0  # Same count as len(soup.get_text())
+    element_count: int = 0
+    max_depth: int = 0
+    structure_count: int = 0  # section/div/article elements
+    tag_histogram: Dict[str, int] = Field(default_factory=dict)
+    heading_outline: List[Tuple[int, str]] = Field(default_factory=list)  # (level, heading text) in document order
+    text_density: float = 0.0  # Visible characters per element
+
+
+def build_page_profile(soup: BeautifulSoup) -> PageProfile:
+    """Walk the tree once and collect every metric used for routing decisions"""
+    text_length = 0
+    max_depth = 0
+    tag_histogram: Dict[str, int] = {}
+    heading_outline: List[Tuple[int, str]] = []
+    depths: Dict[int, int] = {id(soup): 0}
+
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            depth = depths.get(id(node.parent), 0) + 1
+            depths[id(node)] = depth
+            if depth > max_depth:
+                max_depth = depth
+            tag_histogram[node.name] = tag_histogram.get(node.name, 0) + 1
+            level = HEADING_LEVELS.get(node.name)
+            if level:
+                heading_outline.append((level, node.get_text(' ', strip=True)[:MAX_HEADING_TEXT]))
+        elif type(node) in (NavigableString, CData):  # The string types get_text() counts
+            text_length += len(node)
+
+    element_count = sum(tag_histogram.values())
+    return PageProfile(
+        text_length=text_length,
+        element_count=element_count,
+        max_depth=max_depth,
+        structure_count=sum(tag_histogram.get(tag, 0) for tag in STRUCTURE_TAGS),
+        tag_histogram=tag_histogram,
+        heading_outline=heading_outline,
+        text_density=text_length / element_count if element_count else 0.0
+    )
+
+
+def get_page_profile(soup: BeautifulSoup) -> PageProfile:
+    """Profile a document once; the scraper and Pathfinder share the cached result"""
+    cache = document_cache(soup)
+    if 'profile' not in cache:
+        cache['profile'] = build_page_profile(soup)
+    return cache['profile']
+
+
+def seed_page_profile(soup: BeautifulSoup, text_length: int, element_count: int, max_depth: int, structure_count: int) -> PageProfile:
+    """
+    Cache routing metrics already measured without the tree (e.g. by a streaming scan) so the
+    document isn't walked again. The tag histogram and heading outline are left empty.
+    """
+    profile = PageProfile(
+        text_length=text_length,
+        element_count=element_count,
+        max_depth=max_depth,
+        structure_count=structure_count,
+        text_density=text_length / element_count if element_count else 0.0
+    )
+    document_cache(soup)['profile'] = profile
+    return profile
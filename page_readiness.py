@@ -0,0 +1,125 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
+from urllib.parse import urlparse
+import random
+import time
+
+
+class ReadinessPolicy(BaseModel):
+    """How to decide that a page has finished rendering"""
+    timeout: float = 15.0  # Hard cap in seconds for loading the page and the whole readiness wait
+    wait_for_selectors: List[str] = Field(default_factory=list)  # CSS selectors that must be present
+    wait_for_quiescence: bool = True  # Wait until DOM mutations and network requests go quiet
+    quiet_period: float = 0.5  # Seconds without DOM mutations / new requests that count as idle
+    poll_interval: float = 0.1
+
+
+# Per-domain overrides. Static, server-rendered sources only need readyState;
+# JS-heavy portals get selectors and a longer hard timeout.
+DEFAULT_POLICY = ReadinessPolicy()
+DOMAIN_POLICIES: Dict[str, ReadinessPolicy] = {
+    'www.ecfr.gov': ReadinessPolicy(timeout=20.0, wait_for_selectors=['#content'], wait_for_quiescence=False),
+    'www.legislation.gov.uk': ReadinessPolicy(timeout=10.0, wait_for_quiescence=False),
+}
+
+# Installs a MutationObserver that records the time of the last DOM change.
+# Safe to run more than once per page.
+_INSTALL_OBSERVER_JS = """
+if (!window.__scraperLastMutation) {
+    window.__scraperLastMutation = Date.now();
+    new MutationObserver(function() { window.__scraperLastMutation = Date.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return true;
+"""
+
+# Milliseconds since the last DOM mutation and since the last network resource finished
+_QUIET_STATE_JS = """
+var now = Date.now();
+var entries = performance.getEntriesByType('resource');
+var lastResponse = 0;
+for (var i = 0; i < entries.length; i++) {
+    if (entries[i].responseEnd > lastResponse) { lastResponse = entries[i].responseEnd; }
+}
+return {
+    mutation_idle: now - (window.__scraperLastMutation || 0),
+    network_idle: performance.now() - lastResponse,
+    resource_count: entries.length
+};
+"""
+
+
+def policy_for_url(url: str, overrides: Optional[Dict[str, ReadinessPolicy]] = None) -> ReadinessPolicy:
+    """Resolve the readiness policy for a URL's host"""
+    policies = overrides if overrides is not None else DOMAIN_POLICIES
+    host = urlparse(url).netloc.lower()
+    return policies.get(host, DEFAULT_POLICY)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class PageReadiness:
+    """Waits for a loaded page to become ready according to a ReadinessPolicy"""
+    def __init__(self, domain_policies: Optional[Dict[str, ReadinessPolicy]] = None):
+        self.domain_policies = domain_policies if domain_policies is not None else DOMAIN_POLICIES
+
+    def load(self, driver, url: str) -> bool:
+        """
+        Navigate to `url` and wait until it is ready, all within the domain's hard timeout.
+
+        Raises TimeoutException if the document itself does not load in time; callers
+        treat that as a retryable load failure. Otherwise behaves like wait_until_ready.
+        """
+        policy = policy_for_url(url, self.domain_policies)
+        deadline = time.monotonic() + policy.timeout
+        # Set on every checkout: pooled drivers serve many domains
+        driver.set_page_load_timeout(policy.timeout)
+        driver.get(url)
+        return self._wait(driver, policy, deadline)
+
+    def wait_until_ready(self, driver, url: str) -> bool:
+        """
+        Block until the page is ready or the domain's hard timeout expires.
+
+        Returns True if every condition was met, False on timeout. A timeout is not
+        an error - the caller still gets whatever has rendered so far.
+        """
+        policy = policy_for_url(url, self.domain_policies)
+        return self._wait(driver, policy, time.monotonic() + policy.timeout)
+
+    def _wait(self, driver, policy: ReadinessPolicy, deadline: float) -> bool:
+        def remaining() -> float:
+            return max(0.0, deadline - time.monotonic())
+
+        try:
+            WebDriverWait(driver, remaining(), poll_frequency=policy.poll_interval).until(
+                lambda d: d.execute_script('return document.readyState') == 'complete'
+            )
+
+            for selector in policy.wait_for_selectors:
+                WebDriverWait(driver, remaining(), poll_frequency=policy.poll_interval).until(
+                    lambda d: d.find_elements(By.CSS_SELECTOR, selector)
+                )
+
+            if policy.wait_for_quiescence:
+                return self._wait_for_quiescence(driver, policy, deadline)
+            return True
+        except (TimeoutException, WebDriverException):
+            return False
+
+    def _wait_for_quiescence(self, driver, policy: ReadinessPolicy, deadline: float) -> bool:
+        """Wait until neither the DOM nor the network has changed for `quiet_period`"""
+        driver.execute_script(_INSTALL_OBSERVER_JS)
+        quiet_ms = policy.quiet_period * 1000
+        while time.monotonic() < deadline:
+            state = driver.execute_script(_QUIET_STATE_JS)
+            if state['mutation_idle'] >= quiet_ms and state['network_idle'] >= quiet_ms:
+                return True
+            time.sleep(policy.poll_interval)
+        return False
@@ -0,0 +1,93 @@
+"""
+Parser backend selection.
+
+Every backend produces a BeautifulSoup tree, so the operations the scraper and
+Pathfinder rely on - find(id=...), string searches, get_text() and walking
+.parent - behave the same regardless of which parser built the tree. Only the
+tree construction differs:
+
+- 'lxml'         libxml2 via lxml (C), bs4's fastest builtin tree builder
+- 'html5-parser' gumbo/libxml2 via html5-parser (C), builds the soup directly
+- 'html.parser'  pure-Python stdlib parser, always available
+
+The default is the first installed backend in PREFERRED_BACKENDS and can be
+overridden with the SCRAPER_PARSER_BACKEND environment variable.
+"""
+from bs4 import BeautifulSoup
+from typing import Any, Callable, Dict, List, Optional, Union
+from functools import lru_cache
+import importlib
+import os
+
+PREFERRED_BACKENDS = ['lxml', 'html5-parser', 'html.parser']
+
+
+def _parse_with_bs4_builder(builder: str) -> Callable[[Union[str, bytes]], BeautifulSoup]:
+    def parse(markup: Union[str, bytes]) -> BeautifulSoup:
+        return BeautifulSoup(markup, builder)
+    return parse
+
+
+def _parse_with_html5_parser(markup: Union[str, bytes]) -> BeautifulSoup:
+    from html5_parser import parse
+    return parse(markup, treebuilder='soup', return_root=False)
+
+
+_BACKENDS: Dict[str, Callable[[Union[str, bytes]], BeautifulSoup]] = {
+    'lxml': _parse_with_bs4_builder('lxml'),
+    'html5-parser': _parse_with_html5_parser,
+    'html.parser': _parse_with_bs4_builder('html.parser'),
+}
+
+_BACKEND_MODULES = {
+    'lxml': 'lxml',
+    'html5-parser': 'html5_parser',
+    'html.parser': None,
+}
+
+
+def _importable(module: Optional[str]) -> bool:
+    """Actually import the module: a package can be installed yet fail to load (e.g. html5-parser built against another libxml2)"""
+    if module is None:
+        return True
+    try:
+        importlib.import_module(module)
+        return True
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=None)
+def available_backends() -> List[str]:
+    """Backends whose parser library imports cleanly, in preference order (probed once per process)"""
+    return [name for name in PREFERRED_BACKENDS if _importable(_BACKEND_MODULES[name])]
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """Pick the backend to use: explicit name, then SCRAPER_PARSER_BACKEND, then the fastest installed one"""
+    name = name or os.getenv('SCRAPER_PARSER_BACKEND')
+    available = available_backends()
+    if name is None:
+        return available[0]
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}', expected one of {PREFERRED_BACKENDS}")
+    if name not in available:
+        raise ValueError(f"Parser backend '{name}' is not installed")
+    return name
+
+
+def make_soup(markup: Union[str, bytes], backend: Optional[str] = None) -> BeautifulSoup:
+    """Parse markup into a BeautifulSoup tree with the selected backend"""
+    return _BACKENDS[resolve_backend(backend)](markup)
+
+
+def document_cache(soup: BeautifulSoup) -> Dict[str, Any]:
+    """
+    Per-document memo for structures derived from a tree (index, profile, ...).
+    Stored on the soup itself so it lives and dies with the tree. Uses __dict__
+    directly because attribute access on a Tag falls back to a tree search.
+    """
+    cache = soup.__dict__.get('_derived_cache')
+    if cache is None:
+        cache = soup.__dict__['_derived_cache'] = {}
+    return cache
@@ -16,9 +16,38 @@
 #     └── Flag for human review
 
 from bs4 import BeautifulSoup
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Union
+from bs4.element import Tag
+from pydantic import BaseModel, ConfigDict, Field
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Optional, List, Dict, Set, Tuple
+import time
 from utils.pydanticModels import Citation
+from parsing import document_cache, make_soup, resolve_backend
+from document_index import get_document_index
+from page_profiler import get_page_profile
+from legal_patterns import compile_reference_patterns
+from skeleton import Skeleton, build_skeleton, get_document_skeleton
+from utils.llm import LLMResponse, cost_of, parse_json_response, truncate_to_tokens
+from llm_cache import LLMCache
+from llm_scheduler import PRIORITY_ANALYSIS, PRIORITY_GUIDANCE, LLMScheduler, default_scheduler
+from model_cascade import CascadePolicy, cascade_for
+from candidate_ranker import HEADING_WEIGHTS, WHOLE_PAGE_TAGS, get_candidate_ranking, score_elements
+from site_templates import TemplateStore, select_template, selector_steps
+from handoff import WRAPPER_ATTRIBUTE
+
+
+class LLMCallRecord(BaseModel):
+    """Cost and latency of one LLM call made while resolving a citation"""
+    purpose: str  # 'guidance' or 'analysis'
+    model: str
+    tier: int = 0  # Position in the cascade policy's model list
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0  # Dollars, from pricing_data; zero for cache hits
+    latency: float = 0.0  # Seconds, including time queued in the scheduler
+    cached: bool = False
+    escalated: bool = False  # Confidence fell in the uncertainty band and the next tier was asked
+    shared_by: int = 1  # Citations answered by the same (batched) call
 
 
 class PathfinderResult(BaseModel):
@@ -26,27 +55,162 @@ class PathfinderResult(BaseModel):
     found_content: Optional[str] = None
     confidence: float = 0.0
     requires_human_review: bool = False
-    breadcrumb_path: List[str] = None  # Track the path taken to find content
+    breadcrumb_path: List[str] = None  # Selector steps from <body> to the content, on every path (see site_templates.selector_steps)
+    error_message: Optional[str] = None
+    llm_calls: List[LLMCallRecord] = Field(default_factory=list)
+
+    @property
+    def llm_cost(self) -> float:
+        return sum(call.cost / call.shared_by for call in self.llm_calls)
+
+    @property
+    def llm_latency(self) -> float:
+        return sum(call.latency for call in self.llm_calls)
+
+
+class ContentAnalysis(BaseModel):
+    """Whether an element holds the cited provision, and where to look next if not"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    confidence: float = 0.0
+    should_dive_deeper: bool = False
+    suggested_elements: List[Tag] = Field(default_factory=list)
+    reasoning: str = ''
+    model: Optional[str] = None
+    tier: int = 0
     error_message: Optional[str] = None
 
 
-class SearchContext(BaseModel):
-    """Maintains state during pathfinding operations"""
-    current_depth: int = 0
-    max_depth: int = 3
-    visited_elements: List[str] = None  # Track elements we've already examined
-    search_patterns: List[str] = None  # Current active search patterns
+class SearchContext:
+    """
+    Maintains state during pathfinding operations.
+
+    A plain slotted class rather than a pydantic model: it's updated on every step
+    of the search loop, where validation would be pure overhead.
+    """
+    __slots__ = ('max_depth', 'visited', 'search_patterns', 'llm_calls', 'zoom_outs', 'depth_limited')
+
+    def __init__(self, max_depth: int = 3, search_patterns: Optional[List[str]] = None):
+        self.max_depth = max_depth
+        self.visited: Set[int] = set()  # id() of every element already analysed - subtrees are never analysed twice
+        self.search_patterns: List[str] = search_patterns or []  # Current active search patterns
+        self.llm_calls: List[LLMCallRecord] = []
+        self.zoom_outs = 0
+        self.depth_limited = False  # Some branch was cut off by max_depth
+
+
+class SearchFrame:
+    """One element waiting to be analysed; the path to it is rebuilt from parent links only when a prompt needs it"""
+    __slots__ = ('element', 'depth', 'parent')
+
+    def __init__(self, element: Tag, depth: int = 0, parent: Optional['SearchFrame'] = None):
+        self.element = element
+        self.depth = depth
+        self.parent = parent
+
+    def path(self) -> List[str]:
+        names = []
+        frame = self.parent
+        while frame is not None:
+            names.append(str(frame.element.name))
+            frame = frame.parent
+        names.reverse()
+        return names
+
+STRUCTURE_GUIDANCE_SYSTEM = (
+    "You locate sections of legislation in web pages. You are given an outline of a page's HTML "
+    "structure - one element per line, with a reference like [n12], its tag, id, classes and a little text - "
+    "and one or more legal references to find. Answer only with JSON."
+)
+
+STRUCTURE_GUIDANCE_PROMPT = """Page outline:
+{skeleton}
+
+Legal references to locate (key: reference):
+{targets}
+
+For each key, list up to 5 element references from the outline (most likely first) whose subtree most likely contains the referenced provision, a one-sentence search strategy, and your confidence from 0 to 1.
+Respond with JSON only:
+{{"results": [{{"key": "c0", "candidates": ["n12", "n40"], "strategy": "...", "confidence": 0.8}}]}}"""
+
+CONTENT_ANALYSIS_SYSTEM = (
+    "You check whether a section of a legislation web page is a specific provision. You are given the legal "
+    "reference, the path taken so far, an outline of the section's HTML (references like [n3]) and the start of its text. "
+    "Answer only with JSON."
+)
+
+CONTENT_ANALYSIS_PROMPT = """Legal reference: {reference}
+Path so far: {path}
+
+Section outline:
+{outline}
+
+Section text (may be truncated):
+{text}
+
+Give your confidence from 0 to 1 that this section is exactly the referenced provision (not just a part or a container of it).
+If the provision is inside this section, set dive_deeper and list up to 3 outline references (most likely first) to look at next.
+Respond with JSON only:
+{{"confidence": 0.4, "dive_deeper": true, "suggested": ["n3"], "reasoning": "..."}}"""
+
 
 class Pathfinder:
-    def __init__(self):
+    def __init__(self,
+                 parser_backend: Optional[str] = None,
+                 llm_cache: Optional[LLMCache] = None,
+                 llm_scheduler: Optional[LLMScheduler] = None,
+                 cascade_policies: Optional[Dict[str, CascadePolicy]] = None,
+                 site_templates: Optional[TemplateStore] = None):
+        self.parser_backend = resolve_backend(parser_backend)
+        self.llm_cache = llm_cache
+        self._llm = llm_scheduler
+        self.cascade_policies = cascade_policies  # Per-jurisdiction overrides of model_cascade.JURISDICTION_CASCADES
+        self.site_templates = site_templates  # Learned per-domain paths; None disables template matching
         self.MAX_CONTENT_SIZE = 50000  # Characters - adjust based on testing
+        self.MAX_STRUCTURE_COUNT = 20  # section/div/article elements before a page counts as complex
         self.MIN_CONFIDENCE_THRESHOLD = 0.7
+        self.GUIDANCE_MODEL = 'claude-3-haiku-20240307'
+        self.MAX_GUIDANCE_BATCH = 10  # Citations per structure guidance request
+        self.ANALYSIS_OUTLINE_TOKENS = 1500  # Budget for the element outline in content analysis prompts
+        self.ANALYSIS_TEXT_TOKENS = 2000  # Budget for the element text in content analysis prompts
+        self.PARALLEL_CANDIDATES = True  # Score sibling candidates concurrently (beam search) instead of one by one
+        self.BEAM_WIDTH = 2  # Branches expanded per level in parallel mode
+        self.MAX_ZOOM_OUTS = 1  # Broader passes over the parents of the starting areas before giving up
+        self.MAX_LLM_CANDIDATES = 3  # Top locally ranked target areas sent to content analysis
+        self.LOCAL_RESOLUTION_CONFIDENCE = 0.8  # Reported when the local ranking alone is decisive
+        self.GUIDANCE_BONUS = 1.0  # Added to the local score of the LLM's first suggested area, decaying for later ones
+        self.TEMPLATE_CONFIDENCE = 0.85  # Reported when a learned site template resolves the citation
+        self.LLM_TIMEOUT = 180.0  # Seconds to wait on any scheduler call, queueing included
         
+    @property
+    def llm(self) -> LLMScheduler:
+        """Every LLM call goes through the rate-limited scheduler; resolved on first use so LLM-free callers never start one"""
+        if self._llm is None:
+            self._llm = default_scheduler()
+        return self._llm
+
     def find_target_content(self, html: str, citation: Citation) -> PathfinderResult:
-        """Main entry point for pathfinding operations"""
-        soup = BeautifulSoup(html, 'html.parser')
+        """Main entry point for pathfinding operations on raw HTML"""
+        soup = make_soup(html, self.parser_backend)
+        return self.find_target_content_in_document(soup, citation)
+
+    def find_target_content_in_document(self, soup: BeautifulSoup, citation: Citation) -> PathfinderResult:
+        """Pathfinding on an already parsed document - callers that hold a tree should use this to avoid re-parsing"""
+        result = self.resolve_locally(soup, citation)
+        if result is not None:
+            return result
+        return self.pathfind(soup, citation)
+
+    def pathfind(self, soup: BeautifulSoup, citation: Citation) -> PathfinderResult:
+        """The LLM-guided search, for citations resolve_locally could not answer"""
         context = SearchContext()
-        
+        result = self._start_pathfinding(soup, citation, context)
+        result.llm_calls = context.llm_calls
+        self._learn_template(citation, result)
+        return result
+
+    def resolve_locally(self, soup: BeautifulSoup, citation: Citation) -> Optional[PathfinderResult]:
+        """Everything that needs no LLM call: direct references, small pages, site templates, a decisive local ranking. None if an LLM is needed."""
         # Check for direct #reference
         if '#' in citation.link_legal_reference:
             return self._handle_direct_reference(soup, citation)
@@ -55,26 +219,87 @@ class Pathfinder:
         if not self._needs_pathfinding(soup):
             return self._direct_search(soup, citation)
             
-        # Initialize pathfinding operation
-        return self._start_pathfinding(soup, citation, context)
+        # Layouts learned on earlier pages from this site come first
+        template_result = self._apply_site_templates(soup, citation)
+        if template_result:
+            return template_result
+
+        # A decisive local ranking needs no LLM either
+        ranking = get_candidate_ranking(soup, citation.legal_reference, citation.jurisdiction_id)
+        if ranking.decisive:
+            result = PathfinderResult(
+                found_content=ranking.best.element.get_text(),
+                confidence=self.LOCAL_RESOLUTION_CONFIDENCE,
+                breadcrumb_path=selector_steps(ranking.best.element)
+            )
+            self._learn_template(citation, result)
+            return result
+        return None
+
+    def _learn_template(self, citation: Citation, result: PathfinderResult):
+        if result.found_content and result.breadcrumb_path and self.site_templates is not None:
+            self.site_templates.record_success(citation.link_legal_reference, result.breadcrumb_path)
+
+    def _apply_site_templates(self, soup: BeautifulSoup, citation: Citation) -> Optional[PathfinderResult]:
+        """Try the domain's learned selectors, letting the local ranker pick the container among their matches"""
+        if self.site_templates is None:
+            return None
+        url = citation.link_legal_reference
+        for template in self.site_templates.templates_for(url):
+            matches = select_template(soup, template)
+            if not matches:
+                # The page's layout no longer fits the template
+                self.site_templates.record_miss(url, template.selector)
+                continue
+            ranked = score_elements(matches, citation.legal_reference, citation.jurisdiction_id)
+            if ranked[0].heading_score == 0:
+                # The template fits, just not at this citation's level (e.g. a Part on a Section template)
+                continue
+            best = ranked[0]
+            runner_up = ranked[1].heading_score if len(ranked) > 1 else 0.0
+            if best.heading_score == HEADING_WEIGHTS[0] and runner_up < best.heading_score:
+                steps = template.selector.split(' > ')
+                self.site_templates.record_success(url, steps)
+                return PathfinderResult(
+                    found_content=best.element.get_text(),
+                    confidence=self.TEMPLATE_CONFIDENCE,
+                    breadcrumb_path=steps
+                )
+            # Matched but ambiguous: not the template's fault, fall through to the next one
+        return None
     
     def _handle_direct_reference(self, soup: BeautifulSoup, citation: Citation) -> PathfinderResult:
         """Handle cases where we have a direct HTML element reference"""
         element_id = citation.link_legal_reference.split('#')[-1]
-        target_element = soup.find(id=element_id)
+        target_element = get_document_index(soup).find_by_id(element_id)
         if target_element:
             return PathfinderResult(
                 found_content=target_element.get_text(),
                 confidence=0.9,
                 requires_human_review=False,
-                breadcrumb_path=[element_id]
+                breadcrumb_path=selector_steps(target_element)
             )
         return PathfinderResult(requires_human_review=True, error_message="Direct reference not found")
 
     def _needs_pathfinding(self, soup: BeautifulSoup) -> bool:
         """Determine if content requires pathfinding based on size/complexity"""
-        # TODO: Implement size/complexity metrics
-        pass
+        profile = get_page_profile(soup)
+        return profile.text_length > self.MAX_CONTENT_SIZE or profile.structure_count > self.MAX_STRUCTURE_COUNT
+
+    def _direct_search(self, soup: BeautifulSoup, citation: Citation) -> PathfinderResult:
+        """Small, flat pages: look for the legal reference directly without LLM help"""
+        search = compile_reference_patterns(citation.legal_reference, citation.jurisdiction_id)
+        index = get_document_index(soup)
+        match = index.find_first_regex(search.regexes) or index.find_first(search.literals)
+        if match:
+            container = index.relevant_container(match.node)
+            return PathfinderResult(
+                found_content=container.get_text(),
+                confidence=0.7,
+                requires_human_review=False,
+                breadcrumb_path=selector_steps(container)
+            )
+        return PathfinderResult(requires_human_review=True, error_message="Legal reference not found in direct search")
 
     def _start_pathfinding(self, soup: BeautifulSoup, citation: Citation, context: SearchContext) -> PathfinderResult:
         """Begin pathfinding process for complex pages"""
@@ -91,25 +316,57 @@ class Pathfinder:
         - Suggested search strategy
         - Confidence score for suggested approach
         """
+        # resolve_locally has already ruled out a decisive local ranking
         structure_guidance = self._get_llm_structure_guidance(soup, citation)
+        if structure_guidance.get('llm_call'):
+            context.llm_calls.append(structure_guidance['llm_call'])
         
         # Use guidance to narrow search area
-        target_areas = self._identify_target_areas(soup, structure_guidance)
+        target_areas = self._identify_target_areas(soup, structure_guidance, citation)
         
         if not target_areas:
             return PathfinderResult(requires_human_review=True, error_message="No promising areas found")
             
-        return self._recursive_search(target_areas, citation, context)
-
-    def _recursive_search(self, 
-                         elements: List[BeautifulSoup], 
-                         citation: Citation, 
-                         context: SearchContext) -> PathfinderResult:
-        """Recursively search promising areas of the document"""
-        if context.current_depth >= context.max_depth:
-            return PathfinderResult(requires_human_review=True, error_message="Max depth reached")
-            
-        for element in elements:
+        return self._search(target_areas, citation, context)
+
+    def _search(self, 
+                elements: List[BeautifulSoup], 
+                citation: Citation, 
+                context: SearchContext) -> PathfinderResult:
+        """
+        Search promising areas of the document with an explicit stack - no recursion.
+
+        If nothing qualifies, zoom out to the parents of the starting areas (the
+        "search broader" branch above) up to MAX_ZOOM_OUTS times before flagging
+        the citation for human review.
+        """
+        frames = [SearchFrame(element) for element in elements]
+        while frames:
+            if self.PARALLEL_CANDIDATES:
+                found = self._beam_search(frames, citation, context)
+            else:
+                found = self._depth_first_search(frames, citation, context)
+            if found:
+                return found
+            frames = self._zoom_out(frames, context)
+
+        error_message = "Max depth reached" if context.depth_limited else "No matching content found"
+        return PathfinderResult(requires_human_review=True, error_message=error_message)
+
+    def _depth_first_search(self,
+                            frames: List[SearchFrame],
+                            citation: Citation,
+                            context: SearchContext) -> Optional[PathfinderResult]:
+        """Analyse one element at a time, diving into suggested subsections before moving to the next sibling"""
+        stack = list(reversed(frames))
+        while stack:
+            frame = stack.pop()
+            if id(frame.element) in context.visited:
+                continue
+            if frame.depth >= context.max_depth:
+                context.depth_limited = True
+                continue
+            context.visited.add(id(frame.element))
             """
             LLM INTERACTION 2:
             Input:
@@ -122,42 +379,286 @@ class Pathfinder:
             - Suggestion to dive deeper or move on
             - Specific subsections to examine if diving deeper
             """
-            analysis = self._get_llm_content_analysis(element, citation, context)
+            analysis = self._get_llm_content_analysis(frame, citation, context)
             
             if analysis.confidence > self.MIN_CONFIDENCE_THRESHOLD:
-                return PathfinderResult(
-                    found_content=element.get_text(),
-                    confidence=analysis.confidence,
-                    breadcrumb_path=context.visited_elements
-                )
+                return self._found(frame, analysis)
                 
             if analysis.should_dive_deeper:
-                context.current_depth += 1
-                context.visited_elements.append(str(element.name))
-                result = self._recursive_search(analysis.suggested_elements, citation, context)
-                if result.found_content:
-                    return result
-                    
-        return PathfinderResult(requires_human_review=True, error_message="No matching content found")
+                stack.extend(SearchFrame(child, frame.depth + 1, frame) for child in reversed(analysis.suggested_elements))
+        return None
+
+    def _beam_search(self,
+                     frames: List[SearchFrame],
+                     citation: Citation,
+                     context: SearchContext) -> Optional[PathfinderResult]:
+        """Best-first beam: score a whole level at once, then expand only the BEAM_WIDTH most promising branches"""
+        frontier = [frame for frame in frames if id(frame.element) not in context.visited]
+        while frontier:
+            if frontier[0].depth >= context.max_depth:
+                context.depth_limited = True
+                return None
+            for frame in frontier:
+                context.visited.add(id(frame.element))
+            scored = self._evaluate_candidates(frontier, citation, context)
+            best = max(scored, key=lambda item: item[1].confidence, default=None)
+            if best and best[1].confidence > self.MIN_CONFIDENCE_THRESHOLD:
+                return self._found(*best)
+
+            expandable = sorted((item for item in scored if item[1].should_dive_deeper),
+                                key=lambda item: item[1].confidence, reverse=True)[:self.BEAM_WIDTH]
+            frontier = []
+            queued = set()
+            for frame, analysis in expandable:
+                for child in analysis.suggested_elements:
+                    if id(child) not in queued and id(child) not in context.visited:
+                        queued.add(id(child))
+                        frontier.append(SearchFrame(child, frame.depth + 1, frame))
+        return None
+
+    def _zoom_out(self, frames: List[SearchFrame], context: SearchContext) -> List[SearchFrame]:
+        """Parents of the given starting areas, for one more, broader pass"""
+        if context.zoom_outs >= self.MAX_ZOOM_OUTS:
+            return []
+        context.zoom_outs += 1
+        parents = []
+        seen = set()
+        for frame in frames:
+            parent = frame.element.parent
+            if (parent is None or parent.name in WHOLE_PAGE_TAGS or parent.has_attr(WRAPPER_ATTRIBUTE)
+                    or id(parent) in seen or id(parent) in context.visited):
+                continue
+            seen.add(id(parent))
+            parents.append(SearchFrame(parent))
+        return parents[:self.MAX_LLM_CANDIDATES]
+
+    @staticmethod
+    def _found(frame: SearchFrame, analysis: ContentAnalysis) -> PathfinderResult:
+        return PathfinderResult(
+            found_content=frame.element.get_text(),
+            confidence=analysis.confidence,
+            breadcrumb_path=selector_steps(frame.element)
+        )
+
+    def prefetch_structure_guidance(self, soup: BeautifulSoup, citations: List[Citation]) -> None:
+        """Get structure guidance for several citations on the same page with as few LLM requests as possible"""
+        cache = document_cache(soup).setdefault('structure_guidance', {})
+        pending = [citation for citation in citations if citation.id not in cache
+                   and not get_candidate_ranking(soup, citation.legal_reference, citation.jurisdiction_id).decisive]
+        for start in range(0, len(pending), self.MAX_GUIDANCE_BATCH):
+            cache.update(self._get_llm_structure_guidance_batch(soup, pending[start:start + self.MAX_GUIDANCE_BATCH]))
 
     def _get_llm_structure_guidance(self, 
                                   soup: BeautifulSoup, 
                                   citation: Citation) -> Dict:
         """Get LLM guidance on page structure"""
-        # TODO: Implement LLM interaction
-        pass
+        cache = document_cache(soup).setdefault('structure_guidance', {})
+        if citation.id not in cache:
+            cache.update(self._get_llm_structure_guidance_batch(soup, [citation]))
+        return cache[citation.id]
+
+    def _get_llm_structure_guidance_batch(self,
+                                          soup: BeautifulSoup,
+                                          citations: List[Citation]) -> Dict[str, Dict]:
+        """One guidance request over the page skeleton for a batch of citations, keyed by citation id"""
+        # Short local keys - models copy these back more reliably than long database ids
+        keys = {f'c{position}': citation for position, citation in enumerate(citations)}
+        targets = '\n'.join(f'{key}: {citation.legal_reference}' for key, citation in keys.items())
+
+        skeleton = None
+        parsed = {}
+        error_message = None
+        call = None
+        started = time.monotonic()
+        try:
+            # Inside the try: a skeleton or tokenizer failure means unguided search, not a failed page
+            skeleton = get_document_skeleton(soup, self.GUIDANCE_MODEL)
+            prompt = STRUCTURE_GUIDANCE_PROMPT.format(skeleton=skeleton.text, targets=targets)
+            response = self.llm.complete(self.GUIDANCE_MODEL, prompt, system=STRUCTURE_GUIDANCE_SYSTEM,
+                                         timeout=self.LLM_TIMEOUT,
+                                         max_tokens=min(4096, 200 + 150 * len(citations)),
+                                         priority=PRIORITY_GUIDANCE, cache=self.llm_cache,
+                                         context_digest=skeleton.digest)
+            parsed = parse_json_response(response.text)
+            call = self._call_record(response, 'guidance', time.monotonic() - started, shared_by=len(citations))
+        except Exception as e:
+            error_message = f'Structure guidance failed: {str(e)}'
+
+        answers = {str(item.get('key')): item for item in parsed.get('results', []) if isinstance(item, dict)}
+        guidance = {}
+        for key, citation in keys.items():
+            answer = answers.get(key, {})
+            references = [reference for reference in answer.get('candidates', []) if skeleton and reference in skeleton.nodes]
+            try:
+                confidence = float(answer.get('confidence', 0.0))
+            except (TypeError, ValueError):
+                confidence = 0.0
+            guidance[citation.id] = {
+                'candidates': references,
+                'elements': [skeleton.nodes[reference] for reference in references],
+                'strategy': answer.get('strategy', ''),
+                'confidence': confidence,
+                'skeleton_digest': skeleton.digest if skeleton else None,
+                'error_message': error_message,
+                'llm_call': call,
+            }
+        return guidance
+
+    @staticmethod
+    def _call_record(response: LLMResponse, purpose: str, latency: float, tier: int = 0, shared_by: int = 1) -> LLMCallRecord:
+        return LLMCallRecord(
+            purpose=purpose,
+            model=response.model,
+            tier=tier,
+            input_tokens=response.input_tokens,
+            output_tokens=response.output_tokens,
+            cost=0.0 if response.cached else cost_of(response.model, response.input_tokens, response.output_tokens),
+            latency=latency,
+            cached=response.cached,
+            shared_by=shared_by
+        )
 
     def _get_llm_content_analysis(self, 
-                                 element: BeautifulSoup, 
+                                 frame: SearchFrame, 
                                  citation: Citation,
-                                 context: SearchContext) -> Dict:
-        """Get LLM analysis of specific content section"""
-        # TODO: Implement LLM interaction
-        pass
+                                 context: SearchContext) -> ContentAnalysis:
+        """Get LLM analysis of specific content section, escalating through the jurisdiction's model cascade"""
+        policy, prompt, outline = self._prepare_content_analysis(frame.element, citation, frame.path())
+        analysis = ContentAnalysis()
+        for tier, model in enumerate(policy.models):
+            started = time.monotonic()
+            future = self._submit_content_analysis(model, prompt, outline, frame.depth)
+            try:
+                response = future.result(timeout=self.LLM_TIMEOUT)
+            except Exception as e:
+                future.cancel()  # No-op unless it timed out
+                # Keep the previous tier's answer, if any
+                analysis.error_message = f'Content analysis failed on {model}: {str(e)}'
+                break
+            context.llm_calls.append(self._call_record(response, 'analysis', time.monotonic() - started, tier=tier))
+            analysis = self._parse_content_analysis(response, outline.nodes, tier)
+            if not policy.should_escalate(tier, analysis.confidence):
+                break
+            context.llm_calls[-1].escalated = True
+        return analysis
+
+    def _prepare_content_analysis(self,
+                                  element: Tag,
+                                  citation: Citation,
+                                  path: List[str]) -> Tuple[CascadePolicy, str, Skeleton]:
+        """Cascade policy, prompt and element outline for a content analysis"""
+        policy = cascade_for(citation.jurisdiction_id, self.cascade_policies)
+        # Prompt is budgeted with the first model's tokenizer; every later tier has at least as much context
+        outline = build_skeleton(element, policy.models[0], max_tokens=self.ANALYSIS_OUTLINE_TOKENS)
+        text = truncate_to_tokens(' '.join(element.get_text(' ').split()), policy.models[0], self.ANALYSIS_TEXT_TOKENS)
+        prompt = CONTENT_ANALYSIS_PROMPT.format(
+            reference=citation.legal_reference,
+            path=' > '.join(path) or '(page root)',
+            outline=outline.text,
+            text=text
+        )
+        return policy, prompt, outline
+
+    def _submit_content_analysis(self, model: str, prompt: str, outline: Skeleton, depth: int) -> Future:
+        return self.llm.submit(model, prompt, system=CONTENT_ANALYSIS_SYSTEM, max_tokens=300,
+                               priority=PRIORITY_ANALYSIS + depth, cache=self.llm_cache,
+                               context_digest=outline.digest)
+
+    def _evaluate_candidates(self,
+                             frames: List[SearchFrame],
+                             citation: Citation,
+                             context: SearchContext) -> List[Tuple[SearchFrame, ContentAnalysis]]:
+        """
+        Analyse sibling candidates concurrently, each through its own model cascade.
+
+        Returns as soon as one candidate clears MIN_CONFIDENCE_THRESHOLD, cancelling
+        every call still queued or in flight; otherwise returns every candidate's
+        final analysis once all have settled.
+        """
+        pending: Dict[Future, Tuple[int, int, float]] = {}  # future -> (candidate position, tier, submit time)
+        prepared = []
+        for position, frame in enumerate(frames):
+            policy, prompt, outline = self._prepare_content_analysis(frame.element, citation, frame.path())
+            prepared.append((policy, prompt, outline))
+            future = self._submit_content_analysis(policy.models[0], prompt, outline, frame.depth)
+            pending[future] = (position, 0, time.monotonic())
+
+        analyses: Dict[int, ContentAnalysis] = {}
+        while pending:
+            done, _ = wait(pending, timeout=self.LLM_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                # Nothing settled within the timeout: give up on every outstanding call
+                for outstanding, (position, tier, _) in pending.items():
+                    outstanding.cancel()
+                    analysis = analyses.get(position) or ContentAnalysis()
+                    analysis.error_message = f'Content analysis timed out on {prepared[position][0].models[tier]}'
+                    analyses[position] = analysis
+                pending.clear()
+                break
+            for future in done:
+                position, tier, started = pending.pop(future)
+                policy, prompt, outline = prepared[position]
+                model = policy.models[tier]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    analysis = analyses.get(position) or ContentAnalysis()
+                    analysis.error_message = f'Content analysis failed on {model}: {str(e)}'
+                    analyses[position] = analysis
+                    continue
+                context.llm_calls.append(self._call_record(response, 'analysis', time.monotonic() - started, tier=tier))
+                analysis = self._parse_content_analysis(response, outline.nodes, tier)
+                analyses[position] = analysis
+                if analysis.confidence > self.MIN_CONFIDENCE_THRESHOLD and not policy.should_escalate(tier, analysis.confidence):
+                    for outstanding in pending:
+                        outstanding.cancel()
+                    pending.clear()
+                    break
+                if policy.should_escalate(tier, analysis.confidence):
+                    context.llm_calls[-1].escalated = True
+                    escalated = self._submit_content_analysis(policy.models[tier + 1], prompt, outline, frames[position].depth)
+                    pending[escalated] = (position, tier + 1, time.monotonic())
+
+        return [(frames[position], analysis) for position, analysis in analyses.items()]
+
+    @staticmethod
+    def _parse_content_analysis(response: LLMResponse, nodes: Dict[str, Tag], tier: int) -> ContentAnalysis:
+        parsed = parse_json_response(response.text)
+        try:
+            confidence = min(1.0, max(0.0, float(parsed.get('confidence', 0.0))))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        # n0 is the analysed element itself
+        suggested = [nodes[reference] for reference in parsed.get('suggested', []) or []
+                     if isinstance(reference, str) and reference in nodes and reference != 'n0']
+        return ContentAnalysis(
+            confidence=confidence,
+            should_dive_deeper=bool(parsed.get('dive_deeper')) and bool(suggested),
+            suggested_elements=suggested,
+            reasoning=str(parsed.get('reasoning', '')),
+            model=response.model,
+            tier=tier
+        )
 
     def _identify_target_areas(self, 
                              soup: BeautifulSoup, 
-                             guidance: Dict) -> List[BeautifulSoup]:
-        """Use LLM guidance to identify promising areas to search"""
-        # TODO: Implement target area identification
-        pass
\ No newline at end of file
+                             guidance: Dict,
+                             citation: Optional[Citation] = None) -> List[BeautifulSoup]:
+        """Merge LLM guidance with the local ranking and keep only the top areas for content analysis"""
+        guided = {}
+        for position, element in enumerate((guidance or {}).get('elements', [])):
+            guided.setdefault(id(element), (position, element))
+        if citation is None:
+            return [element for _, element in guided.values()]
+
+        areas = {key: element for key, (_, element) in guided.items()}
+        ranking = get_candidate_ranking(soup, citation.legal_reference, citation.jurisdiction_id)
+        for candidate in ranking.candidates[:self.MAX_LLM_CANDIDATES]:
+            areas.setdefault(id(candidate.element), candidate.element)
+
+        scored = score_elements(list(areas.values()), citation.legal_reference, citation.jurisdiction_id)
+        for candidate in scored:
+            if id(candidate.element) in guided:
+                candidate.score += self.GUIDANCE_BONUS / (1 + guided[id(candidate.element)][0])
+        scored.sort(key=lambda candidate: candidate.score, reverse=True)
+        return [candidate.element for candidate in scored[:self.MAX_LLM_CANDIDATES]]
\ No newline at end of file
@@ -1,44 +1,182 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Union, List, Tuple
 import time
 from pathfinder import Pathfinder, PathfinderResult
 from pydantic import BaseModel
 from utils.pydanticModels import Citation
+from driver_pool import DriverPool
+from page_readiness import PageReadiness, backoff_delay
+from fetcher import FetchResult, FetchRouter
+from documents import DocumentError, DownloadedDocument, find_in_document, start_page
+from document_outline import OutlineStore
+from page_cache import PageCache, normalize_url
+from llm_cache import LLMCache
+from site_templates import TemplateStore
+from handoff import PageHandoff, export_handoff, restore_handoff
+from parsing import make_soup, resolve_backend
+from document_index import DocumentIndex, get_document_index
+from streaming_parser import StreamProfile, StreamTarget, scan_document
+from page_profiler import get_page_profile, seed_page_profile
+from legal_patterns import compile_reference_patterns
 
 class ScraperResult(BaseModel):
     """Standardized result format for scraping operations"""
-    status: str  # 'success', 'error', 'needs_review'
+    status: str  # 'success', 'error', 'needs_review'; 'deferred' from a resolve_only scraper when an LLM is needed
     content: Optional[str] = None
     confidence: Optional[float] = None
     error_message: Optional[str] = None
     requires_human_review: bool = False
-    processing_path: str  # Track which path we took: 'direct_reference', 'simple_search', 'pathfinder'
+    processing_path: str  # Track which path we took: 'direct_reference', 'simple_search', 'streaming_search', 'pathfinder', 'document_search'
+    fetch_tier: Optional[str] = None  # Which fetch tier served the page: 'cache', 'http' or 'browser'
+    llm_cost: Optional[float] = None  # Dollars spent on LLM calls for this citation (pathfinder only)
+    llm_latency: Optional[float] = None  # Seconds spent waiting on LLM calls (pathfinder only)
+
+def group_citations_by_page(citations: List[Citation]) -> Dict[str, List[Tuple[int, Citation]]]:
+    """Group citations by de-fragmented page URL, keeping each citation's position in the input"""
+    groups: Dict[str, List[Tuple[int, Citation]]] = {}
+    for index, citation in enumerate(citations):
+        groups.setdefault(normalize_url(citation.link_legal_reference), []).append((index, citation))
+    return groups
 
 class LegislationScraper:
-    def __init__(self, headless: bool = True):
-        self.options = Options()
-        if headless:
-            self.options.add_argument('--headless')
-        self.driver = webdriver.Chrome(options=self.options)
-        self.pathfinder = Pathfinder()
+    def __init__(self,
+                 headless: bool = True,
+                 driver_pool: Optional[DriverPool] = None,
+                 pool_size: int = 2,
+                 page_cache: Optional[PageCache] = None,
+                 llm_cache: Optional[LLMCache] = None,
+                 use_cache: bool = True,
+                 parser_backend: Optional[str] = None,
+                 resolve_only: bool = False):
+        # resolve_only: for resolution worker processes. No LLM calls and no template store of its own;
+        # citations that would need Pathfinder's LLM come back with status 'deferred' for the caller.
+        self.resolve_only = resolve_only
+        # A shared pool can be passed in so several scrapers reuse the same Chrome sessions
+        self._owns_pool = driver_pool is None
+        self.driver_pool = driver_pool or DriverPool(size=pool_size, headless=headless)
+        self.readiness = PageReadiness()
+        self.page_cache = page_cache or (PageCache() if use_cache else None)
+        self.fetcher = FetchRouter(browser_fetch=self._load_page, cache=self.page_cache)
+        self.parser_backend = resolve_backend(parser_backend)
+        self.llm_cache = llm_cache or (LLMCache() if use_cache and not resolve_only else None)
+        self.site_templates = TemplateStore() if use_cache and not resolve_only else None
+        self.outline_store = OutlineStore(self.page_cache.cache_dir) if self.page_cache else None
+        self.pathfinder = Pathfinder(parser_backend=self.parser_backend, llm_cache=self.llm_cache,
+                                     site_templates=self.site_templates)
         self.MAX_SIMPLE_PAGE_SIZE = 50000  # characters
+        self.MAX_SIMPLE_STRUCTURE_COUNT = 20  # section/div/article elements - arbitrary threshold, adjust based on testing
+        self.STREAMING_THRESHOLD = 5000000  # characters of raw HTML above which pages are scanned as a stream
+        self.STREAMING_CONFIDENCE = 0.6  # Below simple_search: the page was too large to verify the hit any further
         
     def get_legislation_content(self, citation: Citation) -> ScraperResult:
         """Main entry point - processes a single citation"""
+        return self.get_legislation_content_batch([citation])[0]
+
+    def get_legislation_content_batch(self, citations: List[Citation]) -> List[ScraperResult]:
+        """
+        Process a batch of citations, fetching and parsing each distinct page only once.
+        Results are returned in the same order as `citations`.
+        """
+        results: List[Optional[ScraperResult]] = [None] * len(citations)
+        for group in group_citations_by_page(citations).values():
+            indices = [index for index, _ in group]
+            page_results = self._process_page([citation for _, citation in group])
+            for index, result in zip(indices, page_results):
+                results[index] = result
+        return results
+
+    def _process_page(self, citations: List[Citation]) -> List[ScraperResult]:
+        """Fetch and parse one page, then resolve every citation that points into it"""
         try:
-            # Load page with Selenium
-            raw_html = self._load_page(citation.link_legal_reference)
-            if not raw_html:
-                return ScraperResult(
-                    status='error',
-                    error_message='Failed to load page',
-                    processing_path='failed_load'
-                )
+            # Plain HTTP first, Selenium only for JS-heavy pages (see strategy notes below)
+            fetch_result = self.fetcher.fetch(citations[0].link_legal_reference)
+            return self.resolve_fetched(fetch_result, citations)
+            
+        except Exception as e:
+            return [ScraperResult(
+                status='error',
+                error_message=f'Unexpected error: {str(e)}',
+                processing_path='error'
+            ) for _ in citations]
+    
+    def resolve_fetched(self, fetch_result: FetchResult, citations: List[Citation]) -> List[ScraperResult]:
+        """Resolve the citations of an already fetched page (HTML, downloaded document or failed load)"""
+        if fetch_result.document is not None:
+            return self.resolve_document(fetch_result.document, citations, fetch_result.tier)
+        if not fetch_result.content:
+            return self.failed_load(fetch_result, citations)
+        return self.resolve_html(fetch_result.content, citations, fetch_result.tier)
+    
+    def failed_load(self, fetch_result: FetchResult, citations: List[Citation]) -> List[ScraperResult]:
+        """One error result per citation for a page that could not be loaded"""
+        return [ScraperResult(
+            status='error',
+            error_message=fetch_result.error_message or 'Failed to load page',
+            processing_path='failed_load',
+            fetch_tier=fetch_result.tier
+        ) for _ in citations]
+    
+    def resolve_html(self, raw_html: str, citations: List[Citation], fetch_tier: Optional[str] = None) -> List[ScraperResult]:
+        """
+        Parse fetched HTML and resolve every citation that points into it.
+        This is the CPU-bound half of _process_page; it never fetches, so it can run in a worker process.
+        """
+        return self._resolve_html(raw_html, citations, fetch_tier)[0]
+    
+    def resolve_html_with_handoff(self,
+                                  raw_html: str,
+                                  citations: List[Citation],
+                                  fetch_tier: Optional[str] = None) -> Tuple[List[ScraperResult], Optional[PageHandoff]]:
+        """
+        resolve_html for a resolve_only scraper, plus the compact Pathfinder state of its 'deferred' citations,
+        so the LLM stage can run elsewhere without parsing the page again (see handoff.py)
+        """
+        results, soup = self._resolve_html(raw_html, citations, fetch_tier)
+        deferred = [citation for citation, result in zip(citations, results) if result.status == 'deferred']
+        if not deferred or soup is None:
+            return results, None
+        try:
+            handoff = export_handoff(soup, deferred, self.pathfinder.GUIDANCE_MODEL, self.pathfinder.MAX_LLM_CANDIDATES)
+        except Exception:
+            handoff = None  # The caller falls back to resolving the raw HTML
+        return results, handoff
+    
+    def resolve_handoff(self, handoff: PageHandoff, citations: List[Citation], fetch_tier: Optional[str] = None) -> List[ScraperResult]:
+        """Run Pathfinder's LLM search for citations a resolve_only scraper deferred, on the state it handed off"""
+        try:
+            soup = restore_handoff(handoff, self.parser_backend)
+        except Exception as e:
+            return [self._error_result(e) for _ in citations]
+        resolved = self._pathfind_citations(soup, dict(enumerate(citations)))
+        results = [resolved[position] for position in range(len(citations))]
+        for result in results:
+            result.fetch_tier = fetch_tier
+        return results
+    
+    def _resolve_html(self,
+                      raw_html: str,
+                      citations: List[Citation],
+                      fetch_tier: Optional[str] = None) -> Tuple[List[ScraperResult], Optional[BeautifulSoup]]:
+        soup = None
+        try:
+            # Very large documents are scanned as a stream first so their full tree is
+            # only built if some citation can't be resolved that way.
+            # That fallback parses the whole page, once for all remaining citations, and is a
+            # deliberate bound: a citation is left unresolved exactly when its hit is ambiguous or
+            # weak (a ToC line, a cross-reference, a broader designation), and telling those apart
+            # from the real provision needs page-wide context - candidate ranking across every hit
+            # and the page skeleton for guidance - that the matched region alone doesn't have.
+            streamed: Dict[int, ScraperResult] = {}
+            stream_profile: Optional[StreamProfile] = None
+            if len(raw_html) > self.STREAMING_THRESHOLD:
+                streamed, stream_profile = self._resolve_streaming(raw_html, citations)
             
             # Convert to BeautifulSoup for analysis
-            soup = BeautifulSoup(raw_html, 'html.parser')
+            soup = make_soup(raw_html, self.parser_backend) if len(streamed) < len(citations) else None
+            if soup is not None and stream_profile is not None:
+                # The scan already measured the page; routing reads these instead of walking the tree again
+                seed_page_profile(soup, stream_profile.text_length, stream_profile.element_count,
+                                  stream_profile.max_depth, stream_profile.structure_count)
             
 
             ## Extensions/Patterns:
@@ -118,25 +256,142 @@ class LegislationScraper:
             # - .htm (process like regular webpage)
             # - .xml (process like regular webpage)
 
-            # Decision tree implementation
-            if '#' in citation.link_legal_reference:
-                return self._handle_direct_reference(soup, citation)
+            # Citations headed for Pathfinder are resolved together, so those still needing an LLM share one guidance request
+            resolved = dict(streamed)
+            if soup is not None and not self._is_simple_page(soup):
+                resolved.update(self._handle_complex_citations(soup, {
+                    position: citation for position, citation in enumerate(citations)
+                    if position not in streamed and '#' not in citation.link_legal_reference
+                }))
             
-            # Check page complexity
-            if self._is_simple_page(soup):
-                return self._handle_simple_page(soup, citation)
-            
-            # Complex page - invoke pathfinder
-            return self._handle_complex_page(soup, citation)
+            # Every citation on this page is resolved against the same parsed tree
+            results = []
+            for position, citation in enumerate(citations):
+                if position in resolved:
+                    result = resolved[position]
+                    result.fetch_tier = fetch_tier
+                    results.append(result)
+                    continue
+                try:
+                    result = self._resolve_citation(soup, citation)
+                except Exception as e:
+                    result = ScraperResult(
+                        status='error',
+                        error_message=f'Unexpected error: {str(e)}',
+                        processing_path='error'
+                    )
+                result.fetch_tier = fetch_tier
+                results.append(result)
+            return results, soup
             
         except Exception as e:
-            return ScraperResult(
+            return [ScraperResult(
                 status='error',
                 error_message=f'Unexpected error: {str(e)}',
                 processing_path='error'
-            )
-        finally:
-            self._cleanup()
+            ) for _ in citations], None
+    
+    def resolve_document(self, document: DownloadedDocument, citations: List[Citation], fetch_tier: Optional[str] = None) -> List[ScraperResult]:
+        """Resolve citations into a downloaded PDF/Word file, extracting only the pages the search reaches. Removes the file."""
+        results = []
+        jurisdiction = citations[0].jurisdiction_id if citations else None
+        with document:
+            outline = None
+            if self.outline_store:
+                try:
+                    outline = self.outline_store.load(document, jurisdiction)
+                except DocumentError:
+                    outline = None  # The search below reports the unreadable file per citation
+            for citation in citations:
+                try:
+                    search = compile_reference_patterns(citation.legal_reference, citation.jurisdiction_id)
+                    # An explicit #page=N wins; otherwise start where the outline places the designation
+                    start = start_page(citation.link_legal_reference)
+                    if start == 1 and outline:
+                        pages = outline.pages_for(search.designations)
+                        if pages:
+                            start = pages[0]
+                    match = find_in_document(document, search, citation.jurisdiction_id, start=start)
+                except DocumentError as e:
+                    result = ScraperResult(status='error', error_message=str(e), processing_path='document_search')
+                else:
+                    if match:
+                        result = ScraperResult(
+                            status='success',
+                            content=match.text,
+                            confidence=0.7,
+                            requires_human_review=False,
+                            processing_path='document_search'
+                        )
+                    else:
+                        result = ScraperResult(
+                            status='needs_review',
+                            error_message='Legal reference not found in document',
+                            requires_human_review=True,
+                            processing_path='document_search'
+                        )
+                result.fetch_tier = fetch_tier
+                results.append(result)
+            if outline is not None:
+                self.outline_store.save(document, outline, jurisdiction)
+        return results
+    
+    def _resolve_streaming(self, raw_html: str, citations: List[Citation]) -> Tuple[Dict[int, ScraperResult], StreamProfile]:
+        """
+        Resolve citations on a very large page without building its full tree. Unresolved, ambiguous
+        and weakly matched citations are left out, so they go through the regular path and Pathfinder.
+        Also returns the scan's size metrics for that path to reuse.
+        """
+        targets = {}
+        for position, citation in enumerate(citations):
+            if '#' in citation.link_legal_reference:
+                targets[str(position)] = StreamTarget(element_id=citation.link_legal_reference.split('#')[-1])
+            else:
+                # Designation regexes by tier; the reference as written only when it has no designations
+                search = compile_reference_patterns(citation.legal_reference, citation.jurisdiction_id)
+                targets[str(position)] = StreamTarget(regexes=search.regexes,
+                                                      patterns=[] if search.regexes else search.literals[:1])
+        
+        scan = scan_document(raw_html, targets)
+        
+        results = {}
+        for key, match in scan.matches.items():
+            # Only the matched subtree is ever parsed into a soup
+            snippet = make_soup(match.html, self.parser_backend)
+            if match.kind == 'id':
+                target_element = get_document_index(snippet).find_by_id(targets[key].element_id)
+                if target_element is None:
+                    continue
+                results[int(key)] = ScraperResult(
+                    status='success',
+                    content=target_element.prettify(),
+                    confidence=0.9,
+                    requires_human_review=False,
+                    processing_path='direct_reference'
+                )
+            elif match.rank == 0 and match.in_heading:
+                # Nothing verifies the hit on this path, so only the strongest evidence - the most
+                # specific pattern in a heading - is taken; anything weaker is left to Pathfinder
+                results[int(key)] = ScraperResult(
+                    status='success',
+                    content=snippet.get_text(),
+                    confidence=self.STREAMING_CONFIDENCE,
+                    requires_human_review=False,
+                    processing_path='streaming_search'
+                )
+        return results, scan.profile
+    
+    def _resolve_citation(self, soup: BeautifulSoup, citation: Citation) -> ScraperResult:
+        """Decision tree: pick the cheapest handler that can locate the cited content"""
+        if '#' in citation.link_legal_reference:
+            return self._handle_direct_reference(soup, citation)
+        
+        # Check page complexity
+        if self._is_simple_page(soup):
+            return self._handle_simple_page(soup, citation)
+        
+        # Complex page - invoke pathfinder
+        return self._handle_complex_page(soup, citation)
     
     def _load_page(self, url: str) -> Optional[str]:
         """Handles Selenium page loading with retries"""
@@ -145,26 +400,28 @@ class LegislationScraper:
         
         while current_retry < max_retries:
             try:
-                self.driver.get(url)
-                self.driver.implicitly_wait(0.25)
-                time.sleep(5)  # Allow JS to render
-                return self.driver.page_source
+                with self.driver_pool.checkout() as driver:
+                    # Load and wait for readyState / selectors / DOM quiescence under the domain's hard timeout
+                    self.readiness.load(driver, url)
+                    return driver.page_source
             except Exception as e:
+                # Includes TimeoutException from a page that did not load in time
+                time.sleep(backoff_delay(current_retry))  # Exponential backoff before retry
                 current_retry += 1
-                time.sleep(2)  # Wait before retry
                 
         return None
     
     def _is_simple_page(self, soup: BeautifulSoup) -> bool:
         """Determines if page is simple enough for direct search"""
+        # Both checks read the single-pass profile, which Pathfinder reuses for its own decision
+        profile = get_page_profile(soup)
+        
         # Check text length
-        text_content = soup.get_text()
-        if len(text_content) > self.MAX_SIMPLE_PAGE_SIZE:
+        if profile.text_length > self.MAX_SIMPLE_PAGE_SIZE:
             return False
             
         # Check structural complexity
-        section_elements = soup.find_all(['section', 'div', 'article'])
-        if len(section_elements) > 20:  # Arbitrary threshold, adjust based on testing
+        if profile.structure_count > self.MAX_SIMPLE_STRUCTURE_COUNT:
             return False
             
         return True
@@ -172,7 +429,7 @@ class LegislationScraper:
     def _handle_direct_reference(self, soup: BeautifulSoup, citation: Citation) -> ScraperResult:
         """Process pages with direct '#' references"""
         element_id = citation.link_legal_reference.split('#')[-1]
-        target_element = soup.find(id=element_id)
+        target_element = get_document_index(soup).find_by_id(element_id)
         
         if target_element:
             print(target_element.prettify())
@@ -194,23 +451,21 @@ class LegislationScraper:
     def _handle_simple_page(self, soup: BeautifulSoup, citation: Citation) -> ScraperResult:
         """Process simple pages with direct search"""
         # Extract search patterns from legal reference
-        patterns = self._get_search_patterns(citation.legal_reference)
+        search = compile_reference_patterns(citation.legal_reference, citation.jurisdiction_id)
         
-        # Simple pattern matching
-        for pattern in patterns:
-            matching_elements = soup.find_all(
-                string=lambda text: pattern.lower() in text.lower() if text else False
+        # Simple pattern matching - ranked regexes first, then all literals in one scan over the indexed text
+        index = get_document_index(soup)
+        match = index.find_first_regex(search.regexes) or index.find_first(search.literals)
+        if match:
+            # Get the closest parent container
+            content = self._extract_relevant_container(match.node, index)
+            return ScraperResult(
+                status='success',
+                content=content,
+                confidence=0.7,
+                requires_human_review=False,
+                processing_path='simple_search'
             )
-            if matching_elements:
-                # Get the closest parent container
-                content = self._extract_relevant_container(matching_elements[0])
-                return ScraperResult(
-                    status='success',
-                    content=content,
-                    confidence=0.7,
-                    requires_human_review=False,
-                    processing_path='simple_search'
-                )
         
         return ScraperResult(
             status='error',
@@ -221,34 +476,93 @@ class LegislationScraper:
     
     def _handle_complex_page(self, soup: BeautifulSoup, citation: Citation) -> ScraperResult:
         """Process complex pages using pathfinder"""
-        pathfinder_result = self.pathfinder.find_target_content(str(soup), citation)
+        return self._handle_complex_citations(soup, {0: citation})[0]
+    
+    def _handle_complex_citations(self, soup: BeautifulSoup, citations: Dict[int, Citation]) -> Dict[int, ScraperResult]:
+        """
+        Resolve the complex-page citations of one document, keyed by position.
+        Templates and local ranking go first for all of them, so structure guidance is only requested
+        (batched) for the citations they leave unresolved.
+        """
+        results: Dict[int, ScraperResult] = {}
+        unresolved: Dict[int, Citation] = {}
+        for position, citation in citations.items():
+            try:
+                # Hand over the parsed tree directly; serializing and re-parsing it is the most expensive step on large pages
+                pathfinder_result = self.pathfinder.resolve_locally(soup, citation)
+            except Exception as e:
+                results[position] = self._error_result(e)
+                continue
+            if pathfinder_result is None:
+                unresolved[position] = citation
+            else:
+                results[position] = self._pathfinder_result(pathfinder_result)
         
+        if self.resolve_only:
+            results.update({position: ScraperResult(status='deferred', processing_path='pathfinder') for position in unresolved})
+        else:
+            results.update(self._pathfind_citations(soup, unresolved))
+        return results
+    
+    def _pathfind_citations(self, soup: BeautifulSoup, unresolved: Dict[int, Citation]) -> Dict[int, ScraperResult]:
+        """Pathfinder's LLM search for citations local resolution could not answer, sharing batched structure guidance"""
+        results: Dict[int, ScraperResult] = {}
+        if len(unresolved) > 1:
+            self.pathfinder.prefetch_structure_guidance(soup, list(unresolved.values()))
+        for position, citation in unresolved.items():
+            try:
+                results[position] = self._pathfinder_result(self.pathfinder.pathfind(soup, citation))
+            except Exception as e:
+                results[position] = self._error_result(e)
+        return results
+    
+    @staticmethod
+    def _error_result(error: Exception) -> ScraperResult:
+        return ScraperResult(
+            status='error',
+            error_message=f'Unexpected error: {str(error)}',
+            processing_path='error'
+        )
+    
+    @staticmethod
+    def _pathfinder_result(pathfinder_result: PathfinderResult) -> ScraperResult:
         return ScraperResult(
             status='success' if pathfinder_result.found_content else 'needs_review',
             content=pathfinder_result.found_content,
             confidence=pathfinder_result.confidence,
             requires_human_review=pathfinder_result.requires_human_review,
             error_message=pathfinder_result.error_message,
-            processing_path='pathfinder'
+            processing_path='pathfinder',
+            llm_cost=pathfinder_result.llm_cost,
+            llm_latency=pathfinder_result.llm_latency
         )
     
-    def _get_search_patterns(self, legal_reference: str) -> list:
-        """Extract search patterns from legal reference"""
-        # TODO: Implement pattern extraction
-        # This should parse the legal reference and return increasingly broad patterns
-        pass
-    
-    def _extract_relevant_container(self, element) -> str:
+    def _extract_relevant_container(self, element, index: Optional[DocumentIndex] = None) -> str:
         """Extract the most relevant container for a matching element"""
+        if index is not None:
+            return index.relevant_container(element).get_text()
         # Navigate up the tree to find the most appropriate container
-        current = element
+        current = element if hasattr(element, 'find_all') else element.parent
         while current.parent and not current.find_all(['h1', 'h2', 'h3', 'section']):
             current = current.parent
         return current.get_text()
     
-    def _cleanup(self):
-        """Resource cleanup"""
-        try:
-            self.driver.quit()
-        except:
-            pass
\ No newline at end of file
+    def close(self):
+        """Release browser resources. Only shuts down the driver pool if this scraper created it."""
+        self.fetcher.close()
+        if self.llm_cache:
+            self.llm_cache.close()
+        if self.site_templates:
+            self.site_templates.close()
+        if self.outline_store:
+            self.outline_store.close()
+        if self.page_cache:
+            self.page_cache.close()
+        if self._owns_pool:
+            self.driver_pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
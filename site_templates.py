@@ -0,0 +1,196 @@
+"""
+Per-domain extraction templates learned from successful Pathfinder results.
+
+Pages on one site share a layout, so the structural path to a provision found
+on one page - tag and stable classes of each ancestor, e.g.
+`body > div.content > section.part > div.section` - selects the equivalent
+containers on the next page from that site. Pathfinder tries a domain's
+templates first and lets the local ranker pick the right container among the
+matches; a template whose selector keeps matching nothing is dropped.
+"""
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from pydantic import BaseModel, Field
+from typing import Dict, List
+from urllib.parse import urlparse
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_TEMPLATE_PATH = os.path.join('.cache', 'site_templates.json')
+MAX_CLASSES_PER_STEP = 2
+_STABLE_CLASS = re.compile(r'^[A-Za-z_-][A-Za-z_-]*$')  # Classes with digits tend to be per-element (e.g. 'sec-12')
+ROOT_TAGS = {'[document]', 'html'}
+
+
+class SiteTemplate(BaseModel):
+    """A structural selector that has located provisions on a domain before"""
+    selector: str
+    hits: int = 0
+    consecutive_misses: int = 0
+    last_hit: float = Field(default_factory=time.time)
+
+
+def domain_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def selector_steps(element: Tag) -> List[str]:
+    """Tag plus stable classes of each ancestor from <body> down to the element"""
+    steps = []
+    current = element
+    while current is not None and current.name not in ROOT_TAGS:
+        classes = [name for name in (current.get('class') or []) if _STABLE_CLASS.match(name)]
+        steps.append(current.name + ''.join(f'.{name}' for name in classes[:MAX_CLASSES_PER_STEP]))
+        current = current.parent
+    steps.reverse()
+    return steps
+
+
+class TemplateStore:
+    """
+    JSON-backed store of site templates keyed by domain.
+
+    A template is dropped after `max_misses` consecutive citations on its domain
+    where its selector matched nothing, and each domain keeps at most
+    `max_templates_per_domain`, best performing first.
+
+    Outcomes are applied in memory and written out every `save_every` outcomes
+    and on close(). A write replays the outcomes since the last one onto the file's
+    current contents under a file lock, so processes sharing the file (e.g. queue
+    workers) merge their outcomes instead of overwriting each other's.
+    """
+    def __init__(self,
+                 path: str = DEFAULT_TEMPLATE_PATH,
+                 max_misses: int = 3,
+                 max_templates_per_domain: int = 5,
+                 save_every: int = 50):
+        self.path = path
+        self.max_misses = max_misses
+        self.max_templates_per_domain = max_templates_per_domain
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._pending: List[TemplateEvent] = []  # Outcomes not yet written to the file
+        self._templates: Dict[str, List[SiteTemplate]] = self._read()
+
+    def templates_for(self, url: str) -> List[SiteTemplate]:
+        """Templates for a URL's domain, most successful first"""
+        with self._lock:
+            return [template.model_copy() for template in self._templates.get(domain_of(url), [])]
+
+    def record_success(self, url: str, steps: List[str]):
+        """Remember (or reinforce) the structural path of a provision found on this domain"""
+        if steps:
+            self._record(TemplateEvent(url=url, kind='success', selector=' > '.join(steps)))
+
+    def record_miss(self, url: str, selector: str):
+        """Count a page where the selector matched nothing; invalidate the template once that happens too often in a row"""
+        self._record(TemplateEvent(url=url, kind='miss', selector=selector))
+
+    def apply(self, events: List['TemplateEvent']):
+        """Record outcomes observed by a TemplateSnapshot in another process"""
+        for event in events:
+            self._record(event)
+
+    def flush(self):
+        """Write outstanding outcomes to the file"""
+        with self._lock:
+            if self._pending:
+                self._save()
+
+    def close(self):
+        self.flush()
+
+    def _record(self, event: 'TemplateEvent'):
+        with self._lock:
+            self._apply_event(self._templates, event)
+            self._pending.append(event)
+            if len(self._pending) >= self.save_every:
+                self._save()
+
+    def _apply_event(self, store: Dict[str, List[SiteTemplate]], event: 'TemplateEvent'):
+        templates = store.setdefault(domain_of(event.url), [])
+        template = next((template for template in templates if template.selector == event.selector), None)
+        if event.kind == 'success':
+            if template is None:
+                template = SiteTemplate(selector=event.selector)
+                templates.append(template)
+            template.hits += 1
+            template.consecutive_misses = 0
+            template.last_hit = max(template.last_hit, event.at)
+            templates.sort(key=lambda template: (template.hits, template.last_hit), reverse=True)
+            del templates[self.max_templates_per_domain:]
+        elif template is not None:
+            template.consecutive_misses += 1
+            if template.consecutive_misses >= self.max_misses:
+                templates.remove(template)
+
+    def _read(self) -> Dict[str, List[SiteTemplate]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                raw = json.load(f)
+            return {domain: [SiteTemplate(**template) for template in templates] for domain, templates in raw.items()}
+        except (OSError, ValueError, TypeError):
+            return {}  # Corrupt store - start over rather than fail the run
+
+    def _save(self):
+        """Merge pending outcomes into the file's current contents and write it atomically. Caller holds the lock."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f'{self.path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            merged = self._read()
+            for event in self._pending:
+                self._apply_event(merged, event)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({domain: [template.model_dump() for template in templates]
+                           for domain, templates in merged.items() if templates}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        self._templates = merged
+        self._pending = []
+
+
+class TemplateEvent(BaseModel):
+    """A template outcome recorded by a TemplateSnapshot, to be applied to the owning TemplateStore"""
+    url: str
+    kind: str  # 'success' or 'miss'
+    selector: str
+    at: float = Field(default_factory=time.time)
+
+
+class TemplateSnapshot:
+    """
+    Read-only copy of one domain's templates for a resolution worker process.
+
+    It has the TemplateStore interface Pathfinder uses, but outcomes are only
+    collected as events. The process that owns the store applies them, so it
+    stays the single writer of the template file.
+    """
+    def __init__(self, templates: List[SiteTemplate]):
+        self.templates = templates
+        self.events: List[TemplateEvent] = []
+
+    def templates_for(self, url: str) -> List[SiteTemplate]:
+        return [template.model_copy() for template in self.templates]
+
+    def record_success(self, url: str, steps: List[str]):
+        if steps:
+            self.events.append(TemplateEvent(url=url, kind='success', selector=' > '.join(steps)))
+
+    def record_miss(self, url: str, selector: str):
+        self.events.append(TemplateEvent(url=url, kind='miss', selector=selector))
+
+
+def select_template(soup: BeautifulSoup, template: SiteTemplate, limit: int = 500) -> List[Tag]:
+    """Elements on a page matching a template's selector"""
+    try:
+        return soup.select(template.selector, limit=limit)
+    except Exception:
+        return []  # Selector no longer parses (e.g. written by an older version) - treat as no match
@@ -0,0 +1,179 @@
+"""
+Structural skeletons of HTML documents for LLM prompts.
+
+A skeleton is an indented outline of the block-level elements of a page - tag,
+id, classes, headings and a little text - with a short reference ([n12]) per
+line that the model can answer with. Skeletons are compressed step by step
+(shallower, less text, fewer repeated siblings) until they fit a token budget
+derived from the target model's context window.
+"""
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString, Tag
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+
+from parsing import document_cache
+from utils.llm import context_window, count_tokens
+
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'head', 'meta', 'link', 'form', 'input', 'button', 'select'}
+INLINE_TAGS = {'a', 'abbr', 'b', 'br', 'cite', 'code', 'em', 'font', 'i', 'img', 'label', 'mark', 'q', 's', 'small',
+               'span', 'strong', 'sub', 'sup', 'time', 'u', 'var', 'wbr'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+MAX_HEADING_TEXT = 80
+MAX_CLASSES = 3
+
+# Share of the context window a skeleton may use, and an absolute cap that keeps prompts cheap
+SKELETON_CONTEXT_FRACTION = 0.5
+MAX_SKELETON_TOKENS = 24000
+
+
+class CompressionLevel(NamedTuple):
+    max_depth: Optional[int]  # None = unlimited
+    text_chars: int  # Text shown for non-heading elements
+    max_repeats: int  # Consecutive siblings with the same tag/classes before collapsing
+
+
+# From most to least detailed; the first level that fits the budget is used
+COMPRESSION_LEVELS = [
+    CompressionLevel(None, 80, 8),
+    CompressionLevel(16, 40, 5),
+    CompressionLevel(10, 20, 3),
+    CompressionLevel(7, 0, 2),
+    CompressionLevel(5, 0, 1),
+]
+
+
+class Skeleton(BaseModel):
+    """Compressed outline of a (sub)tree plus the elements its references point to"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    text: str
+    token_count: int
+    nodes: Dict[str, Tag] = Field(default_factory=dict)  # Reference ('n12') -> element
+    digest: str  # Stable hash of the outline text, for response caching
+
+
+def skeleton_budget(model: str) -> int:
+    return min(int(context_window(model) * SKELETON_CONTEXT_FRACTION), MAX_SKELETON_TOKENS)
+
+
+def _signature(element: Tag) -> str:
+    label = element.name
+    element_id = element.get('id')
+    if element_id:
+        label += f'#{element_id}'
+    classes = element.get('class') or []
+    if classes:
+        label += '.' + '.'.join(classes[:MAX_CLASSES])
+    return label
+
+
+def _repeat_key(element: Tag) -> str:
+    # Ids differ between repeated siblings, so they're left out of the repeat check
+    return element.name + '.' + '.'.join((element.get('class') or [])[:MAX_CLASSES])
+
+
+def _own_text(element: Tag, limit: int) -> str:
+    """Text directly inside an element (not in block children), truncated"""
+    if limit <= 0:
+        return ''
+    parts = []
+    length = 0
+    for child in element.children:
+        if isinstance(child, NavigableString):
+            if isinstance(child, PreformattedString):
+                continue
+            text = child.strip()
+        elif isinstance(child, Tag) and child.name in INLINE_TAGS:
+            text = child.get_text(' ', strip=True)
+        else:
+            continue
+        if text:
+            parts.append(text)
+            length += len(text)
+            if length >= limit:
+                break
+    text = ' '.join(' '.join(parts).split())
+    return text if len(text) <= limit else text[:limit] + '…'
+
+
+def _block_children(element: Tag) -> List[Tag]:
+    return [child for child in element.children
+            if isinstance(child, Tag) and child.name not in SKIPPED_TAGS and child.name not in INLINE_TAGS]
+
+
+def _render(root: Tag, level: CompressionLevel) -> Tuple[str, Dict[str, Tag]]:
+    lines: List[str] = []
+    nodes: Dict[str, Tag] = {}
+
+    def emit(element: Tag, depth: int):
+        reference = f'n{len(nodes)}'
+        nodes[reference] = element
+        if element.name in HEADING_TAGS:
+            text = element.get_text(' ', strip=True)[:MAX_HEADING_TEXT]
+        else:
+            text = _own_text(element, level.text_chars)
+        line = f"{'  ' * depth}[{reference}] <{_signature(element)}>"
+        lines.append(f'{line} {text}' if text else line)
+
+    # Explicit stack of (element, depth); children pushed in reverse to keep document order
+    stack = [(root, 0)]
+    while stack:
+        element, depth = stack.pop()
+        if isinstance(element, str):
+            lines.append(element)  # Marker for a collapsed run of repeated siblings
+            continue
+        emit(element, depth)
+        if level.max_depth is not None and depth >= level.max_depth:
+            continue
+        children = _block_children(element)
+        pending = []
+        index = 0
+        while index < len(children):
+            key = _repeat_key(children[index])
+            run_end = index
+            while run_end < len(children) and _repeat_key(children[run_end]) == key:
+                run_end += 1
+            run = children[index:run_end]
+            shown = run[:level.max_repeats]
+            pending.extend((child, depth + 1) for child in shown)
+            if len(run) > len(shown):
+                pending.append((f"{'  ' * (depth + 1)}… {len(run) - len(shown)} more <{key.rstrip('.')}>", depth + 1))
+            index = run_end
+        stack.extend(reversed(pending))
+    return '\n'.join(lines), nodes
+
+
+def build_skeleton(root: Tag, model: str, max_tokens: Optional[int] = None) -> Skeleton:
+    """Outline `root` at the most detailed compression level that fits the model's token budget"""
+    budget = max_tokens or skeleton_budget(model)
+    for level in COMPRESSION_LEVELS:
+        text, nodes = _render(root, level)
+        tokens = count_tokens(text, model)
+        if tokens <= budget:
+            break
+    else:
+        # Even the coarsest outline is too big: keep whole lines from the top until the budget is used
+        kept = []
+        tokens = 0
+        for line in text.split('\n'):
+            line_tokens = count_tokens(line, model) + 1
+            if tokens + line_tokens > budget:
+                break
+            kept.append(line)
+            tokens += line_tokens
+        text = '\n'.join(kept)
+        referenced = {line.split(']')[0].strip().lstrip('[') for line in kept if line.strip().startswith('[')}
+        nodes = {reference: element for reference, element in nodes.items() if reference in referenced}
+    return Skeleton(text=text, token_count=tokens, nodes=nodes, digest=hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+def get_document_skeleton(soup: BeautifulSoup, model: str) -> Skeleton:
+    """Skeleton of a whole document, built once per model and cached on the document"""
+    cache = document_cache(soup)
+    key = f'skeleton:{model}'
+    if key not in cache:
+        root = soup.body or soup
+        cache[key] = build_skeleton(root, model)
+    return cache[key]
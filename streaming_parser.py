@@ -0,0 +1,241 @@
+"""
+Streaming scan for very large HTML documents.
+
+Whole-code statute pages can be tens of megabytes; building a full tree for them
+keeps hundreds of megabytes resident per worker. This module walks the document
+with lxml's incremental HTMLPullParser, freeing every element as soon as it has
+been looked at, so memory stays bounded by nesting depth rather than page size.
+
+A scan makes at most two passes over the markup:
+
+1. Collect size/complexity metrics, find the first element for each target id,
+   and find the best text hit for each target's ranked regexes and literals:
+   the highest-ranked pattern wins, and among equal ranks a hit inside a heading
+   beats one in running text (a table-of-contents line, a cross-reference). When
+   the best rank is still hit more than once the target is ambiguous and left
+   unresolved. For text hits the enclosing container is the nearest ancestor
+   holding an h1-h3 or section, as in DocumentIndex.relevant_container, but never
+   <body>/<html>: without a smaller container the target is left unresolved too.
+2. Only if there was a hit: re-stream the markup and serialize just the matched
+   subtrees, stopping as soon as the last one has been captured.
+"""
+from lxml import etree
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, Iterator, List, Optional, Pattern, Set, Tuple
+import re
+
+CONTAINER_MARKER_TAGS = {'h1', 'h2', 'h3', 'section'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+SECTIONING_TAGS = {'section', 'article'}
+WHOLE_PAGE_TAGS = {'body', 'html'}
+NON_CONTENT_TAGS = {'script', 'style', 'noscript', 'template'}
+STRUCTURE_TAGS = {'section', 'div', 'article'}
+CHUNK_SIZE = 1 << 20  # Characters fed to the parser at a time
+
+
+class StreamProfile(BaseModel):
+    """Size and complexity metrics gathered without building a tree"""
+    text_length: int = 0
+    element_count: int = 0
+    structure_count: int = 0  # section/div/article elements, as counted by _is_simple_page
+    max_depth: int = 0
+
+
+class StreamMatch(BaseModel):
+    """A located target and the serialized subtree that contains it"""
+    kind: str  # 'id' or 'text'
+    pattern: Optional[str] = None
+    rank: Optional[int] = None  # Text hits: index into the target's regexes, then its literal patterns
+    in_heading: bool = False  # Text hits: the match was inside an h1-h6
+    html: str
+
+
+class StreamScanResult(BaseModel):
+    profile: StreamProfile
+    matches: Dict[str, StreamMatch] = Field(default_factory=dict)  # target key -> match
+
+
+class StreamTarget(BaseModel):
+    """Something to locate: an element id, or ranked regexes then literal text patterns (best first)"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    element_id: Optional[str] = None
+    regexes: List[Pattern] = Field(default_factory=list)  # E.g. SearchPatterns.regexes; compiled case-insensitive
+    patterns: List[str] = Field(default_factory=list)
+
+
+def _events(html: str) -> Iterator[Tuple[str, etree._Element]]:
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    for offset in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[offset:offset + CHUNK_SIZE])
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _release(element: etree._Element):
+    """Drop an element's content and the already-processed siblings before it"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _tag_name(element: etree._Element) -> str:
+    return element.tag.lower() if isinstance(element.tag, str) else ''
+
+
+def scan_document(html: str, targets: Dict[str, StreamTarget]) -> StreamScanResult:
+    """Locate every target without building a full tree and materialize only the matched subtrees"""
+    profile, capture_ordinals = _locate(html, targets)
+    result = StreamScanResult(profile=profile)
+    if capture_ordinals:
+        result.matches = _capture(html, capture_ordinals)
+    return result
+
+
+def _locate(html: str, targets: Dict[str, StreamTarget]) -> Tuple[StreamProfile, Dict[int, List[Tuple[str, str, Optional[str], Optional[int], bool]]]]:
+    """First pass: metrics plus the ordinal of the subtree to capture for each target"""
+    # Plain locals rather than model attributes - this loop runs once per node
+    text_length = element_count = structure_count = max_depth = 0
+
+    wanted_ids: Dict[str, List[str]] = {}
+    pattern_owners: Dict[str, List[Tuple[str, int]]] = {}  # lowered pattern -> [(target key, rank)]
+    regex_targets = [(key, target.regexes) for key, target in targets.items() if target.regexes]
+    for key, target in targets.items():
+        if target.element_id:
+            wanted_ids.setdefault(target.element_id, []).append(key)
+        for index, pattern in enumerate(target.patterns):
+            if pattern and pattern.strip():
+                pattern_owners.setdefault(pattern.lower(), []).append((key, len(target.regexes) + index))
+    matcher = None
+    if pattern_owners:
+        alternatives = sorted(pattern_owners, key=len, reverse=True)
+        matcher = re.compile('|'.join(re.escape(pattern) for pattern in alternatives), re.IGNORECASE)
+
+    id_hits: Dict[str, int] = {}  # key -> element ordinal
+    # key -> [(rank, not in heading), pattern, open elements nearest first, hits with that same key]
+    text_hits: Dict[str, list] = {}
+    marked: Set[int] = set()  # Ordinals of elements containing an h1-h3 or section
+    stack: List[Tuple[int, str]] = []  # Open elements as (ordinal, tag)
+
+    def record(key: str, rank: int, pattern: str):
+        hit_key = (rank, not any(tag in HEADING_TAGS for _, tag in stack))
+        current = text_hits.get(key)
+        if current is None or hit_key < current[0]:
+            text_hits[key] = [hit_key, pattern, list(reversed(stack)), 1]
+        elif hit_key == current[0]:
+            current[3] += 1
+
+    def check_text(text: Optional[str]):
+        nonlocal text_length
+        if not text:
+            return
+        if stack and stack[-1][1] in NON_CONTENT_TAGS:
+            return
+        text_length += len(text)
+        for key, regexes in regex_targets:
+            best = text_hits.get(key)
+            for rank, regex in enumerate(regexes):
+                if best is not None and rank > best[0][0]:
+                    break  # Can't outrank the hit we already have
+                match = regex.search(text)
+                if match:
+                    record(key, rank, match.group(0))
+                    break
+        if matcher is None:
+            return
+        for match in matcher.finditer(text):
+            matched = match.group(0).lower()
+            for pattern, owners in pattern_owners.items():
+                if pattern not in matched:
+                    continue
+                for key, rank in owners:
+                    record(key, rank, targets[key].patterns[rank - len(targets[key].regexes)])
+
+    for event, element in _events(html):
+        tag = _tag_name(element)
+        if event == 'start':
+            parent = element.getparent()
+            previous = element.getprevious()
+            if previous is not None:
+                check_text(previous.tail)
+            elif parent is not None:
+                check_text(parent.text)
+
+            ordinal = element_count
+            element_count += 1
+            if tag in STRUCTURE_TAGS:
+                structure_count += 1
+            if tag in CONTAINER_MARKER_TAGS:
+                for open_ordinal, _ in reversed(stack):
+                    if open_ordinal in marked:
+                        break
+                    marked.add(open_ordinal)
+            element_id = element.get('id')
+            if element_id in wanted_ids:
+                for key in wanted_ids.pop(element_id):
+                    id_hits[key] = ordinal
+            stack.append((ordinal, tag))
+            max_depth = max(max_depth, len(stack))
+        else:
+            if len(element):
+                check_text(element[-1].tail)
+            else:
+                check_text(element.text)
+            stack.pop()
+            _release(element)
+
+    profile = StreamProfile(text_length=text_length, element_count=element_count,
+                            structure_count=structure_count, max_depth=max_depth)
+
+    captures: Dict[int, List[Tuple[str, str, Optional[str], Optional[int], bool]]] = {}
+    for key, ordinal in id_hits.items():
+        captures.setdefault(ordinal, []).append((key, 'id', None, None, False))
+    for key, ((rank, outside_heading), pattern, chain, hits) in text_hits.items():
+        if key in id_hits or hits > 1:
+            continue  # Ambiguous: the best-ranked pattern matched in several places
+        container = _container(chain, marked)
+        if container is not None:
+            captures.setdefault(container, []).append((key, 'text', pattern, rank, not outside_heading))
+    return profile, captures
+
+
+def _container(chain: List[Tuple[int, str]], marked: Set[int]) -> Optional[int]:
+    """Ordinal of the element to capture for a text hit; None rather than the whole page"""
+    container = next(((ordinal, tag) for ordinal, tag in chain if ordinal in marked), None)
+    if container is not None and container[1] not in WHOLE_PAGE_TAGS:
+        return container[0]
+    return next((ordinal for ordinal, tag in chain if tag in SECTIONING_TAGS), None)
+
+
+def _capture(html: str, captures: Dict[int, List[Tuple[str, str, Optional[str], Optional[int], bool]]]) -> Dict[str, StreamMatch]:
+    """Second pass: serialize the subtrees at the given ordinals, freeing everything else"""
+    matches: Dict[str, StreamMatch] = {}
+    remaining = set(captures)
+    open_captures = 0
+    capturing: Dict[int, int] = {}  # id(element) -> ordinal, for open capture roots
+    ordinal = 0
+
+    for event, element in _events(html):
+        if event == 'start':
+            if ordinal in remaining:
+                capturing[id(element)] = ordinal
+                open_captures += 1
+            ordinal += 1
+            continue
+
+        captured_ordinal = capturing.pop(id(element), None)
+        if captured_ordinal is not None:
+            subtree = etree.tostring(element, encoding='unicode', method='html', with_tail=False)
+            for key, kind, pattern, rank, in_heading in captures[captured_ordinal]:
+                matches[key] = StreamMatch(kind=kind, pattern=pattern, rank=rank, in_heading=in_heading, html=subtree)
+            remaining.discard(captured_ordinal)
+            open_captures -= 1
+            if not remaining:
+                break
+        if open_captures == 0:
+            _release(element)
+
+    return matches
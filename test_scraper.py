@@ -1,6 +1,9 @@
 from scraper import LegislationScraper, ScraperResult
 from pathfinder import Pathfinder, PathfinderResult
+from batch_runner import BatchRunner
+from legal_patterns import compile_reference_patterns, label_kind
 from typing import List, Dict
+import asyncio
 import json
 import logging
 from datetime import datetime
@@ -26,6 +29,24 @@ def get_test_citations() -> List[Citation]:
     hashtagged_citation = db.pydantic_select(f"SELECT * FROM citations WHERE id='{test_id}';", Citation)
     return hashtagged_citation
 
+def build_test_result(citation: Citation, result: ScraperResult) -> Dict:
+    """Flatten a ScraperResult into the dict format saved by the batch tests"""
+    return {
+        'citation_id': citation.id,
+        'legal_reference': citation.legal_reference,
+        'url': citation.link_legal_reference,
+        'processing_path': result.processing_path,
+        'fetch_tier': result.fetch_tier,
+        'status': result.status,
+        'confidence': result.confidence,
+        'requires_human_review': result.requires_human_review,
+        'error_message': result.error_message,
+        'llm_cost': result.llm_cost,
+        'llm_latency': result.llm_latency,
+        'content_length': len(result.content) if result.content else 0,
+        'has_content': bool(result.content)
+    }
+
 def test_single_citation(scraper: LegislationScraper, citation: Citation) -> Dict:
     """Test scraper on a single citation and return results"""
     logger.info(f"Testing citation: {citation.id}")
@@ -34,18 +55,7 @@ def test_single_citation(scraper: LegislationScraper, citation: Citation) -> Dic
     try:
         result = scraper.get_legislation_content(citation)
         
-        test_result = {
-            'citation_id': citation.id,
-            'legal_reference': citation.legal_reference,
-            'url': citation.link_legal_reference,
-            'processing_path': result.processing_path,
-            'status': result.status,
-            'confidence': result.confidence,
-            'requires_human_review': result.requires_human_review,
-            'error_message': result.error_message,
-            'content_length': len(result.content) if result.content else 0,
-            'has_content': bool(result.content)
-        }
+        test_result = build_test_result(citation, result)
         
         logger.info(f"Test completed for {citation.id}: {result.status}")
         return test_result
@@ -58,9 +68,10 @@ def test_single_citation(scraper: LegislationScraper, citation: Citation) -> Dic
             'error_message': str(e)
         }
 
-def run_batch_test(citations: List[Citation], sample_size: int = None) -> None:
-    """Run tests on a batch of citations"""
+def run_batch_test(citations: List[Citation], sample_size: int = None, max_concurrency: int = 8) -> None:
+    """Run tests on a batch of citations concurrently, logging each result as it completes"""
     scraper = LegislationScraper()
+    runner = BatchRunner(scraper, max_concurrency=max_concurrency)
     results = []
     
     # Take a sample if specified
@@ -68,8 +79,22 @@ def run_batch_test(citations: List[Citation], sample_size: int = None) -> None:
     
     logger.info(f"Starting batch test with {len(test_citations)} citations")
     
-    for citation in test_citations:
-        results.append(test_single_citation(scraper, citation))
+    def record(citation: Citation, result: ScraperResult) -> None:
+        logger.info(f"Test completed for {citation.id}: {result.status}")
+        results.append(build_test_result(citation, result))
+    
+    try:
+        asyncio.run(runner.run(test_citations, on_result=record))
+        if scraper.page_cache:
+            cache_stats = scraper.page_cache.stats()
+            logger.info(f"Page cache: {cache_stats.hits} hits ({cache_stats.revalidated} revalidated), "
+                        f"{cache_stats.misses} misses, hit rate {cache_stats.hit_rate:.1%}")
+        if scraper.llm_cache:
+            llm_stats = scraper.llm_cache.stats()
+            logger.info(f"LLM cache: {llm_stats.hits} hits, {llm_stats.misses} misses, hit rate {llm_stats.hit_rate:.1%}, "
+                        f"saved {llm_stats.input_tokens_saved + llm_stats.output_tokens_saved} tokens (${llm_stats.dollars_saved:.4f})")
+    finally:
+        scraper.close()
     
     # Save results
     save_test_results(results)
@@ -95,9 +120,12 @@ def print_test_summary(results: List[Dict]) -> None:
     errors = sum(1 for r in results if r['status'] == 'error')
     
     path_counts = {}
+    tier_counts = {}
     for r in results:
         path = r.get('processing_path', 'unknown')
         path_counts[path] = path_counts.get(path, 0) + 1
+        tier = r.get('fetch_tier') or 'unknown'
+        tier_counts[tier] = tier_counts.get(tier, 0) + 1
     
     print("\n=== Test Summary ===")
     print(f"Total citations tested: {total}")
@@ -107,6 +135,9 @@ def print_test_summary(results: List[Dict]) -> None:
     print("\nProcessing Paths:")
     for path, count in path_counts.items():
         print(f"  {path}: {count} ({(count/total)*100:.1f}%)")
+    print("\nFetch Tiers:")
+    for tier, count in tier_counts.items():
+        print(f"  {tier}: {count} ({(count/total)*100:.1f}%)")
 
 def test_specific_citations(citation_ids: List[str]) -> None:
     """Test specific citations by their IDs"""
@@ -121,12 +152,50 @@ def get_test_citations_by_ids(citation_ids: List[str]) -> List[Citation]:
     """
     pass
 
+# (legal_reference, jurisdiction, expected (kind, number, subdivisions) per designation, expected instrument,
+#  text the first regex must match, text no regex may match)
+REFERENCE_PATTERN_CASES = [
+    ("Section 5, Chapter 3", None, [('section', '5', ()), ('chapter', '3', ())], None, "Section 5", "Section 50"),
+    ("Chapter 3, Section 5", None, [('section', '5', ()), ('chapter', '3', ())], None, "Section 5", "Section 5A"),
+    ("Art. 12(3) Law 2019/45", "es", [('article', '12', ('3',))], "Law 2019/45", "Artículo 12 (3)", "Art. 120"),
+    ("§ 1219.54", None, [('section', '1219.54', ())], None, "§ 1219.54", "1219.545"),
+    ("7 CFR 1219.54", "us", [(None, '1219.54', ())], None, "1219.54", "7 CFR 1219.5"),
+    ("Artículo 8 de 2012", "mx", [('article', '8', ())], None, "ARTICULO 8", "Artículo 80"),
+]
+
+# (label spelling, jurisdiction, expected kind)
+LABEL_KIND_CASES = [
+    ('Art.', None, 'article'),
+    ('capítulo', 'mx', 'chapter'),
+    ('§', 'de', 'section'),
+    ('Abs.', 'de', 'paragraph'),
+    ('foo', None, None),
+]
+
+def test_reference_patterns() -> None:
+    """Designations, instruments and regex tiers of the pattern engine for a table of references"""
+    for reference, jurisdiction, designations, instrument, first_match, no_match in REFERENCE_PATTERN_CASES:
+        search = compile_reference_patterns(reference, jurisdiction)
+        parsed = [(designation.kind, designation.number, designation.subdivisions) for designation in search.designations]
+        assert parsed == designations, f"{reference}: designations {parsed}"
+        assert search.instrument == instrument, f"{reference}: instrument {search.instrument}"
+        assert search.regex_tiers[0] == 0 and list(search.regex_tiers) == sorted(search.regex_tiers), f"{reference}: tiers {search.regex_tiers}"
+        assert search.regexes[0].search(first_match), f"{reference}: first regex misses {first_match!r}"
+        assert not any(regex.search(no_match) for regex in search.regexes), f"{reference}: matched {no_match!r}"
+        assert compile_reference_patterns(reference, jurisdiction) is search, f"{reference}: not memoized"
+
+def test_label_kinds() -> None:
+    """Canonical kinds of label spellings per jurisdiction"""
+    for label, jurisdiction, kind in LABEL_KIND_CASES:
+        assert label_kind(label, jurisdiction) == kind, f"{label!r} ({jurisdiction}): {label_kind(label, jurisdiction)}"
+
 if __name__ == "__main__":
     # Example usage:
     
     # Test all citations (or a sample)
     citations = get_test_citations()
-    result = test_single_citation(LegislationScraper(headless=False), citations[0])
+    with LegislationScraper(headless=False) as scraper:
+        result = test_single_citation(scraper, citations[0])
     print(result)
     #run_batch_test(citations, sample_size=10)  # Test 10 citations
     
@@ -1,10 +1,16 @@
 from typing import List, Optional, Dict, Any
 import tiktoken
 import psycopg
+import asyncio
+import atexit
 import json
 import os
+import threading
 
-from psycopg.rows import class_row, dict_row
+from contextlib import asynccontextmanager, contextmanager
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import class_row, dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 from typing import Optional, List, Any, Dict, Callable, Tuple, Type, Union
 from openai import OpenAI
 from anthropic import Anthropic
@@ -18,32 +24,108 @@ from datetime import datetime
 from psycopg import sql
 
 # ===== Database Functions =====
+def db_conninfo() -> str:
+    """ Connection string for the PostgreSQL database server, from the DB_* environment variables. """
+    # connect to the Supabase PostgreSQL server
+    # db_name = os.getenv("SUPABASE_DB_NAME")
+    # db_host = os.getenv("SUPABASE_DB_HOST")
+    # db_username = os.getenv("SUPABASE_DB_USERNAME")
+    # db_password = os.getenv("SUPABASE_DB_PASSWORD")
+    # db_port = os.getenv("SUPABASE_DB_PORT")
+
+    # connect to the local PostgreSQL server
+    return make_conninfo(
+        dbname=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USERNAME"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT"),
+        client_encoding="utf8"
+    )
+
 def db_connect(row_factory=None):
-    """ Connect to the PostgreSQL database server. Optionally provide a pyscopg3 row factory to add type information to the returned rows. """
-    conn = None
-    try:
-        # # connect to the local PostgreSQL server
-        db_name = os.getenv("DB_NAME")
-        db_host = os.getenv("DB_HOST")
-        db_username = os.getenv("DB_USERNAME")
-        db_password = os.getenv("DB_PASSWORD")
-        db_port = os.getenv("DB_PORT")
-
-        # connect to the Supabase PostgreSQL server
-        # db_name = os.getenv("SUPABASE_DB_NAME")
-        # db_host = os.getenv("SUPABASE_DB_HOST")
-        # db_username = os.getenv("SUPABASE_DB_USERNAME")
-        # db_password = os.getenv("SUPABASE_DB_PASSWORD")
-        # db_port = os.getenv("SUPABASE_DB_PORT")
-
-        conn = psycopg.connect(dbname=db_name,host=db_host,user=db_username,password=db_password,port=db_port,client_encoding="utf8")
-            
-		# If a row factory is provided, use it
+    """ Open a dedicated connection to the PostgreSQL database server, which the caller must close. Prefer db_connection(), which borrows one from the pool. Optionally provide a pyscopg3 row factory to add type information to the returned rows. """
+    conn = psycopg.connect(db_conninfo())
+    # If a row factory is provided, use it
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return conn
+
+# Connection setup (TCP + TLS + auth) costs more than most of our queries, so connections are pooled
+# per process. Sizes can be tuned per deployment with DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE.
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_opening: Optional[asyncio.Future] = None
+
+def _pool_sizes() -> Tuple[int, int]:
+    return int(os.getenv("DB_POOL_MIN_SIZE", "1")), int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+def get_pool() -> ConnectionPool:
+    """ The process-wide connection pool, opened on first use. """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            min_size, max_size = _pool_sizes()
+            _pool = ConnectionPool(db_conninfo(), min_size=min_size, max_size=max_size, open=True, name="scraper")
+        return _pool
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """ The async connection pool for the concurrent scraper, opened on first use. Bound to the event loop that opened it. """
+    global _async_pool, _async_pool_opening
+    if _async_pool is None:
+        min_size, max_size = _pool_sizes()
+        _async_pool = AsyncConnectionPool(db_conninfo(), min_size=min_size, max_size=max_size, open=False, name="scraper-async")
+        _async_pool_opening = asyncio.ensure_future(_async_pool.open())
+    # Concurrent first callers all wait for the same open()
+    await asyncio.shield(_async_pool_opening)
+    return _async_pool
+
+@contextmanager
+def db_connection(row_factory=None):
+    """
+    Borrow a connection from the pool for the duration of a with-block.
+
+    The transaction is committed when the block exits normally and rolled back if it raises;
+    the connection then goes back to the pool instead of being closed.
+    """
+    with get_pool().connection() as conn:
         if row_factory is not None:
             conn.row_factory = row_factory
-        return conn
-    except (Exception, psycopg.DatabaseError) as error:
-        raise error
+        try:
+            yield conn
+        finally:
+            # Pooled connections are shared, so don't leak this caller's row factory to the next one
+            conn.row_factory = tuple_row
+
+@asynccontextmanager
+async def async_db_connection(row_factory=None):
+    """ Async counterpart of db_connection(). """
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        try:
+            yield conn
+        finally:
+            conn.row_factory = tuple_row
+
+def close_pool():
+    """ Close the sync connection pool, e.g. at shutdown. The async pool is closed with close_async_pool(). """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+async def close_async_pool():
+    global _async_pool, _async_pool_opening
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+        _async_pool_opening = None
+
+atexit.register(close_pool)
 
 # Experimental Function. Intended to replace the 'pydantic_' functions below.
 # def execute_query(query: sql.Composed, params: Tuple[Any, ...] = (), model_class: Optional[Type[BaseModel]] = None, auto_commit: bool = True) -> Optional[List[BaseModel]]:
@@ -86,6 +168,48 @@ def db_connect(row_factory=None):
 #             return results
 #     return None
 
+def _model_values(model: BaseModel, include: Optional[set] = None) -> Dict[str, Any]:
+    """ Dump a model for a query, excluding default values and serializing nested dicts to JSON. """
+    model_dict = model.model_dump(mode="json", exclude_defaults=True, include=include)
+    for key, value in model_dict.items():
+        if type(value) == dict:
+            model_dict[key] = json.dumps(value)
+    return model_dict
+
+def _insert_query(table_name: str, model: BaseModel) -> Tuple[sql.Composed, tuple]:
+    model_dict = _model_values(model)
+
+    # Prepare the column names and placeholders
+    columns = ', '.join(model_dict.keys())
+    placeholders = ', '.join(['%s'] * len(model_dict))
+
+    # Create the INSERT statement using psycopg.sql to safely handle identifiers
+    query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+        sql.Identifier(table_name),
+        sql.SQL(columns),
+        sql.SQL(placeholders)
+    )
+    return query, tuple(model_dict.values())
+
+def _update_query(table_name: str, model: BaseModel, where_field: str, update_columns: Optional[List[str]] = None, where_field_source_override: Optional[str] = None) -> Tuple[sql.Composed, tuple]:
+    where_source = where_field_source_override or where_field
+    # Include values to update only, plus the field the WHERE value is read from
+    include = set(update_columns) | {where_source} if update_columns else None
+    model_dict = _model_values(model, include=include)
+
+    where_value = model_dict[where_source]
+    del model_dict[where_source]
+
+    # Prepare the column names and placeholders
+    set_statements = ', '.join([f"{column} = %s" for column in model_dict.keys()])
+
+    query = sql.SQL("UPDATE {} SET {} WHERE {} = %s").format(
+        sql.Identifier(table_name),
+        sql.SQL(set_statements),
+        sql.Identifier(where_field)
+    )
+    return query, tuple(list(model_dict.values()) + [where_value])
+
 def pydantic_select(sql_select: str, modelType: Any) -> List[Any]:
     """
     Executes a SQL SELECT statement and returns the result rows as a list of Pydantic models.
@@ -98,24 +222,17 @@ def pydantic_select(sql_select: str, modelType: Any) -> List[Any]:
         List[Any]: The rows returned by the SELECT statement as a list of Pydantic Models.
     """   
     # Use the provided modelType (PydanticModel) for the row factory
-    if modelType:
-        conn = db_connect(row_factory=class_row(modelType))
-    
-
-    cur = conn.cursor()
-
-    # Execute the SELECT statement
-    cur.execute(sql_select)
-
-    # Fetch all rows
-    rows = cur.fetchall()
-    
-
-    # Close the cursor and the connection
-    cur.close()
-    conn.close()
-
-    return rows
+    with db_connection(row_factory=class_row(modelType) if modelType else None) as conn:
+        with conn.cursor() as cur:
+            # Execute the SELECT statement and fetch all rows
+            cur.execute(sql_select)
+            return cur.fetchall()
+
+async def apydantic_select(sql_select: str, modelType: Any) -> List[Any]:
+    """ Async pydantic_select() for the concurrent scraper, using the async pool. """
+    async with async_db_connection(row_factory=class_row(modelType) if modelType else None) as conn:
+        cur = await conn.execute(sql_select)
+        return await cur.fetchall()
 
 def pydantic_insert(table_name: str, models: List[Any]):
     """
@@ -126,41 +243,10 @@ def pydantic_insert(table_name: str, models: List[Any]):
         nodes (List[Any]): The list of Pydantic Models to insert.
         user (str): The user making the request.
     """
-    # Get the psycopg3 connection object
-    conn = db_connect()
-
-    with conn.cursor() as cursor:
+    # All rows go in on one pooled connection and are committed together
+    with db_connection() as conn, conn.cursor() as cursor:
         for model in models:
-            # Convert the NodeModel to a dictionary and exclude default values
-            
-            model_dict = model.model_dump(mode="json",exclude_defaults=True)
-
-            for key, value in model_dict.items():
-                if type(value) == dict:
-                    model_dict[key] = json.dumps(value)
-
-            # 
-            
-
-            # Prepare the column names and placeholders
-            columns = ', '.join(model_dict.keys())
-            placeholders = ', '.join(['%s'] * len(model_dict))
-
-            
-
-            # Create the INSERT statement using psycopg.sql to safely handle identifiers
-            query = psycopg.sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-                psycopg.sql.Identifier(table_name),
-                psycopg.sql.SQL(columns),
-                psycopg.sql.SQL(placeholders)
-            )
-
-            # Execute the INSERT statement
-            cursor.execute(query, tuple(model_dict.values()))
-
-    # Commit the changes
-    conn.commit()
-    conn.close()
+            cursor.execute(*_insert_query(table_name, model))
 
 def pydantic_update(table_name: str, models: List[Type[BaseModel]], where_field: str, update_columns: Optional[List[str]] = None, where_field_source_override: Optional[str] = None ):
     """
@@ -173,41 +259,9 @@ def pydantic_update(table_name: str, models: List[Type[BaseModel]], where_field:
         update_columns (Optional[List[str]]): The columns to include in the update. If None, all fields are included. Defaults to None.
         user (Optional[str]): The user making the request. Defaults to None.
     """
-    conn = db_connect()
-
-    with conn.cursor() as cursor:
+    with db_connection() as conn, conn.cursor() as cursor:
         for model in models:
-            # Convert the NodeModel to a dictionary and exclude where field, include values to update only
-            if update_columns:
-                model_dict = model.model_dump(mode="json",exclude_defaults=True, include=update_columns.append(where_field))
-            else:
-                model_dict = model.model_dump(mode="json",exclude_defaults=True)
-
-            for key, value in model_dict.items():
-                if type(value) == dict:
-                    model_dict[key] = json.dumps(value)
-            
-            if(where_field_source_override):
-                where_value = model_dict[where_field_source_override]
-                del model_dict[where_field_source_override]
-            else:
-                where_value = model_dict[where_field]
-            
-                del model_dict[where_field]
-
-            # Prepare the column names and placeholders
-            set_statements = ', '.join([f"{column} = %s" for column in model_dict.keys()])
-            
-            query = psycopg.sql.SQL("UPDATE {} SET {} WHERE {} = %s").format(
-                psycopg.sql.Identifier(table_name),
-                psycopg.sql.SQL(set_statements),
-                psycopg.sql.Identifier(where_field)
-            )
-            # print(query.as_string(conn))
-            # Execute the UPDATE statement
-            cursor.execute(query, tuple(list(model_dict.values()) + [where_value]))
-    conn.commit()
-    conn.close
+            cursor.execute(*_update_query(table_name, model, where_field, update_columns, where_field_source_override))
 
 def pydantic_bulk_update(
     table_name: str,
@@ -234,8 +288,6 @@ def pydantic_bulk_update(
     # print(f"update_columns: {update_columns}")
     # print(f"where_field_source_override: {where_field_source_override}")
     
-    conn = db_connect()
-    
     # Batch size for bulk update
     batch_size = 1000
     columns_to_include_input = None
@@ -265,7 +317,7 @@ def pydantic_bulk_update(
     # print(f"Columns to include output: {columns_to_include_output}")
     # print(f"Set statements: {set_statements}")
     
-    with conn.cursor() as cursor:
+    with db_connection() as conn, conn.cursor() as cursor:
         # Process models in batches
         for i in range(0, len(models), batch_size):
             batch = models[i:i + batch_size]
@@ -329,7 +381,6 @@ def pydantic_bulk_update(
             # Execute the batch update
             cursor.execute(query, flat_values)
             conn.commit()
-    conn.close()
 
 def pydantic_upsert(table_name: str, models: List[Any], where_field: str):
     """
@@ -341,9 +392,23 @@ def pydantic_upsert(table_name: str, models: List[Any], where_field: str):
         where_field (str): The field to use in the WHERE clause of the update statement.
         user (Optional[str]): The user making the request. 
     """
-    for model in models:
-        try:
-            pydantic_insert(table_name=table_name, models=[model])
-        except psycopg.errors.UniqueViolation:
-            pydantic_update(table_name=table_name, models=[model], where_field=where_field)
-
+    # One connection and one transaction for the whole batch. Each insert runs in a savepoint,
+    # so a duplicate key only rolls back that insert before falling back to an update.
+    with db_connection() as conn, conn.transaction(), conn.cursor() as cursor:
+        for model in models:
+            try:
+                with conn.transaction():
+                    cursor.execute(*_insert_query(table_name, model))
+            except psycopg.errors.UniqueViolation:
+                cursor.execute(*_update_query(table_name, model, where_field))
+
+async def apydantic_upsert(table_name: str, models: List[Any], where_field: str):
+    """ Async pydantic_upsert() for the concurrent scraper, using the async pool. """
+    async with async_db_connection() as conn, conn.transaction():
+        cursor = conn.cursor()
+        for model in models:
+            try:
+                async with conn.transaction():
+                    await cursor.execute(*_insert_query(table_name, model))
+            except psycopg.errors.UniqueViolation:
+                await cursor.execute(*_update_query(table_name, model, where_field))
@@ -0,0 +1,153 @@
+from typing import Any, Dict, List, Optional
+from functools import lru_cache
+import json
+import re
+
+import tiktoken
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+from pydantic import BaseModel
+
+from utils.pydanticModels import pricing_data
+
+DEFAULT_CONTEXT_WINDOW = 8192
+
+
+class LLMResponse(BaseModel):
+    """Text and token usage of a single completion"""
+    model: str
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached: bool = False  # Served from an LLMCache rather than the provider
+
+
+def provider_for(model: str) -> str:
+    """'anthropic' or 'openai', looked up in pricing_data"""
+    for provider, models in pricing_data.items():
+        if model in models:
+            return provider
+    if model.startswith('claude'):
+        return 'anthropic'
+    return 'openai'
+
+
+def model_info(model: str) -> Dict[str, Any]:
+    """Pricing and rate limit entry for a model, empty if unknown"""
+    return pricing_data.get(provider_for(model), {}).get(model, {})
+
+
+def context_window(model: str) -> int:
+    return model_info(model).get('context_window', DEFAULT_CONTEXT_WINDOW)
+
+
+def cost_of(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Dollar cost of a completion; pricing_data prices are per million tokens"""
+    info = model_info(model)
+    return (input_tokens * float(info.get('input_price', 0)) + output_tokens * float(info.get('output_price', 0))) / 1_000_000
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Anthropic doesn't publish a tokenizer; cl100k_base is a close enough estimate for budgeting
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, model: str, max_tokens: int) -> str:
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+async def acomplete(model: str,
+                    prompt: str,
+                    system: Optional[str] = None,
+                    max_tokens: int = 1024,
+                    temperature: float = 0.0) -> LLMResponse:
+    """
+    Async single-turn completion. This is the only path to the providers: callers go
+    through llm_scheduler, which handles rate limiting and the response cache.
+    """
+    provider = provider_for(model)
+    client = _async_client(provider)
+    kwargs = _request_kwargs(provider, model, prompt, system, max_tokens, temperature)
+    if provider == 'anthropic':
+        return _to_response(provider, model, await client.messages.create(**kwargs))
+    return _to_response(provider, model, await client.chat.completions.create(**kwargs))
+
+
+@lru_cache(maxsize=None)
+def _async_client(provider: str):
+    return AsyncAnthropic() if provider == 'anthropic' else AsyncOpenAI()
+
+
+def _request_kwargs(provider: str,
+                    model: str,
+                    prompt: str,
+                    system: Optional[str],
+                    max_tokens: int,
+                    temperature: float) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {'model': model, 'max_tokens': max_tokens, 'temperature': temperature}
+    if provider == 'anthropic':
+        if system:
+            kwargs['system'] = system
+        kwargs['messages'] = [{'role': 'user', 'content': prompt}]
+        return kwargs
+
+    messages: List[Dict[str, str]] = []
+    if system:
+        messages.append({'role': 'system', 'content': system})
+    messages.append({'role': 'user', 'content': prompt})
+    kwargs['messages'] = messages
+    return kwargs
+
+
+def _to_response(provider: str, model: str, response) -> LLMResponse:
+    if provider == 'anthropic':
+        return LLMResponse(
+            model=model,
+            text=''.join(block.text for block in response.content if block.type == 'text'),
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens
+        )
+    return LLMResponse(
+        model=model,
+        text=response.choices[0].message.content or '',
+        input_tokens=response.usage.prompt_tokens if response.usage else 0,
+        output_tokens=response.usage.completion_tokens if response.usage else 0
+    )
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 / overloaded errors from either SDK"""
+    return getattr(error, 'status_code', None) in (429, 529)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the Retry-After header if present"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_json_response(text: str) -> Dict[str, Any]:
+    """Pull the first JSON object out of a model response, tolerating code fences and chatter"""
+    fenced = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    candidate = fenced.group(1) if fenced else text[text.find('{'):text.rfind('}') + 1]
+    try:
+        parsed = json.loads(candidate)
+    except (json.JSONDecodeError, ValueError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}